@@ -1,8 +1,11 @@
 import aiohttp
 import asyncio
-import json
-from .config import DSPACE_PORT, DSPACE_DOMAIN
+import inspect
 import os
+from aiohttp.payload import AsyncIterablePayload
+from .Client import getClient
+from .config import DSPACE_CHUNK_SIZE
+from .Metrics import measured
 
 """ There are serveral types:
 #   "ORIGINAl" = docuemnt its self
@@ -10,80 +13,108 @@ import os
 #   "LICENCE"  = licence ig...
 """
 
-async def addBitstreamsItem(bundleId, file_path="files", filename="file.pdf",contentType ="pdf",type="ORIGINAL"):
-    
-    script_dir = os.path.dirname(os.path.abspath(__file__))
+CHUNK_SIZE = DSPACE_CHUNK_SIZE
+
+
+async def iterContent(source, chunkSize=CHUNK_SIZE):
+    """Yields the content of `source` in chunks.
+
+    `source` is a path, bytes, an object with a sync or async `read(size)` method
+    (open file, FastAPI UploadFile, SpooledTemporaryFile) or an async iterable of bytes.
+    A file opened from a path is closed here, other sources are owned by the caller.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        yield bytes(source)
+        return
+
+    if isinstance(source, (str, os.PathLike)):
+        file = await asyncio.to_thread(open, source, "rb")
+        try:
+            while chunk := await asyncio.to_thread(file.read, chunkSize):
+                yield chunk
+        finally:
+            await asyncio.to_thread(file.close)
+        return
 
-    # JWT token
-    async with aiohttp.ClientSession() as session:
-        # Step 1: Get XSRF token from cookie
-        url_step1 = f"{DSPACE_DOMAIN}:{DSPACE_PORT}/server/api/authn/status"
-        headers_step1 = {"Content-Type": "application/x-www-form-urlencoded"}
+    read = getattr(source, "read", None)
+    if read is not None:
+        while True:
+            if inspect.iscoroutinefunction(read):
+                chunk = await read(chunkSize)
+            else:
+                # a sync read blocks on the disk (e.g. a rolled over SpooledTemporaryFile), it runs in a thread
+                chunk = await asyncio.to_thread(read, chunkSize)
+                if inspect.isawaitable(chunk):
+                    chunk = await chunk
+            if not chunk:
+                break
+            yield chunk
+        return
 
-        async with session.get(url_step1, headers=headers_step1) as response_step1:
-            xsrf_cookie = response_step1.cookies.get("DSPACE-XSRF-COOKIE").value
+    async for chunk in source:
+        yield chunk
 
-            # Step 2: Login and obtain Bearer token
-            url_step2 = f"{DSPACE_DOMAIN}:{DSPACE_PORT}/server/api/authn/login"
-            headers_step2 = {
-                "Content-Type": "application/x-www-form-urlencoded",
-                "X-XSRF-TOKEN": xsrf_cookie,
+
+def bitstreamProperties(filename, bundleName="ORIGINAL", description=None):
+    properties = {
+        "name": f"{filename}",
+        "metadata": {},
+        "bundleName": f"{bundleName}"
+    }
+    if description is not None:
+        properties["metadata"]["dc.description"] = [
+            {
+                "value": f"{description}",
+                "language": None,
+                "authority": None,
+                "confidence": -1,
+                "place": 0
             }
-            params_step2 = {"user": "test@test.edu", "password": "admin"}
+        ]
+    return properties
+
+
+@measured()
+async def uploadBitstream(bundleId, source, filename, contentType="application/pdf", bundleName="ORIGINAL", description=None, chunkSize=CHUNK_SIZE):
+    """Streams `source` (see iterContent) into a new bitstream of the bundle.
+    Only one chunk is held in memory at a time, the request body is sent with chunked encoding.
+    """
+    client = getClient()
+    chunks = iterContent(source, chunkSize=chunkSize)
+    try:
+        with aiohttp.MultipartWriter("form-data") as form_data:
+            file_part = form_data.append_payload(
+                AsyncIterablePayload(chunks, content_type=contentType)
+            )
+            file_part.set_content_disposition("form-data", name="file", filename=f"{filename}")
 
-        async with session.post(
-            url_step2, headers=headers_step2, data=params_step2
-        ) as response_step2:
-            bearer_token = response_step2.headers.get("Authorization")
-            xsrf_cookie = response_step2.cookies.get("DSPACE-XSRF-COOKIE").value
+            properties_part = form_data.append_json(bitstreamProperties(filename, bundleName, description))
+            properties_part.set_content_disposition("form-data", name="properties")
 
-            # Step 3: Access a new API endpoint to get specific XSRF token
-        async with session.patch(url_step1) as response_step3:
-            # Print the response for Step 3
-            xsrf_cookie_step3 = response_step3.cookies.get("DSPACE-XSRF-COOKIE").value
+            # streamed body cannot be sent twice
+            return await client.fetch(
+                "POST", f"/server/api/core/bundles/{bundleId}/bitstreams", data=form_data, replayable=False
+            )
+    finally:
+        await chunks.aclose()
 
-         # Step 4: Upload a file to a specific bundle
-        url_step4 = f"{DSPACE_DOMAIN}:{DSPACE_PORT}/server/api/core/bundles/{bundleId}/bitstreams"
 
-        headers_step4 = {
-            "Authorization": bearer_token,
-            "X-XSRF-TOKEN": xsrf_cookie_step3,
-        }
+@measured()
+async def addBitstreamsItem(bundleId, file_path="files", filename="file.pdf",contentType ="pdf",type="ORIGINAL"):
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
 
-        # Construct the full path to 'file.pdf'
+    # an existing file_path is used as it is, otherwise the file is looked up next to this module
+    if not os.path.isfile(file_path):
         file_path = os.path.join(script_dir, f"{filename}")
 
-        # Create multipart form data
-        form_data = aiohttp.FormData()
-
-        # Add file field with correct filename
-        form_data.add_field('file', open(file_path, 'rb'), filename=f"{filename}", content_type=f"application/{contentType}")
-
-        # Add properties as a JSON field
-        properties = {
-            "name": f"{filename}",
-            "metadata": {
-                "dc.description": [
-                    {
-                        "value": "example file",
-                        "language": None,
-                        "authority": None,
-                        "confidence": -1,
-                        "place": 0
-                    }
-                ]
-            },
-            "bundleName": f"{type}"
-        }
-
-        form_data.add_field('properties', json.dumps(properties), content_type='application/json')
-
-        # Make the POST request with multipart/form-data
-        async with session.post(url_step4, headers=headers_step4, data=form_data) as response_step4:
-            # Print the response for Step 4
-            result = {}
-            
-            result["response"] = await response_step4.json()
-            result["msg"] = response_step4.status
-                
-            return result
+    # the same file is not sent again into a bundle which already holds it
+    from .ContentIndex import uploadBitstreamOnce
+    return await uploadBitstreamOnce(
+        bundleId,
+        file_path,
+        filename=filename,
+        contentType=f"application/{contentType}",
+        bundleName=type,
+        description="example file",
+    )
@@ -0,0 +1,190 @@
+import asyncio
+import os
+import time
+
+from .Client import errorResult
+from .Concurrency import gatherLimited
+from .AddBundleItem import addBundleItem
+from .GetBundleId import iterateBundles
+from .AddBitstreamsItem import iterContent, CHUNK_SIZE
+from .ContentIndex import findStoredContent, uploadBitstreamOnce
+from .config import DSPACE_UPLOAD_CONCURRENCY, DSPACE_UPLOAD_MAX_BYTES
+from .Metrics import measured
+
+
+def sourceSize(source):
+    """Size of the source in bytes when it is known before reading, otherwise None."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return len(source)
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.getsize(source)
+    size = getattr(source, "size", None)
+    return size if isinstance(size, int) else None
+
+
+class ByteBudget:
+    """Admits uploads while the bytes in flight stay under `limit`.
+
+    A file larger than the whole budget is admitted alone, so nothing waits forever.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self, size):
+        size = min(size, self.limit)
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.used == 0 or self.used + size <= self.limit)
+            self.used += size
+        return size
+
+    async def release(self, size):
+        async with self._condition:
+            self.used -= size
+            self._condition.notify_all()
+
+
+class UploadProgress:
+    """State of the files of one addFilesItem call.
+
+    `snapshot()` returns the current state of every file, usable by a polling field;
+    `events()` yields every change as it happens, usable by a subscription. An event is
+    {"index", "filename", "bundleName", "state", "sent", "size", "bitstream"}, where state is
+    one of queued, uploading, done, reused or failed.
+    """
+
+    FINAL = ("done", "reused", "failed")
+
+    def __init__(self, files=()):
+        self.started = time.monotonic()
+        self.files = [
+            {
+                "index": index,
+                "filename": file["filename"],
+                "bundleName": file.get("bundleName", "ORIGINAL"),
+                "state": "queued",
+                "sent": 0,
+                "size": sourceSize(file["source"]),
+                "bitstream": None,
+            }
+            for index, file in enumerate(files)
+        ]
+        self._listeners = []
+
+    def update(self, index, **values):
+        state = self.files[index]
+        state.update(values)
+        event = dict(state)
+        for queue in self._listeners:
+            queue.put_nowait(event)
+        return event
+
+    def snapshot(self):
+        return {
+            "files": [dict(state) for state in self.files],
+            "sent": sum(state["sent"] for state in self.files),
+            "finished": all(state["state"] in self.FINAL for state in self.files),
+            "elapsed": time.monotonic() - self.started,
+        }
+
+    async def events(self):
+        queue = asyncio.Queue()
+        self._listeners.append(queue)
+        current = [dict(state) for state in self.files]
+        remaining = sum(state["state"] not in self.FINAL for state in current)
+        try:
+            for state in current:
+                yield state
+            while remaining:
+                event = await queue.get()
+                yield event
+                if event["state"] in self.FINAL:
+                    remaining -= 1
+        finally:
+            self._listeners.remove(queue)
+
+
+async def bundlesOfItem(itemId, names):
+    """Returns {name: bundle uuid} for the names, bundles missing in the item are created."""
+    bundles = {}
+    async for bundle in iterateBundles(itemId):
+        bundles.setdefault(bundle["name"], bundle["uuid"])
+    for name in names:
+        if name not in bundles:
+            result = await addBundleItem(itemId, name=name)
+            if result["msg"] not in (200, 201):
+                message = (result.get("error") or {}).get("message") or f"status {result['msg']}"
+                raise RuntimeError(f"Bundle {name} could not be created, {message}")
+            bundles[name] = result["response"]["uuid"]
+    return bundles
+
+
+@measured()
+async def addFilesItem(itemId, files, concurrency=DSPACE_UPLOAD_CONCURRENCY, maxBytes=DSPACE_UPLOAD_MAX_BYTES, progress=None, onProgress=None, chunkSize=CHUNK_SIZE, contentIndex=None):
+    """Uploads several files into bundles of one item at once.
+
+    `files` are dicts with source (see iterContent), filename and optionally contentType,
+    bundleName (ORIGINAL by default) and description. Bundles are looked up and created once,
+    then the files are streamed in parallel through the shared client, at most `concurrency`
+    at once and at most `maxBytes` of admitted file sizes in flight. Content the bundle already
+    holds is not sent again (see uploadBitstreamOnce and `contentIndex`).
+
+    Progress goes to `progress` (an UploadProgress) and to `onProgress(event)`.
+    Results keep the order of `files`, a failed file does not stop the others.
+    """
+    progress = UploadProgress(files) if progress is None else progress
+    budget = ByteBudget(maxBytes)
+
+    def report(index, **values):
+        event = progress.update(index, **values)
+        if onProgress is not None:
+            onProgress(event)
+
+    try:
+        # authenticates the client before the parallel uploads start
+        bundles = await bundlesOfItem(itemId, sorted({file.get("bundleName", "ORIGINAL") for file in files}))
+    except Exception as error:
+        for index in range(len(files)):
+            report(index, state="failed")
+        return [errorResult(error) for _ in files]
+
+    async def upload(index, file):
+        bundleId = bundles[file.get("bundleName", "ORIGINAL")]
+        size = progress.files[index]["size"]
+        admitted = await budget.acquire(maxBytes if size is None else size)
+        try:
+            stored = await findStoredContent(file["source"], bundleId=bundleId, shared=False, index=contentIndex, chunkSize=chunkSize)
+            if stored is not None:
+                report(index, state="reused", bitstream=stored["response"]["uuid"])
+                return stored
+
+            report(index, state="uploading")
+
+            async def counted():
+                async for chunk in iterContent(file["source"], chunkSize=chunkSize):
+                    yield chunk
+                    report(index, sent=progress.files[index]["sent"] + len(chunk))
+
+            result = await uploadBitstreamOnce(
+                bundleId, counted(), file["filename"],
+                contentType=file.get("contentType", "application/pdf"),
+                bundleName=file.get("bundleName", "ORIGINAL"),
+                description=file.get("description"), chunkSize=chunkSize, index=contentIndex
+            )
+        except Exception:
+            report(index, state="failed")
+            raise
+        finally:
+            await budget.release(admitted)
+        if result["msg"] == 201:
+            report(index, state="done", bitstream=result["response"]["uuid"])
+        else:
+            report(index, state="failed")
+        return result
+
+    return await gatherLimited(
+        [(lambda index=index, file=file: upload(index, file)) for index, file in enumerate(files)],
+        concurrency=concurrency
+    )
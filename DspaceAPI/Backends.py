@@ -0,0 +1,279 @@
+"""Several DSpace instances behind one client.
+
+DSPACE_BACKENDS holds a JSON list (or a path to a JSON file) of backends:
+
+    [
+        {"name": "main", "url": "http://dspace-1:8080", "user": "...", "password": "...", "default": true},
+        {"name": "archive", "url": "http://dspace-2:8080", "communities": ["<uuid>"], "collections": ["<uuid>"]}
+    ]
+
+Every backend gets its own DSpaceClient (connection pool, token, XSRF state). RoutingClient
+stands in for the process wide client, so all DspaceAPI operations are routed without change.
+"""
+import asyncio
+import collections
+import json
+import re
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from .Client import DSpaceClient
+from .config import DSPACE_BACKENDS, DSPACE_BACKEND_ROUTES, DSPACE_USER, DSPACE_PASSWORD
+
+# DSpace resources addressed by uuid, the id in a path tells which backend has to answer
+RESOURCE_PATTERN = re.compile(r"/server/api/core/(items|bundles|bitstreams|collections|communities)/([0-9a-fA-F-]{36})")
+PARENT_PATTERN = re.compile(r"[?&](owningCollection|parent)=([0-9a-fA-F-]{36})")
+PARENT_KINDS = {"owningCollection": "collections", "parent": "communities"}
+RESOURCE_KINDS = {"item": "items", "bundle": "bundles", "bitstream": "bitstreams", "collection": "collections", "community": "communities"}
+# id-less paths answered by the default backend alone, every backend has its own session
+SINGLE_BACKEND_PREFIXES = ("/server/api/authn",)
+
+
+class Backend:
+    """One DSpace instance and the collections / communities stored in it."""
+
+    def __init__(self, name, url, user=DSPACE_USER, password=DSPACE_PASSWORD, collections=(), communities=(), default=False):
+        self.name = name
+        self.client = DSpaceClient(baseUrl=url, user=user, password=password)
+        self.collections = {f"{id}".lower() for id in collections}
+        self.communities = {f"{id}".lower() for id in communities}
+        self.default = default
+
+    @classmethod
+    def from_dict(cls, value):
+        return cls(
+            value["name"], value["url"],
+            user=value.get("user", DSPACE_USER), password=value.get("password", DSPACE_PASSWORD),
+            collections=value.get("collections", ()), communities=value.get("communities", ()),
+            default=value.get("default", False),
+        )
+
+
+def withPage(path, number):
+    """`path` with ?page= set to `number`, other parameters are kept."""
+    parts = urlsplit(path)
+    query = [(name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True) if name != "page"]
+    return urlunsplit(parts._replace(query=urlencode(query + [("page", number)])))
+
+
+def mergeListings(listings, path):
+    """One HAL page from the same page of a listing in several backends.
+
+    Embedded element lists are concatenated, nested listings (searchResult of a discover
+    search) are merged the same way. totalElements are summed and `next` points to the
+    following page of all backends as long as any backend has one.
+    """
+    merged = {key: value for key, value in listings[0].items() if key not in ("_embedded", "_links", "page")}
+    embedded = {}
+    nested = {}
+    for listing in listings:
+        for key, value in (listing.get("_embedded") or {}).items():
+            if isinstance(value, list):
+                embedded.setdefault(key, []).extend(value)
+            elif isinstance(value, dict):
+                nested.setdefault(key, []).append(value)
+    embedded.update({key: mergeListings(values, path) for key, values in nested.items()})
+    merged["_embedded"] = embedded
+    merged["_links"] = {"self": {"href": path}}
+
+    pages = [listing["page"] for listing in listings if isinstance(listing.get("page"), dict)]
+    if pages:
+        number = pages[0].get("number", 0)
+        totalPages = max(page.get("totalPages", 0) for page in pages)
+        merged["page"] = {
+            "size": sum(page.get("size", 0) for page in pages),
+            "totalElements": sum(page.get("totalElements", 0) for page in pages),
+            "totalPages": totalPages,
+            "number": number,
+        }
+        if number + 1 < totalPages:
+            merged["_links"]["next"] = {"href": withPage(path, number + 1)}
+    return merged
+
+
+def loadBackends(value=DSPACE_BACKENDS):
+    """Backends from DSPACE_BACKENDS (JSON or a path to a JSON file), an empty list when not configured."""
+    if not value:
+        return []
+    if not value.lstrip().startswith("["):
+        with open(value, "r", encoding="utf-8") as f:
+            value = f.read()
+    return [Backend.from_dict(backend) for backend in json.loads(value)]
+
+
+class RoutingClient:
+    """Client with the DSpaceClient interface which sends every request to the right backend.
+
+    The backend is chosen by the uuid in the path (item, bundle, bitstream, collection, community)
+    or in ?owningCollection= / ?parent=. Configured collections and communities are known upfront,
+    other ids are learned from responses; an id seen for the first time is looked up in all
+    backends at once. GETs without an id (listings, communities, discover search) are sent to
+    all backends and their pages merged (see mergeListings); login and streamed requests
+    without an id go to the default backend.
+    """
+
+    def __init__(self, backends, routes=DSPACE_BACKEND_ROUTES):
+        if not backends:
+            raise ValueError("RoutingClient needs at least one backend")
+        self.backends = {backend.name: backend for backend in backends}
+        self.default = next((backend for backend in backends if backend.default), backends[0])
+        self.maxRoutes = routes
+        self._routes = collections.OrderedDict()
+        self._locating = {}
+        for backend in backends:
+            for id in backend.collections:
+                self._routes[("collections", id)] = backend
+            for id in backend.communities:
+                self._routes[("communities", id)] = backend
+        # configured routes are never evicted
+        self._configured = set(self._routes)
+
+    @property
+    def baseUrl(self):
+        return self.default.client.baseUrl
+
+    def remember(self, kind, id, backend):
+        key = (kind, f"{id}".lower())
+        self._routes[key] = backend
+        self._routes.move_to_end(key)
+        while len(self._routes) > self.maxRoutes + len(self._configured):
+            oldest = next(key for key in self._routes if key not in self._configured)
+            del self._routes[oldest]
+
+    def learn(self, backend, response):
+        """Remembers the backend of the resources in a response and of those embedded in it."""
+        if isinstance(response, list):
+            for element in response:
+                self.learn(backend, element)
+            return
+        if not isinstance(response, dict):
+            return
+        kind = RESOURCE_KINDS.get(response.get("type"))
+        if kind is not None and response.get("uuid"):
+            self.remember(kind, response["uuid"], backend)
+        for embedded in response.get("_embedded", {}).values():
+            self.learn(backend, embedded)
+
+    def target(self, path):
+        """(kind, id) of the resource a path addresses, None for paths without one."""
+        match = RESOURCE_PATTERN.search(path) or PARENT_PATTERN.search(path)
+        if match is None:
+            return None
+        kind, id = match.groups()
+        return PARENT_KINDS.get(kind, kind), id.lower()
+
+    def _byUrl(self, path):
+        # absolute urls, e.g. _links.next of a listing, name their backend
+        for backend in self.backends.values():
+            if path.startswith(backend.client.baseUrl):
+                return backend
+        return None
+
+    def known(self, path):
+        """Backend of a path from what is known already, the default one otherwise."""
+        backend = self._byUrl(path)
+        if backend is not None:
+            return backend
+        target = self.target(path)
+        backend = None if target is None else self._routes.get(target)
+        return self.default if backend is None else backend
+
+    async def _locate(self, kind, id):
+        async def probe(backend):
+            result = await backend.client.fetch("GET", f"/server/api/core/{kind}/{id}")
+            return backend if result["msg"] == 200 else None
+
+        found = [backend for backend in await asyncio.gather(*(probe(backend) for backend in self.backends.values())) if backend]
+        backend = found[0] if found else self.default
+        if found:
+            self.remember(kind, id, backend)
+        return backend
+
+    async def backend(self, path):
+        """Backend which has to answer a request for `path`."""
+        backend = self._byUrl(path)
+        if backend is not None:
+            return backend
+        target = self.target(path)
+        if target is None:
+            return self.default
+        backend = self._routes.get(target)
+        if backend is not None:
+            self._routes.move_to_end(target)
+            return backend
+        if len(self.backends) == 1:
+            return self.default
+        # concurrent requests for the same unknown id share one lookup
+        if target not in self._locating:
+            task = asyncio.ensure_future(self._locate(*target))
+            self._locating[target] = task
+            task.add_done_callback(lambda _: self._locating.pop(target, None))
+        return await asyncio.shield(self._locating[target])
+
+    def fansOut(self, method, path):
+        """True for requests answered by all backends together."""
+        return (
+            len(self.backends) > 1
+            and method.upper() == "GET"
+            and not path.startswith(SINGLE_BACKEND_PREFIXES)
+            and self._byUrl(path) is None
+            and self.target(path) is None
+        )
+
+    async def _fetchAll(self, method, path, **kwargs):
+        backends = list(self.backends.values())
+        results = await asyncio.gather(*(backend.client.fetch(method, path, **kwargs) for backend in backends))
+        for backend, result in zip(backends, results):
+            if result["msg"] != 200:
+                # a listing missing one backend would look complete, e.g. to the mirror
+                return result
+            self.learn(backend, result["response"])
+        responses = [result["response"] for result in results]
+        if not all(isinstance(response, dict) and ("_embedded" in response or "page" in response) for response in responses):
+            return results[backends.index(self.default)]
+        result = {}
+        result["msg"] = 200
+        result["response"] = mergeListings(responses, path)
+        return result
+
+    async def fetch(self, method, path, **kwargs):
+        if self.fansOut(method, path):
+            return await self._fetchAll(method, path, **kwargs)
+        backend = await self.backend(path)
+        result = await backend.client.fetch(method, path, **kwargs)
+        if result["msg"] in (200, 201):
+            self.learn(backend, result["response"])
+        return result
+
+    @asynccontextmanager
+    async def request(self, method, path, **kwargs):
+        backend = await self.backend(path)
+        async with backend.client.request(method, path, **kwargs) as response:
+            yield response
+
+    def requestKey(self, method, path, headers=None, params=None):
+        return self.known(path).client.requestKey(method, path, headers=headers, params=params)
+
+    async def singleFlight(self, key, factory):
+        return await self.default.client.singleFlight(key, factory)
+
+    @property
+    def authenticated(self):
+        return self.default.client.authenticated
+
+    async def login(self, force=False, stale_token=None):
+        await self.default.client.login(force=force, stale_token=stale_token)
+
+    def open(self, **poolOptions):
+        for backend in self.backends.values():
+            backend.client.open(**poolOptions)
+
+    async def close(self):
+        for backend in self.backends.values():
+            await backend.client.close()
+
+
+def createClient(value=DSPACE_BACKENDS):
+    """The process wide client: a RoutingClient when DSPACE_BACKENDS is set, a single DSpaceClient otherwise."""
+    backends = loadBackends(value)
+    return RoutingClient(backends) if backends else DSpaceClient()
@@ -0,0 +1,93 @@
+import collections
+import time
+
+from .Client import getClient, readBody, DSpaceError, errorResult
+from .config import DSPACE_LISTING_TTL
+
+COMMUNITIES_PATH = "/server/api/core/communities"
+COLLECTIONS_PATH = "/server/api/core/collections"
+
+
+class ListingCache:
+    """In-process cache of GET results for rarely changing listings.
+
+    A result is served from memory for `ttl` seconds, after that it is revalidated with
+    If-None-Match / If-Modified-Since so an unchanged listing costs only a 304.
+    Callers missing the cache at the same time wait for one request.
+    Cached results are shared between callers and must not be modified.
+
+    Every path has a generation which `invalidate` bumps. A request started before the
+    invalidation does not store its result, and later callers do not join it.
+    """
+
+    def __init__(self, ttl=DSPACE_LISTING_TTL):
+        self.ttl = ttl
+        self._entries = {}
+        self._generations = collections.Counter()
+
+    async def fetch(self, path, client=None):
+        client = getClient() if client is None else client
+        entry = self._entries.get(path)
+        if entry is not None and time.monotonic() < entry["expires"]:
+            return dict(entry["result"])
+        generation = self._generations.setdefault(path, 0)
+        key = ("listing", generation) + client.requestKey("GET", path)
+        return await client.singleFlight(key, lambda: self._revalidate(path, client, generation))
+
+    def _current(self, path, generation):
+        # False when the path was invalidated while its request was running
+        return self._generations[path] == generation
+
+    async def _fetchMerged(self, path, client, generation):
+        # a listing merged from several backends has no ETag of its own, it is fetched again
+        result = await client.fetch("GET", path)
+        if result["msg"] == 200 and self._current(path, generation):
+            self._entries[path] = {"expires": time.monotonic() + self.ttl, "etag": None, "lastModified": None, "result": result}
+        return dict(result)
+
+    async def _revalidate(self, path, client, generation):
+        fansOut = getattr(client, "fansOut", None)
+        if fansOut is not None and fansOut("GET", path):
+            return await self._fetchMerged(path, client, generation)
+        entry = self._entries.get(path)
+        headers = {}
+        if entry is not None:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["lastModified"]:
+                headers["If-Modified-Since"] = entry["lastModified"]
+
+        try:
+            async with client.request("GET", path, headers=headers) as response:
+                if response.status == 304 and entry is not None:
+                    if self._current(path, generation):
+                        entry["expires"] = time.monotonic() + self.ttl
+                    return dict(entry["result"])
+
+                result = {}
+                result["msg"] = response.status
+                result["response"] = await readBody(response)
+        except DSpaceError as error:
+            return errorResult(error)
+
+        if result["msg"] == 200 and self._current(path, generation):
+            self._entries[path] = {
+                "expires": time.monotonic() + self.ttl,
+                "etag": response.headers.get("ETag"),
+                "lastModified": response.headers.get("Last-Modified"),
+                "result": result,
+            }
+        return dict(result)
+
+    def invalidate(self, prefix=""):
+        """Drops cached listings whose path starts with `prefix`, everything by default."""
+        for path in [path for path in self._generations if path.startswith(prefix)]:
+            self._generations[path] += 1
+            self._entries.pop(path, None)
+
+
+listingCache = ListingCache()
+
+
+def invalidateListings(prefix=""):
+    listingCache.invalidate(prefix)
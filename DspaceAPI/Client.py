@@ -0,0 +1,355 @@
+import asyncio
+import copy
+import time
+from contextlib import asynccontextmanager
+
+import aiohttp
+import jwt
+
+from .config import (
+    DSPACE_DOMAIN,
+    DSPACE_PORT,
+    DSPACE_USER,
+    DSPACE_PASSWORD,
+    DSPACE_TOKEN_LIFETIME,
+    DSPACE_TOKEN_REFRESH_MARGIN,
+    DSPACE_POOL_LIMIT,
+    DSPACE_POOL_LIMIT_PER_HOST,
+    DSPACE_KEEPALIVE_TIMEOUT,
+    DSPACE_DNS_CACHE_TTL,
+    DSPACE_CONNECT_TIMEOUT,
+    DSPACE_READ_TIMEOUT,
+    DSPACE_COALESCE_GETS,
+)
+from .Resilience import RetryPolicy, CircuitBreaker, IDEMPOTENT_METHODS, RETRY_STATUSES
+from .Metrics import metricsTrace
+
+XSRF_COOKIE = "DSPACE-XSRF-COOKIE"
+XSRF_HEADER = "DSPACE-XSRF-TOKEN"
+
+STATUS_PATH = "/server/api/authn/status"
+LOGIN_PATH = "/server/api/authn/login"
+
+
+class DSpaceError(Exception):
+    """Raised when a DSpace answer cannot be used, keeps the status and the body."""
+
+    def __init__(self, message, status=None, response=None):
+        super().__init__(message)
+        self.status = status
+        self.response = response
+
+
+class DSpaceAuthError(DSpaceError):
+    """Raised when DSpace refuses the configured credentials."""
+
+
+class DSpaceUnavailableError(DSpaceError):
+    """Raised without contacting DSpace while the circuit breaker is open."""
+
+
+def errorResult(error):
+    """Structured result of an operation which failed without a usable DSpace answer."""
+    return {
+        "msg": getattr(error, "status", None),
+        "response": getattr(error, "response", None),
+        "error": {"type": type(error).__name__, "message": str(error)},
+    }
+
+
+def tokenExpiration(bearer_token, default_lifetime=DSPACE_TOKEN_LIFETIME):
+    """Returns the unix time when the bearer token expires.
+    DSpace issues JWTs, the "exp" claim is read without signature verification.
+    """
+    token = bearer_token.split(" ", 1)[-1] if bearer_token else ""
+    try:
+        claims = jwt.decode(token, options={"verify_signature": False})
+        return float(claims["exp"])
+    except (jwt.PyJWTError, KeyError, TypeError, ValueError):
+        return time.time() + default_lifetime
+
+
+def createSession(
+    limit=DSPACE_POOL_LIMIT,
+    limit_per_host=DSPACE_POOL_LIMIT_PER_HOST,
+    keepalive_timeout=DSPACE_KEEPALIVE_TIMEOUT,
+    ttl_dns_cache=DSPACE_DNS_CACHE_TTL,
+    sock_connect=DSPACE_CONNECT_TIMEOUT,
+    sock_read=DSPACE_READ_TIMEOUT,
+):
+    """Creates a session with a keep-alive connection pool for DSpace traffic, its requests are measured (see Metrics)."""
+    connector = aiohttp.TCPConnector(
+        limit=limit,
+        limit_per_host=limit_per_host,
+        keepalive_timeout=keepalive_timeout,
+        ttl_dns_cache=ttl_dns_cache,
+        use_dns_cache=True,
+    )
+    # no total timeout, large bitstreams may stream for a long time as long as data flows
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=sock_connect, sock_read=sock_read)
+    # DSpace is often addressed by IP, the default jar would drop its XSRF cookie
+    return aiohttp.ClientSession(
+        connector=connector, timeout=timeout, cookie_jar=aiohttp.CookieJar(unsafe=True),
+        trace_configs=[metricsTrace()],
+    )
+
+
+async def readBody(response):
+    """Returns parsed JSON body, plain text for non JSON bodies and None for empty ones."""
+    body = await response.read()
+    if not body.strip():
+        return None
+    try:
+        return await response.json(content_type=None)
+    except ValueError:
+        return body.decode(response.get_encoding(), errors="replace")
+
+
+class DSpaceClient:
+    """Long-lived client for the DSpace REST API.
+
+    The client logs in once and keeps the bearer token and the XSRF token for all following requests.
+    Both are refreshed when the token is about to expire or when DSpace answers 401 / 403.
+    Idempotent requests are retried with backoff, a circuit breaker fails fast while DSpace is down.
+    Concurrent identical GETs share one request to DSpace (see singleFlight).
+    """
+
+    def __init__(
+        self,
+        baseUrl=f"{DSPACE_DOMAIN}:{DSPACE_PORT}",
+        user=DSPACE_USER,
+        password=DSPACE_PASSWORD,
+        session=None,
+        retry=None,
+        breaker=None,
+        coalesce=DSPACE_COALESCE_GETS,
+    ):
+        self.baseUrl = baseUrl.rstrip("/")
+        self.user = user
+        self.password = password
+        self._session = session
+        self._bearer_token = None
+        self._xsrf_token = None
+        self._expires = 0.0
+        self._lock = asyncio.Lock()
+        self.retry = RetryPolicy() if retry is None else retry
+        self.breaker = CircuitBreaker() if breaker is None else breaker
+        self.coalesce = coalesce
+        self._inflight = {}
+
+    @property
+    def session(self):
+        if self._session is None or self._session.closed:
+            self._session = createSession()
+        return self._session
+
+    def open(self, **poolOptions):
+        """Replaces the session by a new one with the given pool options (see createSession)."""
+        self._session = createSession(**poolOptions)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def url(self, path):
+        return path if path.startswith("http") else f"{self.baseUrl}{path}"
+
+    def _storeXsrf(self, response):
+        # DSpace rotates the token, the newest one arrives either as header or as cookie
+        token = response.headers.get(XSRF_HEADER)
+        if token is None:
+            cookie = response.cookies.get(XSRF_COOKIE)
+            token = None if cookie is None else cookie.value
+        if token:
+            self._xsrf_token = token
+
+    @property
+    def authenticated(self):
+        return (
+            self._bearer_token is not None
+            and time.time() < self._expires - DSPACE_TOKEN_REFRESH_MARGIN
+        )
+
+    async def _login(self):
+        async with self.session.get(self.url(STATUS_PATH)) as response:
+            self._storeXsrf(response)
+
+        headers = {
+            "Content-Type": "application/x-www-form-urlencoded",
+            "X-XSRF-TOKEN": self._xsrf_token or "",
+        }
+        data = {"user": self.user, "password": self.password}
+        async with self.session.post(self.url(LOGIN_PATH), headers=headers, data=data) as response:
+            self._storeXsrf(response)
+            bearer_token = response.headers.get("Authorization")
+            if response.status != 200 or bearer_token is None:
+                raise DSpaceAuthError(f"DSpace login failed with status {response.status}")
+
+        self._bearer_token = bearer_token
+        self._expires = tokenExpiration(bearer_token)
+
+    async def login(self, force=False, stale_token=None):
+        """Obtains a new bearer token if there is no valid one.
+        When `stale_token` is given, login is skipped if another task has already replaced it.
+        """
+        async with self._lock:
+            if stale_token is not None and stale_token != self._bearer_token:
+                return
+            if force or stale_token is not None or not self.authenticated:
+                await self._login()
+
+    def headers(self, headers=None):
+        result = {"Authorization": self._bearer_token}
+        if self._xsrf_token:
+            result["X-XSRF-TOKEN"] = self._xsrf_token
+        if headers:
+            result.update(headers)
+        return result
+
+    async def _send(self, method, path, headers, replayable, **kwargs):
+        if not self.authenticated:
+            await self.login()
+        used_token = self._bearer_token
+        response = await self.session.request(method, self.url(path), headers=self.headers(headers), **kwargs)
+        self._storeXsrf(response)
+        if response.status in (401, 403) and replayable:
+            # 403 is also the answer to an outdated XSRF token, login refreshes both
+            response.release()
+            await self.login(stale_token=used_token)
+            response = await self.session.request(method, self.url(path), headers=self.headers(headers), **kwargs)
+            self._storeXsrf(response)
+        return response
+
+    @asynccontextmanager
+    async def request(self, method, path, headers=None, replayable=True, idempotent=None, **kwargs):
+        """Sends an authenticated request and yields the response.
+
+        A request rejected with 401 / 403 is sent once more with fresh credentials,
+        `replayable=False` disables this for bodies which cannot be read twice.
+        Idempotent requests (by method unless `idempotent` is given) are retried after
+        connection errors and 5xx answers. DSpaceError is raised when no answer was obtained
+        and also when the body breaks off while it is read inside the block.
+        """
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+        attempts = self.retry.attempts if idempotent and replayable else 1
+
+        response = None
+        for attempt in range(attempts):
+            if not self.breaker.allow():
+                raise DSpaceUnavailableError(f"DSpace is unavailable, {method} {path} not sent")
+            try:
+                response = await self._send(method, path, headers, replayable, **kwargs)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+                self.breaker.failure()
+                if attempt + 1 >= attempts:
+                    raise DSpaceError(f"{method} {path} failed: {error!r}") from error
+                await asyncio.sleep(self.retry.delay(attempt))
+                continue
+
+            if response.status not in RETRY_STATUSES:
+                self.breaker.success()
+                break
+            self.breaker.failure()
+            if attempt + 1 >= attempts:
+                break
+            response.release()
+            await asyncio.sleep(self.retry.delay(attempt))
+
+        try:
+            yield response
+        except (aiohttp.ClientPayloadError, aiohttp.ClientConnectionError, asyncio.TimeoutError) as error:
+            # the answer started but did not arrive, no usable status for the caller
+            self.breaker.failure()
+            raise DSpaceError(f"{method} {path} failed while reading the body: {error!r}") from error
+        finally:
+            response.release()
+
+    def requestKey(self, method, path, headers=None, params=None):
+        """Identity of a request for coalescing, None when the request must be sent on its own.
+        The user is part of the key, answers depend on the permissions of the account.
+        """
+        if method.upper() != "GET":
+            return None
+        return (
+            method.upper(),
+            self.url(path),
+            tuple(sorted((params or {}).items())),
+            tuple(sorted((headers or {}).items())),
+            self.user,
+        )
+
+    async def singleFlight(self, key, factory):
+        """Awaits `factory()`, callers with the same key arriving while it runs share its result.
+
+        The shared call is shielded, a cancelled caller does not cancel it for the others,
+        and its exception is raised in every caller. The result is snapshotted before anybody
+        gets it and every caller, the first one too, gets its own deep copy of the snapshot,
+        so results may be modified as before.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            async def run():
+                try:
+                    return copy.deepcopy(await factory())
+                finally:
+                    # nobody may join a finished call, later callers send a new request
+                    self._inflight.pop(key, None)
+
+            task = asyncio.ensure_future(run())
+            self._inflight[key] = task
+        return copy.deepcopy(await asyncio.shield(task))
+
+    async def fetch(self, method, path, **kwargs):
+        """Sends a request and returns the usual {"msg": status, "response": body} result.
+        When DSpace could not be reached the result carries an "error" description instead.
+        """
+        key = None
+        if self.coalesce and set(kwargs) <= {"headers", "params"}:
+            key = self.requestKey(method, path, **kwargs)
+        if key is not None:
+            return await self.singleFlight(key, lambda: self._fetch(method, path, **kwargs))
+        return await self._fetch(method, path, **kwargs)
+
+    async def _fetch(self, method, path, **kwargs):
+        try:
+            async with self.request(method, path, **kwargs) as response:
+                result = {}
+                result["msg"] = response.status
+                result["response"] = await readBody(response)
+                return result
+        except DSpaceError as error:
+            return errorResult(error)
+
+
+_client = None
+
+
+def getClient():
+    """Returns the process wide client, a RoutingClient when several backends are configured."""
+    global _client
+    if _client is None:
+        from .Backends import createClient
+        _client = createClient()
+    return _client
+
+
+def setClient(client):
+    global _client
+    _client = client
+    return client
+
+
+async def startClient(**poolOptions):
+    """Opens the pooled session, intended for the application lifespan."""
+    client = getClient()
+    await client.close()
+    client.open(**poolOptions)
+    return client
+
+
+async def closeClient():
+    """Closes the pooled session, intended for the application shutdown."""
+    if _client is not None:
+        await _client.close()
@@ -0,0 +1,68 @@
+import asyncio
+import time
+
+from .Client import errorResult
+from .config import DSPACE_BULK_CONCURRENCY, DSPACE_BULK_RATE
+
+
+class RateLimiter:
+    """Spaces out acquisitions so that at most `rate` of them happen per second."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+async def gatherLimited(calls, concurrency=DSPACE_BULK_CONCURRENCY, rate=DSPACE_BULK_RATE):
+    """Awaits coroutine factories with at most `concurrency` in flight and `rate` starts per second.
+    Results keep the order of `calls`, an exception of one call becomes its error result.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    limiter = RateLimiter(rate)
+
+    async def run(call):
+        async with semaphore:
+            await limiter.acquire()
+            try:
+                return await call()
+            except Exception as error:
+                return errorResult(error)
+
+    return await asyncio.gather(*(run(call) for call in calls))
+
+
+async def gatherOrCancel(*coroutines):
+    """Runs coroutines concurrently like asyncio.gather, but the first failure cancels the others.
+
+    The exception is raised only after the others have finished cancelling, so nothing keeps
+    running in the background (asyncio.TaskGroup does this from Python 3.11 on).
+    """
+    tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    for task in tasks:
+        if not task.cancelled() and task.exception() is not None:
+            raise task.exception()
+    return [task.result() for task in tasks]
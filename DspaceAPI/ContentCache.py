@@ -0,0 +1,238 @@
+import asyncio
+import collections
+import fcntl
+import os
+import secrets
+import time
+from collections import OrderedDict
+
+from .GetContentItem import streamItemContent
+from .config import DSPACE_CONTENT_CACHE_DIR, DSPACE_CONTENT_CACHE_BYTES, DSPACE_CONTENT_CACHE_PART_AGE
+
+LOCK_NAME = ".lock"
+
+
+def bitstreamChecksum(bitstream):
+    """Checksum value from bitstream metadata as returned by DSpace."""
+    return (bitstream.get("checkSum") or {}).get("value")
+
+
+def _lock(directory):
+    # one process per directory, returns the held lock file or None when another process has it
+    os.makedirs(directory, exist_ok=True)
+    lock = open(os.path.join(directory, LOCK_NAME), "a")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock.close()
+        return None
+    return lock
+
+
+def _scan(directory, partAge=DSPACE_CONTENT_CACHE_PART_AGE):
+    # files left by a previous process, the least recently used first; stale unfinished ones are dropped
+    entries = []
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if name == LOCK_NAME:
+            continue
+        stat = os.stat(path)
+        if name.endswith(".part"):
+            if time.time() - stat.st_mtime > partAge:
+                _removeAll([path])
+            continue
+        entries.append((stat.st_atime, name, stat.st_size))
+    return [(name, size) for _, name, size in sorted(entries)]
+
+
+def _removeAll(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class CacheWriter:
+    """Fills one cache entry while the content passes by, see ContentCache.writer.
+
+    Writing never fails the caller: after an error the writer only discards what it has.
+    """
+
+    def __init__(self, cache, key):
+        self.cache = cache
+        self.key = key
+        # unique per writer, unfinished files of others are never touched
+        self.partial = f"{os.path.join(cache.directory, key)}.{os.getpid()}-{secrets.token_hex(4)}.part"
+        self.size = 0
+        self._file = None
+        self._failed = False
+
+    async def write(self, chunk):
+        if self._failed:
+            return
+        try:
+            if self._file is None:
+                self._file = await asyncio.to_thread(open, self.partial, "wb")
+            await asyncio.to_thread(self._file.write, chunk)
+            self.size += len(chunk)
+        except OSError:
+            self._failed = True
+
+    async def _close(self):
+        if self._file is not None:
+            await asyncio.to_thread(self._file.close)
+            self._file = None
+
+    async def commit(self):
+        """Publishes the written content as the entry, returns its path or None."""
+        try:
+            await self._close()
+            if self._failed or self.size == 0:
+                await asyncio.to_thread(_removeAll, [self.partial])
+                return None
+            await asyncio.to_thread(os.replace, self.partial, os.path.join(self.cache.directory, self.key))
+        except OSError:
+            await asyncio.to_thread(_removeAll, [self.partial])
+            return None
+        finally:
+            self.cache._filling.discard(self.key)
+        return await self.cache._add(self.key, self.size)
+
+    async def abort(self):
+        """Drops what was written, e.g. when the client went away in the middle."""
+        try:
+            await self._close()
+            await asyncio.to_thread(_removeAll, [self.partial])
+        finally:
+            self.cache._filling.discard(self.key)
+
+
+class ContentCache:
+    """Size bounded on-disk cache of bitstream content with LRU eviction.
+
+    Files are keyed by bitstream id and DSpace checksum, so a changed bitstream gets a new key
+    and the stale file simply ages out. Checking freshness needs only the bitstream metadata,
+    which the callers already have from the bundle listing.
+
+    Entries are filled by a CacheWriter while the content streams to the client (or by `fill`
+    in the background), nobody waits for the cache. An entry being served is pinned by
+    `acquire` until `release`, eviction skips it.
+
+    The index, the pins and the byte budget live in the process, so a directory belongs to one
+    process: it is locked on the first use, in other processes (e.g. more API workers) the cache
+    stays off. Give each worker its own DSPACE_CONTENT_CACHE_DIR to cache in all of them.
+    """
+
+    def __init__(self, directory=DSPACE_CONTENT_CACHE_DIR, maxBytes=DSPACE_CONTENT_CACHE_BYTES):
+        self.directory = directory
+        self.maxBytes = maxBytes
+        self.totalBytes = 0
+        self._files = OrderedDict()
+        self._pins = collections.Counter()
+        self._filling = set()
+        self._tasks = set()
+        self._loaded = None
+        self._lock = None
+
+    @property
+    def enabled(self):
+        return self.maxBytes > 0
+
+    def _key(self, bitstreamId, checksum):
+        return f"{bitstreamId}-{checksum}"
+
+    async def _scanDirectory(self):
+        self._lock = await asyncio.to_thread(_lock, self.directory)
+        if self._lock is None:
+            print(f"Content cache {self.directory} is used by another process, caching is off here", flush=True)
+            self.maxBytes = 0
+            return
+        for name, size in await asyncio.to_thread(_scan, self.directory):
+            self._files[name] = size
+            self.totalBytes += size
+        await self._evict()
+
+    async def _load(self):
+        # the directory is scanned once, concurrent first requests share the scan
+        if self._loaded is None:
+            self._loaded = asyncio.ensure_future(self._scanDirectory())
+        await asyncio.shield(self._loaded)
+
+    async def _evict(self):
+        # victims are taken from the index at once, only the removal runs in a thread
+        victims = []
+        for name in list(self._files):
+            if self.totalBytes <= self.maxBytes:
+                break
+            if self._pins[name]:
+                continue
+            self.totalBytes -= self._files.pop(name)
+            victims.append(os.path.join(self.directory, name))
+        if victims:
+            await asyncio.to_thread(_removeAll, victims)
+
+    async def _add(self, key, size):
+        self._files[key] = size
+        self._files.move_to_end(key)
+        self.totalBytes += size
+        await self._evict()
+        return os.path.join(self.directory, key) if key in self._files else None
+
+    async def acquire(self, bitstreamId, checksum):
+        """Returns the path of cached content pinned against eviction, or None on a miss.
+        A hit becomes the most recently used; the caller has to `release` it when done.
+        """
+        await self._load()
+        key = self._key(bitstreamId, checksum)
+        if key not in self._files:
+            return None
+        self._files.move_to_end(key)
+        self._pins[key] += 1
+        return os.path.join(self.directory, key)
+
+    async def release(self, bitstreamId, checksum):
+        key = self._key(bitstreamId, checksum)
+        self._pins[key] -= 1
+        if self._pins[key] <= 0:
+            del self._pins[key]
+            await self._evict()
+
+    async def writer(self, bitstreamId, checksum):
+        """CacheWriter for content about to be streamed, None when the entry exists or is being filled."""
+        await self._load()
+        key = self._key(bitstreamId, checksum)
+        if not self.enabled or key in self._files or key in self._filling:
+            return None
+        self._filling.add(key)
+        return CacheWriter(self, key)
+
+    async def _fill(self, bitstreamId, checksum):
+        writer = await self.writer(bitstreamId, checksum)
+        if writer is None:
+            return None
+        try:
+            result = await streamItemContent(bitstreamId, writer)
+        except BaseException:
+            await writer.abort()
+            raise
+        if result["msg"] != 200:
+            await writer.abort()
+            return None
+        return await writer.commit()
+
+    def fill(self, bitstreamId, checksum):
+        """Downloads the content into the cache in the background, e.g. after a Range request."""
+        task = asyncio.ensure_future(self._fill(bitstreamId, checksum))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def close(self):
+        """Gives the directory up for other processes."""
+        if self._lock is not None:
+            self._lock.close()
+            self._lock = None
+
+
+contentCache = ContentCache()
@@ -0,0 +1,204 @@
+import asyncio
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+
+from .AddBitstreamsItem import iterContent, uploadBitstream, CHUNK_SIZE
+from .GetBitstreamItem import getBitstream
+from .ContentCache import bitstreamChecksum
+from .config import DSPACE_CONTENT_INDEX
+from .Metrics import measured
+
+# sources which can be read twice, their hash is known before anything is sent
+REREADABLE = (bytes, bytearray, memoryview, str, os.PathLike)
+
+
+def contentHash():
+    # md5 is the checksum algorithm of DSpace, the index can be checked against bitstream metadata
+    return hashlib.md5(usedforsecurity=False)
+
+
+async def hashContent(source, chunkSize=CHUNK_SIZE):
+    """Returns (md5, size) of a source which can be read again (bytes or a path)."""
+    digest = contentHash()
+    size = 0
+    async for chunk in iterContent(source, chunkSize=chunkSize):
+        digest.update(chunk)
+        size += len(chunk)
+    return digest.hexdigest(), size
+
+
+class ContentIndex:
+    """Local index of uploaded content, md5 -> bundle -> bitstream.
+
+    Kept in memory and appended to a JSON-lines file, so it survives restarts and can be
+    shared by runs of the importer. Entries are only hints, a bitstream is checked in DSpace
+    before it is reused and forgotten when it is gone. `savedBytes` counts bytes not uploaded.
+
+    Lines of replaced and forgotten entries are dropped when the file is loaded, it is rewritten
+    with the live entries only. Appends and the rewrite hold a lock file next to it.
+    """
+
+    def __init__(self, filename=DSPACE_CONTENT_INDEX):
+        self.filename = filename or None
+        self.savedBytes = 0
+        self._entries = None
+        self._lock = asyncio.Lock()
+
+    @contextlib.contextmanager
+    def _locked(self):
+        # other importer runs may use the same file
+        with open(f"{self.filename}.lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def _load(self):
+        entries = {}
+        if self.filename is None or not os.path.exists(self.filename):
+            return entries
+        with self._locked():
+            lines = 0
+            with open(self.filename, "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    lines += 1
+                    record = json.loads(line)
+                    bundles = entries.setdefault(record["checksum"], {})
+                    if record.get("bitstream") is None:
+                        bundles.pop(record["bundle"], None)
+                    else:
+                        bundles[record["bundle"]] = {"bitstream": record["bitstream"], "size": record["size"]}
+            entries = {checksum: bundles for checksum, bundles in entries.items() if bundles}
+            if lines > sum(len(bundles) for bundles in entries.values()):
+                self._compact(entries)
+        return entries
+
+    def _compact(self, entries):
+        # the new file replaces the old one at once, a crash leaves one of them complete
+        compacted = f"{self.filename}.compact"
+        with open(compacted, "w", encoding="utf-8") as f:
+            for checksum, bundles in entries.items():
+                for bundleId, entry in bundles.items():
+                    f.write(json.dumps({"checksum": checksum, "bundle": bundleId, **entry}) + "\n")
+        os.replace(compacted, self.filename)
+
+    @property
+    def entries(self):
+        if self._entries is None:
+            self._entries = self._load()
+        return self._entries
+
+    def get(self, checksum):
+        """Bundles holding the content, {bundleId: {"bitstream": uuid, "size": bytes}}."""
+        return dict(self.entries.get(checksum, {}))
+
+    def _append(self, line):
+        with self._locked(), open(self.filename, "a", encoding="utf-8") as f:
+            f.write(line)
+
+    async def _write(self, record):
+        if self.filename is None:
+            return
+        async with self._lock:
+            await asyncio.to_thread(self._append, json.dumps(record) + "\n")
+
+    async def remember(self, checksum, bundleId, bitstreamId, size):
+        self.entries.setdefault(checksum, {})[f"{bundleId}"] = {"bitstream": f"{bitstreamId}", "size": size}
+        await self._write({"checksum": checksum, "bundle": f"{bundleId}", "bitstream": f"{bitstreamId}", "size": size})
+
+    async def forget(self, checksum, bundleId):
+        self.entries.get(checksum, {}).pop(f"{bundleId}", None)
+        await self._write({"checksum": checksum, "bundle": f"{bundleId}", "bitstream": None})
+
+    async def find(self, checksum, bundleId=None, shared=False):
+        """Existing bitstream with the content, from `bundleId` or, when `shared`, from any bundle.
+        Returns the bitstream metadata or None.
+        """
+        bundles = self.get(checksum)
+        candidates = [f"{bundleId}"] if f"{bundleId}" in bundles else []
+        if shared:
+            candidates += [candidate for candidate in bundles if candidate != f"{bundleId}"]
+        for candidate in candidates:
+            result = await getBitstream(bundles[candidate]["bitstream"])
+            if result["msg"] == 200:
+                if bitstreamChecksum(result["response"]) in (None, checksum):
+                    return result["response"]
+                # replaced in DSpace
+                await self.forget(checksum, candidate)
+            elif result["msg"] in (404, 410):
+                # deleted in DSpace; other failures (401, 5xx, timeouts) keep the entry
+                await self.forget(checksum, candidate)
+        return None
+
+
+contentIndex = ContentIndex()
+
+
+def _reused(bitstream, size, checksum, index):
+    index.savedBytes += size
+    result = {}
+    result["msg"] = 200
+    result["response"] = bitstream
+    result["checksum"] = checksum
+    result["reused"] = True
+    result["saved"] = size
+    return result
+
+
+async def findStoredContent(source, bundleId=None, shared=True, index=None, chunkSize=CHUNK_SIZE):
+    """Looks up `source` (bytes or a path) in the index without uploading anything.
+    Returns the uploadBitstreamOnce style result of the existing bitstream or None.
+    """
+    index = contentIndex if index is None else index
+    if not isinstance(source, REREADABLE):
+        return None
+    checksum, size = await hashContent(source, chunkSize=chunkSize)
+    bitstream = await index.find(checksum, bundleId=bundleId, shared=shared)
+    return None if bitstream is None else _reused(bitstream, size, checksum, index)
+
+
+@measured()
+async def uploadBitstreamOnce(bundleId, source, filename, contentType="application/pdf", bundleName="ORIGINAL", description=None, chunkSize=CHUNK_SIZE, shared=False, index=None):
+    """uploadBitstream which does not send content DSpace already has.
+
+    Bytes and paths are hashed first; when the bundle (or with `shared` any bundle) already holds
+    the same content, the existing bitstream is returned. Other sources are hashed while they are
+    uploaded and indexed for next time. The result has "checksum", "reused" and "saved" (bytes
+    not uploaded) next to the usual msg / response.
+    """
+    index = contentIndex if index is None else index
+    stored = await findStoredContent(source, bundleId=bundleId, shared=shared, index=index, chunkSize=chunkSize)
+    if stored is not None:
+        return stored
+
+    digest = contentHash()
+    size = 0
+
+    async def hashing(chunks):
+        nonlocal size
+        async for chunk in chunks:
+            digest.update(chunk)
+            size += len(chunk)
+            yield chunk
+
+    content = iterContent(source, chunkSize=chunkSize)
+    chunks = hashing(content)
+    try:
+        result = await uploadBitstream(
+            bundleId, chunks, filename, contentType=contentType,
+            bundleName=bundleName, description=description, chunkSize=chunkSize
+        )
+    finally:
+        await chunks.aclose()
+        await content.aclose()
+
+    checksum = digest.hexdigest()
+    result["checksum"] = checksum
+    result["reused"] = False
+    result["saved"] = 0
+    if result["msg"] == 201 and bitstreamChecksum(result["response"]) in (None, checksum):
+        await index.remember(checksum, bundleId, result["response"]["uuid"], size)
+    return result
@@ -1,103 +1,81 @@
-import aiohttp
-import asyncio
 import json
-from .config import DSPACE_DOMAIN, DSPACE_PORT
+from .Client import getClient
+from .Concurrency import gatherLimited
+from .config import DSPACE_BULK_CONCURRENCY, DSPACE_BULK_RATE
+from .Metrics import measured
 
 """Administrators can directly create an archived item (bypassing the workflow). 
 The content-type is JSON. An example JSON can be seen below:"""
 
-async def createItem(collectionId,title,author="",type="",language="cz"):
-    
-    async with aiohttp.ClientSession() as session:
-        # Step 1: Get XSRF token from cookie
-        url_step1 = f"{DSPACE_DOMAIN}:{DSPACE_PORT}/server/api/authn/status"
-        headers_step1 = {"Content-Type": "application/x-www-form-urlencoded"}
+@measured()
+async def createItem(collectionId,title,author="",type="",language="cz",description=None):
+    client = getClient()
+    headers = {"Content-Type": "application/json"}
 
-        async with session.get(url_step1, headers=headers_step1) as response_step1:
-            xsrf_cookie = response_step1.cookies.get("DSPACE-XSRF-COOKIE").value
+    data = {
+      "name": f"{title}",
+      "metadata": {
+        "dc.contributor.author": [
+          {
+            "value": f"{author}",
+            "language": f"{language}",
+            "authority": "null",
+            "confidence": -1
+          }
+        ],
+        "dc.title": [
+          {
+            "value": f"{title}",
+            "language": f"{language}",
+            "authority": "null",
+            "confidence": -1
+          }
+        ],
+        "dc.type": [
+          {
+            "value": f"{type}",
+            "language": f"{language}",
+            "authority": "null",
+            "confidence": -1
+          }
+        ]
+      },
+      "inArchive": "true",
+      "discoverable": "true",
+      "withdrawn": "false",
+      "type": "item"
+    }
 
-            # Step 2: Login and obtain Bearer token
-            url_step2 = f"{DSPACE_DOMAIN}:{DSPACE_PORT}/server/api/authn/login"
-            headers_step2 = {
-                "Content-Type": "application/x-www-form-urlencoded",
-                "X-XSRF-TOKEN": xsrf_cookie,
-            }
-            params_step2 = {"user": "test@test.edu", "password": "admin"}
+    if description is not None:
+        # sent with the item, saves a separate PATCH
+        data["metadata"]["dc.description"] = [
+          {
+            "value": f"{description}",
+            "language": f"{language}",
+            "authority": "null",
+            "confidence": -1
+          }
+        ]
 
-            async with session.post(
-                url_step2, headers=headers_step2, data=params_step2
-            ) as response_step2:
-                bearer_token = response_step2.headers.get("Authorization")
-                xsrf_cookie = response_step2.cookies.get("DSPACE-XSRF-COOKIE").value
+    return await client.fetch(
+        "POST", f"/server/api/core/items?owningCollection={collectionId}", headers=headers, data=json.dumps(data)
+    )
 
-            # Step 3: Access a new API endpoint
-            url_step3 = (
-                f"{DSPACE_DOMAIN}:{DSPACE_PORT}/server/api/submission/workspaceitems"
-            )
-            headers_step3 = {}
-            data_step3 = {}
 
-            async with session.post(
-                url_step3, headers=headers_step3, data=json.dumps(data_step3)
-            ) as response_step3:
-                # Print the response for Step 3
-                xsrf_cookie_step3 = response_step3.cookies.get(
-                    "DSPACE-XSRF-COOKIE"
-                ).value
 
-            # Step 4: Another API endpoint using XSRF cookie from Step 3
-            url_step4 = (
-                f"{DSPACE_DOMAIN}:{DSPACE_PORT}/server/api/core/items?owningCollection={collectionId}"
-            )
-            headers_step4 = {
-                "Content-Type": "application/json",
-                "Authorization": bearer_token,
-                "X-XSRF-TOKEN": xsrf_cookie_step3,  # Use XSRF cookie from Step 3
-            }
-            
-            data_step4 = {
-              "name": f"{title}",
-              "metadata": {
-                "dc.contributor.author": [
-                  {
-                    "value": f"{author}",
-                    "language": f"{language}",
-                    "authority": "null",
-                    "confidence": -1
-                  }
-                ],
-                "dc.title": [
-                  {
-                    "value": f"{title}",
-                    "language": f"{language}",
-                    "authority": "null",
-                    "confidence": -1
-                  }
-                ],
-                "dc.type": [
-                  {
-                    "value": f"{type}",
-                    "language": f"{language}",
-                    "authority": "null",
-                    "confidence": -1
-                  }
-                ]
-              },
-              "inArchive": "true",
-              "discoverable": "true",
-              "withdrawn": "false",
-              "type": "item"
-            }
+@measured()
+async def createItems(collectionId, items, concurrency=DSPACE_BULK_CONCURRENCY, rate=DSPACE_BULK_RATE):
+    """Creates many items in one collection through the shared client.
 
-            async with session.post(
-                url_step4, headers=headers_step4, data=json.dumps(data_step4)
-            ) as response_step4:
-                
-                result = {}
-
-                result["msg"] = response_step4.status
-                result["response"] = await response_step4.json()
-                return result
+    `items` are dicts with createItem arguments (title, author, type, language).
+    At most `concurrency` requests run at once and at most `rate` start per second.
+    Returns one result per item in the same order, a failed item does not stop the others.
+    """
+    calls = [
+        (lambda item=item: createItem(collectionId, **item))
+        for item in items
+    ]
+    return await gatherLimited(calls, concurrency=concurrency, rate=rate)
 
 
 # # Run the asynchronous event loop
@@ -105,5 +83,3 @@ async def createItem(collectionId,title,author="",type="",language="cz"):
 
 # print(result)
 # Print the entire result dictionary
-
-
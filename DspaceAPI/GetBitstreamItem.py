@@ -1,65 +1,146 @@
-import aiohttp
-import asyncio
-import json
-from .config import DSPACE_PORT, DSPACE_DOMAIN
+from .Client import getClient, DSpaceError, errorResult
+from .Concurrency import gatherLimited
+from .GetBundleId import getBundleId
+from .Pages import HALPages
+from .config import DSPACE_PAGE_SIZE
+from .Metrics import measured
 
 
+@measured()
 async def getBitstreamItem(bundleId):
+    client = getClient()
+    return await client.fetch("GET", f"/server/api/core/bundles/{bundleId}/bitstreams")
+
+
+def iterateBitstreams(bundleId, size=DSPACE_PAGE_SIZE):
+    """All bitstreams of a bundle, page by page (see HALPages)."""
+    return HALPages(f"/server/api/core/bundles/{bundleId}/bitstreams", "bitstreams", size=size)
+
+
+@measured()
+async def getItemBitstream(itemsId, bundleName="ORIGINAL"):
+    """Returns the first bitstream of the named bundle of an item or None.
+    DSpaceError is raised when DSpace cannot be reached.
+    """
+    result = await getItemWithBitstreams(itemsId)
+    if "error" in result:
+        raise DSpaceError(result["error"]["message"], result["msg"], result["response"])
+    if result["msg"] != 200:
+        return None
+    return next((bitstream for bitstream in result["response"]["bitstreams"] if bitstream["bundleName"] == bundleName), None)
+
+
+# parts of DSpace resources used by the service, everything else is dropped right after parsing
+ITEM_FIELDS = ("uuid", "name", "handle", "metadata", "inArchive", "withdrawn", "lastModified")
+BITSTREAM_FIELDS = ("uuid", "name", "sizeBytes", "checkSum", "mimeType")
+ITEM_EMBED = "bundles/bitstreams"
+
+
+def pickFields(resource, fields):
+    return {field: resource[field] for field in fields if field in resource}
+
+
+def _embeddedList(resource, name):
+    """Elements of an embedded listing, None when it is missing or holds only its first page."""
+    listing = resource.get("_embedded", {}).get(name)
+    if listing is None:
+        return None
+    elements = listing.get("_embedded", {}).get(name, [])
+    total = listing.get("page", {}).get("totalElements", len(elements))
+    return elements if len(elements) >= total else None
+
+
+async def listItemBitstreams(itemsId):
+    """Bitstreams of an item walked bundle by bundle, used when DSpace does not embed them."""
+    bundles = await getBundleId(itemsId)
+    if bundles["msg"] != 200:
+        return bundles
+    bundles = bundles["response"].get("_embedded", {}).get("bundles", [])
+    listings = await gatherLimited([
+        (lambda bundle=bundle: getBitstreamItem(bundle["uuid"])) for bundle in bundles
+    ])
+    bitstreams = []
+    for bundle, listing in zip(bundles, listings):
+        if listing["msg"] != 200:
+            return listing
+        for bitstream in listing["response"].get("_embedded", {}).get("bitstreams", []):
+            bitstreams.append({**pickFields(bitstream, BITSTREAM_FIELDS), "bundle": bundle["uuid"], "bundleName": bundle.get("name")})
+    result = {}
+    result["msg"] = 200
+    result["response"] = bitstreams
+    return result
+
+
+@measured()
+async def getItemWithBitstreams(itemsId):
+    """Item with the bitstreams of all its bundles in one request (embed=bundles/bitstreams).
+
+    The response holds ITEM_FIELDS of the item and "bitstreams", each with BITSTREAM_FIELDS,
+    the uuid ("bundle") and the name ("bundleName") of its bundle. Listings too long to be
+    embedded completely, or a DSpace ignoring embed, are read with separate requests.
+    """
+    client = getClient()
+    result = await client.fetch("GET", f"/server/api/core/items/{itemsId}?embed={ITEM_EMBED}")
+    if result["msg"] != 200:
+        return result
+    response = result["response"]
+    item = pickFields(response, ITEM_FIELDS)
+
+    bundles = _embeddedList(response, "bundles")
+    if bundles is None:
+        listing = await listItemBitstreams(itemsId)
+        if listing["msg"] != 200:
+            return listing
+        item["bitstreams"] = listing["response"]
+    else:
+        item["bitstreams"] = []
+        for bundle in bundles:
+            bitstreams = _embeddedList(bundle, "bitstreams")
+            if bitstreams is None:
+                try:
+                    bitstreams = [bitstream async for bitstream in iterateBitstreams(bundle["uuid"])]
+                except DSpaceError as error:
+                    return errorResult(error)
+            item["bitstreams"].extend(
+                {**pickFields(bitstream, BITSTREAM_FIELDS), "bundle": bundle["uuid"], "bundleName": bundle.get("name")}
+                for bitstream in bitstreams
+            )
+
+    result = {}
+    result["msg"] = 200
+    result["response"] = item
+    return result
+
+
+@measured()
+async def getItemBitstreams(itemsId):
+    """All bitstreams of an item, each with the uuid ("bundle") and name of its bundle, as the usual result."""
+    result = await getItemWithBitstreams(itemsId)
+    if result["msg"] != 200:
+        return result
+    return {"msg": 200, "response": result["response"]["bitstreams"]}
+
+
+@measured()
+async def getBitstream(bitstreamId):
+    client = getClient()
+    return await client.fetch("GET", f"/server/api/core/bitstreams/{bitstreamId}")
+
+
+@measured()
+async def getContentBitstream(itemsId, bitstreamId=None):
+    """Bitstream with the content of an item: `bitstreamId` when the content is shared
+    with another item (see uploadBitstreamOnce), otherwise the first ORIGINAL bitstream.
+    """
+    if bitstreamId is None:
+        return await getItemBitstream(itemsId)
+    bitstream = await getBitstream(bitstreamId)
+    if "error" in bitstream:
+        raise DSpaceError(bitstream["error"]["message"], bitstream["msg"], bitstream["response"])
+    return bitstream["response"] if bitstream["msg"] == 200 else None
 
-    # JWT token
-    async with aiohttp.ClientSession() as session:
-        # Step 1: Get XSRF token from cookie
-        url_step1 = f"{DSPACE_DOMAIN}:{DSPACE_PORT}/server/api/authn/status"
-        headers_step1 = {"Content-Type": "application/x-www-form-urlencoded"}
-
-        async with session.get(url_step1, headers=headers_step1) as response_step1:
-            xsrf_cookie = response_step1.cookies.get("DSPACE-XSRF-COOKIE").value
-
-            # Step 2: Login and obtain Bearer token
-            url_step2 = f"{DSPACE_DOMAIN}:{DSPACE_PORT}/server/api/authn/login"
-            headers_step2 = {
-                "Content-Type": "application/x-www-form-urlencoded",
-                "X-XSRF-TOKEN": xsrf_cookie,
-            }
-            params_step2 = {"user": "test@test.edu", "password": "admin"}
-
-        async with session.post(
-            url_step2, headers=headers_step2, data=params_step2
-        ) as response_step2:
-            bearer_token = response_step2.headers.get("Authorization")
-            xsrf_cookie = response_step2.cookies.get("DSPACE-XSRF-COOKIE").value
-
-            # Step 3: Access a new API endpoint to get specific XSRF token
-            url_step3 = f"{DSPACE_DOMAIN}:{DSPACE_PORT}/server/api/core/items/"
-            headers_step3 = {}
-            data_step3 = {}
-
-        async with session.patch(
-            url_step3, headers=headers_step3, data=json.dumps(data_step3)
-        ) as response_step3:
-            # Print the response for Step 3
-            xsrf_cookie_step3 = response_step3.cookies.get("DSPACE-XSRF-COOKIE").value
-
-            # Step 4: Another API endpoint using XSRF cookie from Step 3
-            url_step4 = f"http://localhost:8080/server/api/core/bundles/{bundleId}/bitstreams"
-            
-            headers_step4 = {
-                "Content-Type": "application/json",
-                "Authorization": bearer_token,
-                "X-XSRF-TOKEN": xsrf_cookie_step3,  # Use XSRF cookie from Step 3
-            }
-            
-            async with session.get(
-                url_step4, headers=headers_step4) as response_step4:
-
-                result = {}
-            
-                result["response"] = await response_step4.json()
-                result["msg"] = response_step4.status
-                
-                return result
 
 # Run the asynchronous event loop
 
-# result = asyncio.run(addBundleItem())
+# result = asyncio.run(getBitstreamItem())
 # print(result)
@@ -1,75 +1,126 @@
-import aiohttp
 import asyncio
-import json
+import inspect
 import os
-from .config import DSPACE_PORT, DSPACE_DOMAIN
-
-async def downloadItemContent(bitstreamId, bitstreamName, filePath=""):
-    # JWT token
-    async with aiohttp.ClientSession() as session:
-        # Step 1: Get XSRF token from cookie
-        url_step1 = f"{DSPACE_DOMAIN}:{DSPACE_PORT}/server/api/authn/status"
-        headers_step1 = {"Content-Type": "application/x-www-form-urlencoded"}
-
-        async with session.get(url_step1, headers=headers_step1) as response_step1:
-            xsrf_cookie = response_step1.cookies.get("DSPACE-XSRF-COOKIE").value
-
-            # Step 2: Login and obtain Bearer token
-            url_step2 = f"{DSPACE_DOMAIN}:{DSPACE_PORT}/server/api/authn/login"
-            headers_step2 = {
-                "Content-Type": "application/x-www-form-urlencoded",
-                "X-XSRF-TOKEN": xsrf_cookie,
-            }
-            params_step2 = {"user": "test@test.edu", "password": "admin"}
-
-        async with session.post(
-            url_step2, headers=headers_step2, data=params_step2
-        ) as response_step2:
-            bearer_token = response_step2.headers.get("Authorization")
-            xsrf_cookie = response_step2.cookies.get("DSPACE-XSRF-COOKIE").value
-
-            # Step 3: Access a new API endpoint to get specific XSRF token
-            url_step3 = f"{DSPACE_DOMAIN}:{DSPACE_PORT}/server/api/core/items"
-            headers_step3 = {}
-            data_step3 = {}
-
-        async with session.patch(
-            url_step3, headers=headers_step3, data=json.dumps(data_step3)
-        ) as response_step3:
-            # Print the response for Step 3
-            xsrf_cookie_step3 = response_step3.cookies.get("DSPACE-XSRF-COOKIE").value
-
-            # Step 4: Another API endpoint using XSRF cookie from Step 3
-            url_step4 = f"{DSPACE_DOMAIN}:{DSPACE_PORT}/server/api/core/bitstreams/{bitstreamId}/content"
-            headers_step4 = {
-                "Content-Type": "application/json",
-                "Authorization": bearer_token,
-                "X-XSRF-TOKEN": xsrf_cookie_step3,  # Use XSRF cookie from Step 3
+from .Client import getClient, DSpaceError, errorResult
+from .config import DSPACE_CHUNK_SIZE
+from .Metrics import measured
+
+# bytes read from DSpace at once, peak memory of a download does not depend on the file size
+CHUNK_SIZE = DSPACE_CHUNK_SIZE
+
+
+def rangeHeader(byteRange):
+    """Converts (start, end) into a Range header value, end is inclusive and may be None."""
+    start, end = byteRange
+    return f"bytes={start}-" if end is None else f"bytes={start}-{end}"
+
+
+async def _write(sink, chunk):
+    write = getattr(sink, "write", sink)
+    result = write(chunk)
+    if inspect.isawaitable(result):
+        await result
+
+
+@measured()
+async def streamItemContent(bitstreamId, sink, byteRange=None, chunkSize=CHUNK_SIZE, onProgress=None):
+    """Streams the content of a bitstream into `sink` without buffering the whole file.
+
+    `sink` is either a callable or an object with a `write` method, sync or async.
+    `byteRange` is an optional (start, end) tuple requesting only part of the content.
+    `onProgress(received, total)` is called after each chunk, total is None when unknown.
+    """
+    client = getClient()
+    headers = {}
+    if byteRange is not None:
+        headers["Range"] = rangeHeader(byteRange)
+
+    try:
+        async with client.request(
+            "GET", f"/server/api/core/bitstreams/{bitstreamId}/content", headers=headers
+        ) as response:
+            result = {}
+            result["msg"] = response.status
+            if response.status not in (200, 206):
+                result["response"] = await response.text()
+                return result
+
+            total = response.content_length
+            received = 0
+            async for chunk in response.content.iter_chunked(chunkSize):
+                await _write(sink, chunk)
+                received += len(chunk)
+                if onProgress is not None:
+                    onProgress(received, total)
+
+            result["response"] = {
+                "received": received,
+                "total": total,
+                "contentRange": response.headers.get("Content-Range"),
             }
+            return result
+    except DSpaceError as error:
+        return errorResult(error)
+
+
+def _createUnique(directory, name):
+    # exclusive create instead of probing with os.path.exists, no race between check and open
+    base, extension = os.path.splitext(name)
+    counter = 0
+    while True:
+        candidate = name if counter == 0 else f"{base}({counter}){extension}"
+        try:
+            return open(os.path.join(directory, candidate), "xb"), candidate
+        except FileExistsError:
+            counter += 1
+
+
+def _removeQuietly(*paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+@measured()
+async def downloadItemContent(bitstreamId, bitstreamName, filePath="", byteRange=None, chunkSize=CHUNK_SIZE, onProgress=None):
+    """Downloads a bitstream into `filePath`, an existing file is never overwritten (name(1).pdf, ...).
+
+    The content goes into name.part which replaces the reserved name only when the download
+    has finished, a failed or cancelled download leaves no file behind.
+    """
+    directory = filePath or "."
+    placeholder, bitstreamName = await asyncio.to_thread(_createUnique, directory, bitstreamName)
+    await asyncio.to_thread(placeholder.close)
+    path = os.path.join(directory, bitstreamName)
+    partial = f"{path}.part"
+
+    try:
+        file = await asyncio.to_thread(open, partial, "wb")
+
+        async def write(chunk):
+            await asyncio.to_thread(file.write, chunk)
+
+        try:
+            result = await streamItemContent(
+                bitstreamId, write, byteRange=byteRange, chunkSize=chunkSize, onProgress=onProgress
+            )
+        finally:
+            await asyncio.to_thread(file.close)
+
+        if result["msg"] not in (200, 206):
+            # nothing usable was written, do not leave an empty file behind
+            await asyncio.to_thread(_removeQuietly, partial, path)
+            return result
+        await asyncio.to_thread(os.replace, partial, path)
+    except BaseException:
+        await asyncio.shield(asyncio.to_thread(_removeQuietly, partial, path))
+        raise
+
+    result["response"] = {**result["response"], "file": path}
+    return result
 
-            async with session.get(url_step4, headers=headers_step4) as response_step4:
-                # You can access the content and headers as needed
-                if response_step4.status == 200:
-                    # Read the binary content
-                    content = await response_step4.read()
-                    
-                    # Check if the file already exists
-                    counter = 0
-                    while os.path.exists(bitstreamName):
-                        bitstreamName = bitstreamName.split('(')[0]
-                        counter += 1
-                        bitstreamName = f"{bitstreamName.split('.')[0]}({counter}).pdf"
-                        
-                    # Save the content to a PDF file
-                    with open(f"{filePath}{bitstreamName}", "wb") as file:
-                        file.write(content)
-                        
-                        result = {}
-            
-                        result["response"] = ""
-                        result["msg"] = response_step4.status
-                        
-                        return result
 # Run the asynchronous event loop
 # result = asyncio.run(downloadItemContent())
 # print(result)
@@ -0,0 +1,127 @@
+"""Prometheus metrics of the DSpace layer.
+
+HTTP level (every request of every DSpaceClient, retries and logins included) is collected by
+an aiohttp TraceConfig, labelled by method and endpoint; uuids in paths become {id}.
+Operation level (createItem, uploadBitstream, ...) is collected by the `measured` decorator.
+"""
+import functools
+import os
+import re
+import time
+
+import aiohttp
+from prometheus_client import (
+    Counter, Gauge, Histogram, CollectorRegistry, REGISTRY, CONTENT_TYPE_LATEST, generate_latest,
+)
+
+UUID_PATTERN = re.compile(r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}")
+# DSpace answers from milliseconds (metadata) to minutes (large bitstreams)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+REQUEST_DURATION = Histogram(
+    "dspace_request_duration_seconds", "Time until DSpace answered with headers",
+    ["method", "endpoint"], buckets=LATENCY_BUCKETS,
+)
+REQUESTS = Counter("dspace_requests_total", "Requests sent to DSpace by status, error when no answer came", ["method", "endpoint", "status"])
+REQUESTS_IN_FLIGHT = Gauge("dspace_requests_in_flight", "Requests waiting for a DSpace answer", ["method", "endpoint"], multiprocess_mode="livesum")
+BYTES_SENT = Counter("dspace_request_bytes_total", "Request body bytes sent to DSpace", ["method", "endpoint"])
+BYTES_RECEIVED = Counter("dspace_response_bytes_total", "Response body bytes received from DSpace", ["method", "endpoint"])
+
+OPERATION_DURATION = Histogram(
+    "dspace_operation_duration_seconds", "Duration of DspaceAPI operations, all their requests included",
+    ["operation"], buckets=LATENCY_BUCKETS,
+)
+OPERATIONS = Counter("dspace_operations_total", "Finished DspaceAPI operations by outcome", ["operation", "outcome"])
+OPERATIONS_IN_FLIGHT = Gauge("dspace_operations_in_flight", "Running DspaceAPI operations", ["operation"], multiprocess_mode="livesum")
+
+
+def endpointOf(url):
+    """Path of a request url with uuids replaced by {id}, keeps the label cardinality low."""
+    return UUID_PATTERN.sub("{id}", url.path)
+
+
+def _labels(context, params):
+    labels = getattr(context, "labels", None)
+    if labels is None:
+        labels = context.labels = (params.method, endpointOf(params.url))
+    return labels
+
+
+async def _onRequestStart(session, context, params):
+    labels = _labels(context, params)
+    context.started = time.perf_counter()
+    REQUESTS_IN_FLIGHT.labels(*labels).inc()
+
+
+async def _onRequestEnd(session, context, params):
+    labels = _labels(context, params)
+    REQUEST_DURATION.labels(*labels).observe(time.perf_counter() - context.started)
+    REQUESTS.labels(*labels, str(params.response.status)).inc()
+    REQUESTS_IN_FLIGHT.labels(*labels).dec()
+
+
+async def _onRequestException(session, context, params):
+    labels = _labels(context, params)
+    REQUEST_DURATION.labels(*labels).observe(time.perf_counter() - context.started)
+    REQUESTS.labels(*labels, "error").inc()
+    REQUESTS_IN_FLIGHT.labels(*labels).dec()
+
+
+async def _onChunkSent(session, context, params):
+    BYTES_SENT.labels(*_labels(context, params)).inc(len(params.chunk))
+
+
+async def _onChunkReceived(session, context, params):
+    BYTES_RECEIVED.labels(*_labels(context, params)).inc(len(params.chunk))
+
+
+def metricsTrace():
+    """TraceConfig feeding the dspace_request* metrics, attached to every DSpace session."""
+    trace = aiohttp.TraceConfig()
+    trace.on_request_start.append(_onRequestStart)
+    trace.on_request_end.append(_onRequestEnd)
+    trace.on_request_exception.append(_onRequestException)
+    trace.on_request_chunk_sent.append(_onChunkSent)
+    trace.on_response_chunk_received.append(_onChunkReceived)
+    return trace
+
+
+def outcomeOf(result):
+    # results of the layer are {"msg": status, ...}, None status means DSpace did not answer
+    if isinstance(result, dict) and "msg" in result:
+        return "error" if result["msg"] is None else str(result["msg"])
+    return "ok"
+
+
+def measured(operation=None):
+    """Decorator recording duration, outcome and concurrency of an async DspaceAPI operation."""
+    def decorator(asyncFunc):
+        name = operation or asyncFunc.__name__
+
+        @functools.wraps(asyncFunc)
+        async def wrapper(*args, **kwargs):
+            OPERATIONS_IN_FLIGHT.labels(name).inc()
+            started = time.perf_counter()
+            outcome = "exception"
+            try:
+                result = await asyncFunc(*args, **kwargs)
+                outcome = outcomeOf(result)
+                return result
+            finally:
+                OPERATION_DURATION.labels(name).observe(time.perf_counter() - started)
+                OPERATIONS.labels(name, outcome).inc()
+                OPERATIONS_IN_FLIGHT.labels(name).dec()
+        return wrapper
+    return decorator
+
+
+def metricsPage():
+    """(body, content type) of the Prometheus text format.
+    With PROMETHEUS_MULTIPROC_DIR set (several gunicorn workers) the values of all workers are merged.
+    """
+    registry = REGISTRY
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
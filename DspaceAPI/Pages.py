@@ -0,0 +1,106 @@
+import asyncio
+
+from .Client import getClient, DSpaceError
+from .config import DSPACE_PAGE_SIZE
+
+
+def withPageSize(path, size):
+    separator = "&" if "?" in path else "?"
+    return f"{path}{separator}page=0&size={size}"
+
+
+class HALPages:
+    """Async iterator over every element of a paged HAL listing.
+
+    `_links.next` is followed until the last page, the next page is requested while the
+    caller is still processing the current one. `totalElements` and `totalPages` are known
+    after the first page arrives. Iterate `pages()` to get whole pages instead of elements.
+
+        collections = HALPages("/server/api/core/collections")
+        async for collection in collections:
+            ...
+    """
+
+    def __init__(self, path, embedded=None, size=DSPACE_PAGE_SIZE, prefetch=True, client=None):
+        self.path = path
+        self.embedded = embedded
+        self.size = size
+        self.prefetch = prefetch
+        self.client = client
+        self.totalElements = None
+        self.totalPages = None
+
+    async def _fetch(self, client, url):
+        result = await client.fetch("GET", url)
+        if result["msg"] != 200:
+            raise DSpaceError(f"Listing {url} failed with status {result['msg']}", result["msg"], result["response"])
+        return result["response"]
+
+    def _listing(self, response):
+        # the part of the response holding _embedded, page and _links
+        return response
+
+    def _elements(self, response):
+        embedded = response.get("_embedded", {})
+        if self.embedded is None:
+            # HAL listing embeds exactly one collection, e.g. "collections"
+            return next(iter(embedded.values()), [])
+        return embedded.get(self.embedded, [])
+
+    async def pages(self):
+        """Yields {"elements": [...], "page": {...}} for every page."""
+        client = getClient() if self.client is None else self.client
+        pending = asyncio.ensure_future(self._fetch(client, withPageSize(self.path, self.size)))
+        try:
+            while pending is not None:
+                response = self._listing(await pending)
+                pending = None
+
+                page = response.get("page", {})
+                self.totalElements = page.get("totalElements", self.totalElements)
+                self.totalPages = page.get("totalPages", self.totalPages)
+
+                following = response.get("_links", {}).get("next", {}).get("href")
+                if following is not None:
+                    nextPage = self._fetch(client, following)
+                    pending = asyncio.ensure_future(nextPage) if self.prefetch else nextPage
+
+                yield {"elements": self._elements(response), "page": page}
+        finally:
+            if isinstance(pending, asyncio.Future):
+                pending.cancel()
+            elif pending is not None:
+                pending.close()
+
+    async def __aiter__(self):
+        async for page in self.pages():
+            for element in page["elements"]:
+                yield element
+
+    async def total(self):
+        """Returns totalElements, asks for a single element page when not known yet."""
+        if self.totalElements is None:
+            client = getClient() if self.client is None else self.client
+            response = self._listing(await self._fetch(client, withPageSize(self.path, 1)))
+            self.totalElements = response.get("page", {}).get("totalElements")
+        return self.totalElements
+
+
+class SearchPages(HALPages):
+    """HALPages over a discover search, yields the found objects (items, collections, ...).
+
+    The listing of /server/api/discover/search/objects is nested in _embedded.searchResult
+    and every result wraps the object in _embedded.indexableObject.
+    """
+
+    def __init__(self, path, size=DSPACE_PAGE_SIZE, prefetch=True, client=None):
+        super().__init__(path, "objects", size=size, prefetch=prefetch, client=client)
+
+    def _listing(self, response):
+        return response.get("_embedded", {}).get("searchResult", {})
+
+    def _elements(self, response):
+        return [
+            result.get("_embedded", {}).get("indexableObject")
+            for result in super()._elements(response)
+        ]
@@ -5,19 +5,23 @@ from .AddTitleItem import addTitleItem
 from .UpdateTitleItem import updateTitleItem
 from .GetItem import getItem
 from .AddBundleItem import addBundleItem
-from .GetBundleId import getBundleId
-from .AddBitstreamsItem import addBitstreamsItem
-from .GetBitstreamItem import getBitstreamItem
-from .GetBitstreamItem import getBitstreamItem
-from .GetContentItem import downloadItemContent
+from .GetBundleId import getBundleId, iterateBundles
+from .AddBitstreamsItem import addBitstreamsItem, uploadBitstream
+from .GetBitstreamItem import getBitstreamItem, getItemBitstream, iterateBitstreams, getBitstream, getContentBitstream, getItemBitstreams
+from .GetContentItem import downloadItemContent, streamItemContent
 from .UpdateDescriptionItem import updateDescriptionItem
 from .AddDescriptionItem import addDescriptionItem
 from .SetWithdrawnItem import setWithdrawnItem
-from .GetCommunities import getCommunities
+from .GetCommunities import getCommunities, iterateCommunities
 from .CreateCommunity import createCommunity
 from .CreateCollection import createCollection
-from .GetCollections import getCollections
-from .CreateItem import createItem
+from .GetCollections import getCollections, iterateCollections
+from .Cache import invalidateListings
+from .SearchItems import iterateChangedItems
+from .CreateItem import createItem, createItems
+from .UpdateItemMetadata import updateItemMetadata, desiredState
+from .ContentIndex import uploadBitstreamOnce
+from .AddFilesItem import addFilesItem
 
 login = login
 createWorkspaceItem = createWorkspaceItem
@@ -27,8 +31,16 @@ getItem = getItem
 addBundleItem = addBundleItem  #nessecary to adding bitstreams 
 getBundleId = getBundleId
 addBitstreamsItem = addBitstreamsItem
+uploadBitstream = uploadBitstream
+uploadBitstreamOnce = uploadBitstreamOnce
+addFilesItem = addFilesItem
 getBitstreamItem = getBitstreamItem
+getItemBitstream = getItemBitstream
+getBitstream = getBitstream
+getContentBitstream = getContentBitstream
+getItemBitstreams = getItemBitstreams
 downloadItemContent = downloadItemContent
+streamItemContent = streamItemContent
 updateDescriptionItem = updateDescriptionItem
 addDescriptionItem = addDescriptionItem
 setWithdrawnItem = setWithdrawnItem
@@ -36,4 +48,13 @@ getCommunities = getCommunities
 createCommunity = createCommunity
 createCollection = createCollection
 getCollections = getCollections
-createItem = createItem
\ No newline at end of file
+createItem = createItem
+createItems = createItems
+updateItemMetadata = updateItemMetadata
+desiredState = desiredState
+invalidateListings = invalidateListings
+iterateBundles = iterateBundles
+iterateBitstreams = iterateBitstreams
+iterateCommunities = iterateCommunities
+iterateCollections = iterateCollections
+iterateChangedItems = iterateChangedItems
@@ -0,0 +1,74 @@
+import random
+import time
+
+from .config import (
+    DSPACE_RETRY_ATTEMPTS,
+    DSPACE_RETRY_BASE_DELAY,
+    DSPACE_RETRY_MAX_DELAY,
+    DSPACE_BREAKER_THRESHOLD,
+    DSPACE_BREAKER_RESET,
+)
+
+# requests which may be sent again without side effects
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+# answers of an overloaded or restarting DSpace
+RETRY_STATUSES = {500, 502, 503, 504}
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter."""
+
+    def __init__(self, attempts=DSPACE_RETRY_ATTEMPTS, baseDelay=DSPACE_RETRY_BASE_DELAY, maxDelay=DSPACE_RETRY_MAX_DELAY):
+        self.attempts = max(1, attempts)
+        self.baseDelay = baseDelay
+        self.maxDelay = maxDelay
+
+    def delay(self, attempt):
+        return random.uniform(0, min(self.maxDelay, self.baseDelay * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """Fails fast after `threshold` consecutive failures.
+
+    The circuit stays open for `resetTimeout` seconds, then a single probe request is let through
+    (half-open) while the others still fail fast; its success closes the circuit, its failure opens
+    it for another period. A probe which never reports back is replaced after `resetTimeout`.
+    """
+
+    def __init__(self, threshold=DSPACE_BREAKER_THRESHOLD, resetTimeout=DSPACE_BREAKER_RESET):
+        self.threshold = threshold
+        self.resetTimeout = resetTimeout
+        self.failures = 0
+        self.openedAt = None
+        self.probeStartedAt = None
+
+    @property
+    def state(self):
+        if self.openedAt is None:
+            return "closed"
+        if time.monotonic() - self.openedAt >= self.resetTimeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "open":
+            return False
+        now = time.monotonic()
+        if self.probeStartedAt is not None and now - self.probeStartedAt < self.resetTimeout:
+            return False
+        self.probeStartedAt = now
+        return True
+
+    def success(self):
+        self.failures = 0
+        self.openedAt = None
+        self.probeStartedAt = None
+
+    def failure(self):
+        self.failures += 1
+        self.probeStartedAt = None
+        if self.state == "half-open" or self.failures >= self.threshold:
+            self.openedAt = time.monotonic()
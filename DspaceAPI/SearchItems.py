@@ -0,0 +1,111 @@
+import datetime
+from urllib.parse import urlencode
+
+from .Client import getClient, DSpaceError
+from .Pages import SearchPages
+from .config import DSPACE_PAGE_SIZE, DSPACE_SEARCH_CONFIGURATION
+
+SEARCH_PATH = "/server/api/discover/search/objects"
+
+
+def solrDate(moment):
+    """UTC timestamp in the form used by Solr range queries, naive datetimes are taken as UTC."""
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return moment.isoformat(timespec="milliseconds") + "Z"
+
+
+def parseTimestamp(value):
+    """lastModified of DSpace as naive UTC datetime, None when missing."""
+    if not value:
+        return None
+    moment = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def _changedQuery(since):
+    return "*:*" if since is None else f"lastModified:[{solrDate(since)} TO *]"
+
+
+def iterateChangedItems(since=None, configuration=DSPACE_SEARCH_CONFIGURATION, size=DSPACE_PAGE_SIZE):
+    """Items modified at or after `since` (every item when None), the oldest change first (see SearchPages)."""
+    parameters = {
+        "dsoType": "ITEM",
+        "query": _changedQuery(since),
+        "sort": "lastModified,ASC",
+        "configuration": configuration,
+    }
+    return SearchPages(f"{SEARCH_PATH}?{urlencode(parameters)}", size=size)
+
+
+class ChangedItems:
+    """Items modified at or after `since`, walked by key instead of by page number.
+
+    A listing paged by number shifts while it is read: an item edited meanwhile moves to the
+    end and the next page skips one item. Here every request asks for the first page of
+    lastModified >= the newest lastModified read so far, items already read at that boundary
+    are left out. Only when a whole page shares one timestamp its pages are read by number.
+
+    After the walk `maximum` is the newest lastModified read and `seen` holds the uuids.
+    """
+
+    def __init__(self, since=None, configuration=DSPACE_SEARCH_CONFIGURATION, size=DSPACE_PAGE_SIZE, client=None):
+        self.since = since
+        self.configuration = configuration
+        self.size = size
+        self.client = client
+        self.maximum = None
+        self.seen = set()
+
+    async def _page(self, since, number, size):
+        client = getClient() if self.client is None else self.client
+        parameters = {
+            "dsoType": "ITEM",
+            "query": _changedQuery(since),
+            "sort": "lastModified,ASC",
+            "configuration": self.configuration,
+            "page": number,
+            "size": size,
+        }
+        path = f"{SEARCH_PATH}?{urlencode(parameters)}"
+        result = await client.fetch("GET", path)
+        if result["msg"] != 200:
+            raise DSpaceError(f"Search {path} failed with status {result['msg']}", result["msg"], result["response"])
+        listing = result["response"].get("_embedded", {}).get("searchResult", {})
+        objects = listing.get("_embedded", {}).get("objects", [])
+        items = [obj.get("_embedded", {}).get("indexableObject") for obj in objects]
+        return [item for item in items if item is not None], listing.get("page", {})
+
+    async def pages(self):
+        """Yields lists of items not yielded before at the same boundary, the oldest change first."""
+        cursor = self.since
+        boundary = set()
+        number = 0
+        while True:
+            items, _ = await self._page(cursor, number, self.size)
+            # an item edited meanwhile comes again with a new lastModified and is not left out
+            fresh = [item for item in items if (item["uuid"], item.get("lastModified")) not in boundary]
+            self.seen.update(item["uuid"] for item in items)
+            stamps = [parseTimestamp(item.get("lastModified")) for item in items]
+            newest = max((stamp for stamp in stamps if stamp is not None), default=None)
+            if newest is not None and (self.maximum is None or newest > self.maximum):
+                self.maximum = newest
+            if fresh:
+                yield fresh
+            if len(items) < self.size:
+                return
+            if newest is not None and newest != cursor:
+                cursor = newest
+                number = 0
+                boundary = {(item["uuid"], item.get("lastModified")) for item, stamp in zip(items, stamps) if stamp == newest}
+            else:
+                # the whole page shares the boundary timestamp
+                number += 1
+                boundary.update((item["uuid"], item.get("lastModified")) for item in items)
+
+    async def total(self):
+        """Number of items DSpace lists for `since` right now."""
+        _, page = await self._page(self.since, 0, 1)
+        return page.get("totalElements", 0)
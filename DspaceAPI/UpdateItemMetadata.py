@@ -0,0 +1,102 @@
+import json
+from .Client import getClient
+from .GetItem import getItem
+from .Metrics import measured
+
+# item properties which are not metadata and are patched directly
+ITEM_FLAGS = ["withdrawn", "discoverable"]
+
+
+def desiredState(title=None, description=None, withdrawn=None, language="cz"):
+    """Builds the desired state for updateItemMetadata, None means "leave as it is"."""
+    desired = {}
+    if title is not None:
+        desired["dc.title"] = title
+    if description is not None:
+        # empty description removes the field
+        desired["dc.description"] = description or []
+    if withdrawn is not None:
+        desired["withdrawn"] = withdrawn
+    return desired
+
+
+def _values(value, language):
+    if value is None:
+        return []
+    if not isinstance(value, (list, tuple)):
+        value = [value]
+    return [
+        item if isinstance(item, dict) else {"value": f"{item}", "language": language}
+        for item in value
+    ]
+
+
+def _same(current, desired):
+    return (
+        current.get("value") == desired.get("value")
+        and current.get("language") == desired.get("language", current.get("language"))
+    )
+
+
+def metadataPatch(current, desired, language="cz"):
+    """Returns JSON-Patch operations which turn the `current` item into the `desired` state.
+
+    `desired` maps metadata fields ("dc.title") to a value, list of values or None (remove)
+    and ITEM_FLAGS to booleans. Fields missing in `desired` are not touched.
+    """
+    operations = []
+    metadata = current.get("metadata", {})
+    for field, value in desired.items():
+        if field in ITEM_FLAGS:
+            if current.get(field) != value:
+                operations.append({"op": "replace", "path": f"/{field}", "value": value})
+            continue
+
+        old = metadata.get(field, [])
+        new = _values(value, language)
+        path = f"/metadata/{field}"
+        if not new:
+            if old:
+                operations.append({"op": "remove", "path": path})
+            continue
+        if not old:
+            operations.append({"op": "add", "path": path, "value": new})
+            continue
+
+        for index, (oldValue, newValue) in enumerate(zip(old, new)):
+            if not _same(oldValue, newValue):
+                operations.append({"op": "replace", "path": f"{path}/{index}", "value": newValue})
+        for newValue in new[len(old):]:
+            operations.append({"op": "add", "path": f"{path}/-", "value": newValue})
+        # from the end, so the indexes of the remaining values do not shift
+        for index in reversed(range(len(new), len(old))):
+            operations.append({"op": "remove", "path": f"{path}/{index}"})
+    return operations
+
+
+@measured()
+async def updateItemMetadata(itemsId, desired, current=None, language="cz"):
+    """Sends all changes needed to reach `desired` (see metadataPatch) in a single PATCH.
+    The current item is fetched when not given, no request is sent when nothing differs.
+    """
+    if current is None:
+        fetched = await getItem(itemsId)
+        if fetched["msg"] != 200:
+            return fetched
+        current = fetched["response"]
+
+    operations = metadataPatch(current, desired, language=language)
+    if not operations:
+        result = {}
+        result["msg"] = 200
+        result["response"] = current
+        result["operations"] = operations
+        return result
+
+    client = getClient()
+    headers = {"Content-Type": "application/json"}
+    result = await client.fetch(
+        "PATCH", f"/server/api/core/items/{itemsId}", headers=headers, data=json.dumps(operations)
+    )
+    result["operations"] = operations
+    return result
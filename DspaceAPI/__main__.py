@@ -0,0 +1,176 @@
+"""Command line tools for the DSpace layer.
+
+    python -m DspaceAPI import ./archive --collection <uuid> --folder <uuid> --concurrency 16
+
+Every file of the directory becomes a DSpace item with the file and a row in documents.
+Progress is appended to a checkpoint file, running the same command again continues
+an interrupted import and skips what is already done.
+"""
+import asyncio
+import mimetypes
+import os
+import sys
+import time
+import uuid
+
+import click
+
+from .Client import startClient, closeClient
+from .config import DSPACE_BULK_CONCURRENCY, DSPACE_BULK_RATE
+
+# files handed to the pipeline at once, bounds the number of waiting tasks for huge directories
+IMPORT_CHUNK = 1000
+CHECKPOINT_NAME = ".dspace-import.jsonl"
+
+
+def listFiles(directory, recursive=True):
+    """Relative paths of regular files under `directory`, sorted, hidden files skipped."""
+    paths = []
+    for root, directories, files in os.walk(directory):
+        directories[:] = sorted(name for name in directories if not name.startswith("."))
+        for name in files:
+            if not name.startswith("."):
+                paths.append(os.path.relpath(os.path.join(root, name), directory))
+        if not recursive:
+            break
+    return sorted(paths)
+
+
+def importedDocument(directory, path, collection, folder, group, author, documentType):
+    """createDocumentWithFile arguments for a file, its id is derived from the path and the collection
+    so a repeated run maps the file to the same checkpoint entry.
+    """
+    fullPath = os.path.join(directory, path)
+    name = os.path.splitext(os.path.basename(path))[0]
+    return {
+        "id": uuid.uuid5(uuid.NAMESPACE_URL, f"dspace-import:{collection}:{os.path.abspath(fullPath)}"),
+        "source": fullPath,
+        "filename": os.path.basename(path),
+        "name": name,
+        "folder_id": folder,
+        "group_id": group,
+        "author_id": author,
+        "document_type": documentType,
+        "contentType": mimetypes.guess_type(path)[0] or "application/octet-stream",
+    }
+
+
+class ImportProgress:
+    """Progress bar over bytes with document counts and throughput."""
+
+    def __init__(self, bar, totalFiles):
+        self.bar = bar
+        self.totalFiles = totalFiles
+        self.started = time.monotonic()
+        self.done = 0
+        self.failed = 0
+        self.bytes = 0
+        self.savedBytes = 0
+        self.skipped = 0
+        self.failures = []
+
+    def status(self, _=None):
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        return (
+            f"{self.skipped + self.done + self.failed}/{self.totalFiles} files, {self.failed} failed, "
+            f"{self.done / elapsed:.1f} docs/s, {self.bytes / elapsed / 1024 ** 2:.1f} MiB/s"
+        )
+
+    def skip(self, document):
+        # imported by a previous run
+        self.skipped += 1
+        self.bar.update(os.path.getsize(document["source"]))
+
+    def onResult(self, document, result):
+        size = os.path.getsize(document["source"])
+        if result["msg"] == 201:
+            self.done += 1
+            self.bytes += size
+            self.savedBytes += result["response"].get("saved_bytes", 0)
+        else:
+            self.failed += 1
+            message = result.get("error", {}).get("message") or f"status {result['msg']}"
+            self.failures.append(f"{document['source']}: {result.get('stage')} {message}")
+        self.bar.update(size)
+
+
+def finished(state):
+    return "document_stored" in state and "bitstream_id" in state
+
+
+async def runImport(directory, paths, collection, folder, group, author, documentType, concurrency, rate, checkpointFile, batchSize, database, progress):
+    # the src package is imported only here, the rest of DspaceAPI does not depend on the database
+    from src.DBDefinitions import startEngine, ComposeConnectionString
+    from src.DocumentPipeline import Checkpoint, BatchedInsert, createDocumentsWithFiles
+
+    asyncSessionMaker = await startEngine(database or ComposeConnectionString(), makeDrop=False, makeUp=True)
+    checkpoint = Checkpoint(checkpointFile)
+    batched = BatchedInsert(asyncSessionMaker, size=batchSize)
+    await startClient(limit_per_host=max(concurrency, 1))
+    try:
+        for start in range(0, len(paths), IMPORT_CHUNK):
+            documents = []
+            for path in paths[start:start + IMPORT_CHUNK]:
+                document = importedDocument(directory, path, collection, folder, group, author, documentType)
+                if finished(checkpoint.get(str(document["id"]))):
+                    progress.skip(document)
+                else:
+                    documents.append(document)
+            await createDocumentsWithFiles(
+                asyncSessionMaker, collection, documents, checkpoint=checkpoint,
+                concurrency=concurrency, rate=rate, store=batched.store, onResult=progress.onResult
+            )
+    finally:
+        await batched.close()
+        await closeClient()
+
+
+@click.group()
+def cli():
+    """DSpace tools of the documents service."""
+
+
+@cli.command("import")
+@click.argument("directory", type=click.Path(exists=True, file_okay=False))
+@click.option("--collection", required=True, help="uuid of the DSpace collection receiving the items")
+@click.option("--folder", default=None, type=click.UUID, help="document folder of the created documents")
+@click.option("--group", default=None, type=click.UUID, help="group owning the created documents")
+@click.option("--author", default=None, type=click.UUID, help="author of the created documents")
+@click.option("--document-type", default=None, help="type of the created documents")
+@click.option("--concurrency", default=DSPACE_BULK_CONCURRENCY, show_default=True, help="files sent at once")
+@click.option("--rate", default=DSPACE_BULK_RATE, show_default=True, help="documents started per second, 0 is unlimited")
+@click.option("--checkpoint", "checkpointFile", default=None, type=click.Path(dir_okay=False), help=f"progress file [default: DIRECTORY/{CHECKPOINT_NAME}]")
+@click.option("--batch-size", default=100, show_default=True, help="document rows inserted at once")
+@click.option("--recursive/--no-recursive", default=True, show_default=True, help="include subdirectories")
+@click.option("--database", default=None, help="SQLAlchemy connection string, from POSTGRES_* variables by default")
+def importDirectory(directory, collection, folder, group, author, document_type, concurrency, rate, checkpointFile, batch_size, recursive, database):
+    """Imports every file of DIRECTORY into DSpace and documents."""
+    checkpointFile = checkpointFile or os.path.join(directory, CHECKPOINT_NAME)
+    paths = [
+        path for path in listFiles(directory, recursive=recursive)
+        if os.path.abspath(os.path.join(directory, path)) != os.path.abspath(checkpointFile)
+    ]
+    totalBytes = sum(os.path.getsize(os.path.join(directory, path)) for path in paths)
+    click.echo(f"Importing {len(paths)} files ({totalBytes / 1024 ** 2:.1f} MiB) into collection {collection}", err=True)
+
+    with click.progressbar(length=totalBytes, label="import", show_eta=True, file=sys.stderr) as bar:
+        progress = ImportProgress(bar, len(paths))
+        bar.item_show_func = progress.status
+        asyncio.run(runImport(
+            directory, paths, collection, folder, group, author, document_type, concurrency, rate,
+            checkpointFile, batch_size, database, progress
+        ))
+
+    for failure in progress.failures:
+        click.echo(f"failed {failure}", err=True)
+    click.echo(progress.status(), err=True)
+    if progress.skipped:
+        click.echo(f"{progress.skipped} files were imported by a previous run", err=True)
+    if progress.savedBytes:
+        click.echo(f"{progress.savedBytes / 1024 ** 2:.1f} MiB not uploaded, the content was already stored", err=True)
+    if progress.failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    cli()
@@ -1,3 +1,76 @@
+import os
+import tempfile
+
 # config of DSpace app
-DSPACE_DOMAIN = "http://localhost"
-DSPACE_PORT = "8080"
+DSPACE_DOMAIN = os.environ.get("DSPACE_DOMAIN", "http://localhost")
+DSPACE_PORT = os.environ.get("DSPACE_PORT", "8080")
+
+# several DSpace instances: JSON list (or a JSON file) of {"name", "url", "user", "password",
+# "collections", "communities", "default"}, see Backends.py; empty means the single instance above
+DSPACE_BACKENDS = os.environ.get("DSPACE_BACKENDS", "")
+# uuids of items, bundles, ... whose backend is remembered
+DSPACE_BACKEND_ROUTES = int(os.environ.get("DSPACE_BACKEND_ROUTES", "100000"))
+
+# credentials of the account used for all REST calls
+DSPACE_USER = os.environ.get("DSPACE_USER", "test@test.edu")
+DSPACE_PASSWORD = os.environ.get("DSPACE_PASSWORD", "admin")
+
+# seconds, used when the bearer token does not carry an "exp" claim
+DSPACE_TOKEN_LIFETIME = int(os.environ.get("DSPACE_TOKEN_LIFETIME", "1800"))
+# seconds before expiration when the token is refreshed in advance
+DSPACE_TOKEN_REFRESH_MARGIN = int(os.environ.get("DSPACE_TOKEN_REFRESH_MARGIN", "60"))
+
+# connection pool shared by all DSpace requests
+DSPACE_POOL_LIMIT = int(os.environ.get("DSPACE_POOL_LIMIT", "100"))
+DSPACE_POOL_LIMIT_PER_HOST = int(os.environ.get("DSPACE_POOL_LIMIT_PER_HOST", "32"))
+DSPACE_KEEPALIVE_TIMEOUT = float(os.environ.get("DSPACE_KEEPALIVE_TIMEOUT", "30"))
+DSPACE_DNS_CACHE_TTL = int(os.environ.get("DSPACE_DNS_CACHE_TTL", "300"))
+
+# bytes read or written at once when streaming bitstream content
+DSPACE_CHUNK_SIZE = int(os.environ.get("DSPACE_CHUNK_SIZE", str(64 * 1024)))
+
+# bulk operations: parallel requests and started requests per second (0 = unlimited)
+DSPACE_BULK_CONCURRENCY = int(os.environ.get("DSPACE_BULK_CONCURRENCY", "8"))
+DSPACE_BULK_RATE = float(os.environ.get("DSPACE_BULK_RATE", "0"))
+
+# seconds a communities / collections listing is served without asking DSpace
+DSPACE_LISTING_TTL = float(os.environ.get("DSPACE_LISTING_TTL", "3600"))
+
+# files of one item uploaded at once and the sum of their sizes allowed in flight
+DSPACE_UPLOAD_CONCURRENCY = int(os.environ.get("DSPACE_UPLOAD_CONCURRENCY", "4"))
+DSPACE_UPLOAD_MAX_BYTES = int(os.environ.get("DSPACE_UPLOAD_MAX_BYTES", str(256 * 1024 ** 2)))
+
+# concurrent identical GET requests share one request to DSpace, 0 disables it
+DSPACE_COALESCE_GETS = os.environ.get("DSPACE_COALESCE_GETS", "1") not in ("0", "false", "False")
+
+# elements requested per page when walking HAL listings
+DSPACE_PAGE_SIZE = int(os.environ.get("DSPACE_PAGE_SIZE", "100"))
+
+# retries of idempotent requests after connection errors and 5xx answers
+DSPACE_RETRY_ATTEMPTS = int(os.environ.get("DSPACE_RETRY_ATTEMPTS", "3"))
+DSPACE_RETRY_BASE_DELAY = float(os.environ.get("DSPACE_RETRY_BASE_DELAY", "0.2"))
+DSPACE_RETRY_MAX_DELAY = float(os.environ.get("DSPACE_RETRY_MAX_DELAY", "2"))
+
+# consecutive failures which open the circuit and seconds until a probe is let through
+DSPACE_BREAKER_THRESHOLD = int(os.environ.get("DSPACE_BREAKER_THRESHOLD", "5"))
+DSPACE_BREAKER_RESET = float(os.environ.get("DSPACE_BREAKER_RESET", "30"))
+
+# seconds, an unresponsive DSpace must not hold a worker until the gunicorn timeout
+DSPACE_CONNECT_TIMEOUT = float(os.environ.get("DSPACE_CONNECT_TIMEOUT", "5"))
+DSPACE_READ_TIMEOUT = float(os.environ.get("DSPACE_READ_TIMEOUT", "30"))
+
+# on-disk LRU cache of bitstream content, 0 bytes disables it
+DSPACE_CONTENT_CACHE_DIR = os.environ.get(
+    "DSPACE_CONTENT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "dspace-content")
+)
+DSPACE_CONTENT_CACHE_BYTES = int(os.environ.get("DSPACE_CONTENT_CACHE_BYTES", str(1024 ** 3)))
+# unfinished files older than this (seconds) were left by a crashed process
+DSPACE_CONTENT_CACHE_PART_AGE = float(os.environ.get("DSPACE_CONTENT_CACHE_PART_AGE", "3600"))
+
+# local index of uploaded content (md5 -> bitstream) used to skip repeated uploads, empty disables persisting
+DSPACE_CONTENT_INDEX = os.environ.get(
+    "DSPACE_CONTENT_INDEX", os.path.join(tempfile.gettempdir(), "dspace-content-index.jsonl")
+)
+
+# discovery configuration used to list changed items, administrativeView includes withdrawn and private items
+DSPACE_SEARCH_CONFIGURATION = os.environ.get("DSPACE_SEARCH_CONFIGURATION", "administrativeView")
@@ -125,10 +125,28 @@ async def get_context():
     context = createLoadersContext(initizalizedEngine)
     return context
 
+from DspaceAPI.Client import startClient, closeClient
+from src.DSpaceOutbox import OutboxWorker
+from src.DocumentText import TextExtractor
+from src.DSpaceMirror import DSpaceMirror
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     initizalizedEngine = await RunOnceAndReturnSessionMaker()
+    # one pooled connection set for all DSpace traffic
+    await startClient()
+    # document changes reach DSpace in the background
+    outboxWorker = OutboxWorker(initizalizedEngine).start()
+    # text of new files is extracted for document_search
+    textExtractor = TextExtractor(initizalizedEngine).start()
+    # local copy of DSpace item metadata, only changed items are fetched
+    mirror = DSpaceMirror(initizalizedEngine).start()
     yield
+    await mirror.stop()
+    await textExtractor.stop()
+    await outboxWorker.stop()
+    await closeClient()
+    contentCache.close()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -136,11 +154,204 @@ graphiql = GraphQLRouter(schema=schema, context_getter=get_context)
 
 app.include_router(graphiql, prefix="/gql")
 
+from fastapi import Response
+from DspaceAPI.Metrics import metricsPage
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics, DSpace requests and operations (see DspaceAPI/Metrics.py)."""
+    body, contentType = metricsPage()
+    return Response(content=body, media_type=contentType)
+
 @app.get("/voyager", response_class=FileResponse)
 async def graphiql():
     realpath = os.path.realpath("./voyager.html")
     return realpath
 
+
+import uuid
+import mimetypes
+from contextlib import AsyncExitStack
+from fastapi import Request, HTTPException
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from src.DBDefinitions import DocumentModel
+from DspaceAPI.Client import getClient, DSpaceError, DSpaceUnavailableError
+from DspaceAPI.GetBitstreamItem import getContentBitstream
+from DspaceAPI.GetContentItem import CHUNK_SIZE
+from DspaceAPI.ContentCache import contentCache, bitstreamChecksum
+
+# request headers forwarded to DSpace and response headers passed back to the client
+CONTENT_REQUEST_HEADERS = ["Range", "If-Range", "If-None-Match", "If-Modified-Since"]
+CONTENT_RESPONSE_HEADERS = [
+    "Content-Type", "Content-Length", "Content-Range", "Content-Disposition",
+    "Accept-Ranges", "ETag", "Last-Modified", "Cache-Control",
+]
+
+# as OnlyForAuthentized in the GQL layer, DEMO lets anonymous requests through
+DEMO = os.environ.get("DEMO", None) == "True"
+
+def requestUser(request):
+    """User the authentication middleware put into the request scope, the one GQL permissions check.
+    Raises 401 for anonymous requests; None in DEMO mode.
+    """
+    if DEMO:
+        return None
+    user = request.scope.get("user", None)
+    if user is None or not getattr(user, "is_authenticated", True):
+        raise HTTPException(status_code=401, detail="User is not authenticated")
+    return user
+
+async def loadDocument(id):
+    asyncSessionMaker = await RunOnceAndReturnSessionMaker()
+    async with asyncSessionMaker() as session:
+        return await session.get(DocumentModel, id)
+
+def cacheableChecksum(bitstream):
+    """Checksum keying the bitstream in the local cache, None when it is not cached."""
+    checksum = bitstreamChecksum(bitstream)
+    size = bitstream.get("sizeBytes") or 0
+    if not contentCache.enabled or checksum is None or size > contentCache.maxBytes:
+        return None
+    return checksum
+
+def etagMatches(ifNoneMatch, etag):
+    """True when the If-None-Match header (a list, weak W/ tags or *) matches the entity tag."""
+    if not ifNoneMatch:
+        return False
+    # weak comparison, as RFC 9110 requires for If-None-Match
+    tags = [tag.strip() for tag in ifNoneMatch.split(",")]
+    return any(tag == "*" or tag.removeprefix("W/") == etag.removeprefix("W/") for tag in tags)
+
+class PinnedFileResponse(FileResponse):
+    """FileResponse of a pinned cache entry, released however the sending ends (see ContentCache.acquire)."""
+
+    def __init__(self, path, bitstreamId, checksum, **kwargs):
+        super().__init__(path, **kwargs)
+        self.bitstreamId = bitstreamId
+        self.checksum = checksum
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await contentCache.release(self.bitstreamId, self.checksum)
+
+async def cachedContent(bitstream, checksum, request):
+    """Serves hot content from the local cache, None on a miss.
+    The entry stays pinned until the response is sent, eviction cannot remove it meanwhile.
+    """
+    etag = f'"{checksum}"'
+    if etagMatches(request.headers.get("If-None-Match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    path = await contentCache.acquire(bitstream["uuid"], checksum)
+    if path is None:
+        return None
+    name = bitstream.get("name") or str(bitstream["uuid"])
+    # FileResponse handles Range and lets the server send the file without copying it through Python
+    return PinnedFileResponse(
+        path,
+        bitstream["uuid"],
+        checksum,
+        media_type=mimetypes.guess_type(name)[0] or "application/octet-stream",
+        filename=name,
+        content_disposition_type="inline",
+        headers={"ETag": etag},
+    )
+
+@app.get("/documents/{id}/content")
+async def document_content(id: uuid.UUID, request: Request):
+    """Serves the content of the document's DSpace bitstream, from the local cache when possible,
+    otherwise proxied from DSpace without staging the file on the server. A miss fills the cache
+    on the way (a full response as it streams, a partial one by a download in the background).
+    Only authenticated users get the content.
+    """
+    requestUser(request)
+    document = await loadDocument(id)
+    if document is None or document.dspace_id is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    headers = {name: request.headers[name] for name in CONTENT_REQUEST_HEADERS if name in request.headers}
+    stack = AsyncExitStack()
+    try:
+        bitstream = await getContentBitstream(document.dspace_id, document.bitstream_id)
+        if bitstream is None:
+            raise HTTPException(status_code=404, detail="Document has no content")
+        checksum = cacheableChecksum(bitstream)
+        if checksum is not None:
+            cached = await cachedContent(bitstream, checksum, request)
+            if cached is not None:
+                return cached
+        upstream = await stack.enter_async_context(
+            getClient().request("GET", f"/server/api/core/bitstreams/{bitstream['uuid']}/content", headers=headers)
+        )
+    except DSpaceUnavailableError as error:
+        raise HTTPException(status_code=503, detail=str(error))
+    except DSpaceError as error:
+        raise HTTPException(status_code=502, detail=str(error))
+    responseHeaders = {name: upstream.headers[name] for name in CONTENT_RESPONSE_HEADERS if name in upstream.headers}
+
+    if upstream.status not in (200, 206):
+        # 304, 416 and errors carry no content worth streaming
+        await stack.aclose()
+        responseHeaders.pop("Content-Length", None)
+        return Response(status_code=upstream.status, headers=responseHeaders)
+
+    if checksum is not None and upstream.status == 206:
+        contentCache.fill(bitstream["uuid"], checksum)
+
+    async def content():
+        complete = False
+        writer = None
+        try:
+            if checksum is not None and upstream.status == 200:
+                writer = await contentCache.writer(bitstream["uuid"], checksum)
+            async for chunk in upstream.content.iter_chunked(CHUNK_SIZE):
+                if writer is not None:
+                    await writer.write(chunk)
+                yield chunk
+            complete = True
+        finally:
+            await stack.aclose()
+            if writer is not None:
+                # a short read must not become a cache entry
+                expected = bitstream.get("sizeBytes")
+                complete = complete and (not expected or writer.size == expected)
+                await (writer.commit() if complete else writer.abort())
+
+    return StreamingResponse(
+        content(),
+        status_code=upstream.status,
+        headers=responseHeaders,
+        background=BackgroundTask(stack.aclose),
+    )
+
+from urllib.parse import quote
+from src.FolderExport import folderDocuments, exportFolder, canAccessFolder
+
+@app.get("/folders/{id}/export.zip")
+async def folder_export(id: uuid.UUID, request: Request, recursive: bool = False):
+    """Streams the documents of the folder (with subfolders when `recursive`) as a ZIP archive,
+    the files are fetched from DSpace concurrently and never staged on the server.
+    The user must have access to the folder, subfolders without access are left out.
+    """
+    user = requestUser(request)
+    asyncSessionMaker = await RunOnceAndReturnSessionMaker()
+    found = await folderDocuments(
+        asyncSessionMaker, id, recursive=recursive, allowed=lambda folder: canAccessFolder(user, folder)
+    )
+    if found is None:
+        raise HTTPException(status_code=404, detail="Folder not found")
+    folder, documents = found
+    # checked before the response starts, the archive would otherwise begin with a 200
+    if not canAccessFolder(user, folder):
+        raise HTTPException(status_code=403, detail="No access to the folder")
+    filename = quote(f"{folder.name or folder.id}.zip")
+    return StreamingResponse(
+        exportFolder(documents),
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename*=UTF-8''{filename}"},
+    )
+
 print("All initialization is done")
 
 # @app.get('/hello')
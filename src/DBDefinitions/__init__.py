@@ -8,6 +8,9 @@ from .Base import BaseModel
 #
 ###########################################################################################################################
 from .documentDBModel import DocumentModel, DocumentFolderModel
+from .outboxDBModel import DSpaceOutboxModel
+from .documentTextDBModel import DocumentTextModel
+from .dspaceItemDBModel import DSpaceItemModel, DSpaceSyncStateModel
 
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
@@ -15,6 +18,28 @@ from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.ext.asyncio import create_async_engine
 
+# sloupce pridane do existujicich tabulek, create_all je do jiz vytvorene tabulky neprida
+ADDED_COLUMNS = [
+    (DocumentModel.__table__, "bitstream_id"),
+    (DSpaceSyncStateModel.__table__, "lastfull"),
+    (DSpaceSyncStateModel.__table__, "lease_owner"),
+    (DSpaceSyncStateModel.__table__, "leased_until"),
+    (DocumentTextModel.__table__, "claimed_until"),
+    (DSpaceItemModel.__table__, "original_checksum"),
+]
+
+
+def addMissingColumns(connection):
+    """Idempotently adds ADDED_COLUMNS missing in tables created by an older version."""
+    inspector = sqlalchemy.inspect(connection)
+    # postgres checks itself, so several workers starting at once do not collide
+    ifNotExists = "IF NOT EXISTS " if connection.dialect.name == "postgresql" else ""
+    for table, name in ADDED_COLUMNS:
+        if name in {column["name"] for column in inspector.get_columns(table.name)}:
+            continue
+        columnType = table.c[name].type.compile(dialect=connection.dialect)
+        connection.execute(sqlalchemy.text(f'ALTER TABLE {table.name} ADD COLUMN {ifNotExists}{name} {columnType}'))
+
 
 async def startEngine(connectionstring, makeDrop=False, makeUp=True):
     """Provede nezbytne ukony a vrati asynchronni SessionMaker"""
@@ -27,6 +52,7 @@ async def startEngine(connectionstring, makeDrop=False, makeUp=True):
         if makeUp:
             try:
                 await conn.run_sync(BaseModel.metadata.create_all)
+                await conn.run_sync(addMissingColumns)
                 print("BaseModel.metadata.create_all finished")
             except sqlalchemy.exc.NoReferencedTableError as e:
                 print(e)
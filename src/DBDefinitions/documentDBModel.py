@@ -13,6 +13,7 @@ class DocumentModel(BaseModel):
     id: Mapped[uuid.UUID] = mapped_column(primary_key=True, insert_default=uuid.uuid4, comment="Primary key")
 
     dspace_id: Mapped[uuid.UUID] = mapped_column(index=True, nullable=False, default=None, comment="ID of the document in the DSpace repository")
+    bitstream_id: Mapped[uuid.UUID] = mapped_column(nullable=True, default=None, comment="ID of a DSpace bitstream of another item with the same content, the item of the document has no file then")
 
     name: Mapped[str] = mapped_column(String, nullable=False, default=None, comment="Name of the document")
     
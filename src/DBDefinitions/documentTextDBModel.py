@@ -0,0 +1,28 @@
+import uuid
+import datetime
+from sqlalchemy import Index, String, Text, Integer, DateTime, ForeignKey
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import Mapped, mapped_column
+from .Base import BaseModel
+
+
+class DocumentTextModel(BaseModel):
+    __tablename__ = "document_texts"
+    __table_args__ = (
+        Index("ix_document_texts_search_vector", "search_vector", postgresql_using="gin"),
+    )
+
+    id: Mapped[uuid.UUID] = mapped_column(ForeignKey("documents.id", ondelete="CASCADE"), primary_key=True, comment="ID of the document")
+
+    bitstream_id: Mapped[uuid.UUID] = mapped_column(nullable=True, default=None, comment="ID of the DSpace bitstream the text was extracted from")
+    checksum: Mapped[str] = mapped_column(String, nullable=True, default=None, comment="Checksum of the bitstream content")
+
+    content: Mapped[str] = mapped_column(Text, nullable=True, default=None, comment="Extracted text")
+    # sqlite (tests) has no tsvector, searching falls back to the content there
+    search_vector: Mapped[str] = mapped_column(TSVECTOR().with_variant(Text, "sqlite"), nullable=True, default=None, comment="Extracted text prepared for full-text search")
+
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0, comment="Number of failed attempts")
+    error: Mapped[str] = mapped_column(String, nullable=True, default=None, comment="Last error")
+    available_at: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=True, default=None, comment="Not tried again before this time (retry backoff)")
+    claimed_until: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=True, default=None, comment="Being extracted by a worker until this time")
+    extracted: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=True, default=None, comment="Date and time the text was extracted")
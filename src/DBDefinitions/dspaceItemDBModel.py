@@ -0,0 +1,38 @@
+import uuid
+import datetime
+from sqlalchemy import String, Boolean, DateTime, JSON
+from sqlalchemy.orm import Mapped, mapped_column
+from .Base import BaseModel
+
+
+class DSpaceItemModel(BaseModel):
+    __tablename__ = "dspace_items"
+
+    id: Mapped[uuid.UUID] = mapped_column(primary_key=True, comment="ID of the item in the DSpace repository")
+
+    handle: Mapped[str] = mapped_column(String, index=True, nullable=True, default=None, comment="Persistent handle of the item")
+    name: Mapped[str] = mapped_column(String, nullable=True, default=None, comment="Name of the item")
+    title: Mapped[str] = mapped_column(String, nullable=True, default=None, comment="dc.title of the item")
+
+    withdrawn: Mapped[bool] = mapped_column(Boolean, nullable=True, default=None, comment="Is the item withdrawn")
+    in_archive: Mapped[bool] = mapped_column(Boolean, nullable=True, default=None, comment="Is the item archived")
+
+    bundle_ids: Mapped[list] = mapped_column(JSON, nullable=True, default=None, comment="IDs of the bundles of the item")
+    bitstream_ids: Mapped[list] = mapped_column(JSON, nullable=True, default=None, comment="IDs of the bitstreams of the item")
+    original_bitstream_id: Mapped[uuid.UUID] = mapped_column(index=True, nullable=True, default=None, comment="ID of the first bitstream of the ORIGINAL bundle")
+    original_checksum: Mapped[str] = mapped_column(String, nullable=True, default=None, comment="DSpace checksum of the first bitstream of the ORIGINAL bundle")
+
+    last_modified: Mapped[datetime.datetime] = mapped_column(DateTime, index=True, nullable=True, default=None, comment="lastModified reported by DSpace (UTC)")
+    synced: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=True, default=None, comment="Date and time the row was last synchronized")
+
+
+class DSpaceSyncStateModel(BaseModel):
+    __tablename__ = "dspace_sync_state"
+
+    name: Mapped[str] = mapped_column(String, primary_key=True, comment="Name of the synchronization")
+    watermark: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=True, default=None, comment="lastModified (UTC) of the newest synchronized change")
+    lastrun: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=True, default=None, comment="Date and time the synchronization last finished")
+    lastfull: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=True, default=None, comment="Date and time the last full synchronization finished")
+
+    lease_owner: Mapped[str] = mapped_column(String, nullable=True, default=None, comment="Worker running the synchronization")
+    leased_until: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=True, default=None, comment="Other workers do not synchronize before this time")
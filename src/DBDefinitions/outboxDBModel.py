@@ -0,0 +1,25 @@
+import uuid
+import datetime
+import sqlalchemy
+from sqlalchemy import String, Integer, BigInteger, DateTime, JSON
+from sqlalchemy.orm import Mapped, mapped_column
+from .Base import BaseModel
+
+
+class DSpaceOutboxModel(BaseModel):
+    __tablename__ = "dspace_outbox"
+
+    # integer key keeps the order in which the changes were committed
+    id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True, init=False, comment="Primary key, order of changes")
+
+    document_id: Mapped[uuid.UUID] = mapped_column(index=True, nullable=False, default=None, comment="ID of the changed document")
+    dspace_id: Mapped[uuid.UUID] = mapped_column(nullable=True, default=None, comment="ID of the document in the DSpace repository")
+    operation: Mapped[str] = mapped_column(String, nullable=False, default=None, comment="insert, update or delete")
+    payload: Mapped[dict] = mapped_column(JSON, nullable=True, default=None, comment="State of the document to be pushed into DSpace")
+
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0, comment="Number of failed attempts")
+    error: Mapped[str] = mapped_column(String, nullable=True, default=None, comment="Last error")
+
+    created: Mapped[datetime.datetime] = mapped_column(DateTime, server_default=sqlalchemy.sql.func.now(), nullable=True, default=None, comment="Date and time the change was recorded")
+    available_at: Mapped[datetime.datetime] = mapped_column(DateTime, server_default=sqlalchemy.sql.func.now(), nullable=True, default=None, comment="Not processed before this time (retry backoff)")
+    processed: Mapped[datetime.datetime] = mapped_column(DateTime, index=True, nullable=True, default=None, comment="Date and time the change reached DSpace or was given up")
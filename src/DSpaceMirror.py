@@ -0,0 +1,263 @@
+import asyncio
+import datetime
+import os
+import uuid
+
+from sqlalchemy import select, delete, or_
+from sqlalchemy.exc import IntegrityError
+
+from src.DBDefinitions import DocumentModel, DSpaceItemModel, DSpaceSyncStateModel
+from DspaceAPI.Backends import RoutingClient
+from DspaceAPI.Client import getClient
+from DspaceAPI.Concurrency import gatherLimited
+from DspaceAPI.ContentCache import bitstreamChecksum
+from DspaceAPI.GetBitstreamItem import getItemBitstreams
+from DspaceAPI.SearchItems import ChangedItems, parseTimestamp
+from DspaceAPI.config import DSPACE_BULK_CONCURRENCY, DSPACE_PAGE_SIZE
+
+###########################################################################################################################
+#
+# lokalni zrcadlo metadat DSpace itemu (tabulka dspace_items)
+# DSpaceMirror stahuje jen itemy zmenene od posledniho watermarku, cteni a kontroly pak jsou lokalni SQL dotazy
+#
+###########################################################################################################################
+
+MIRROR_INTERVAL = float(os.environ.get("DSPACE_MIRROR_INTERVAL", "300"))
+# a full run also removes items deleted in DSpace, which the incremental runs cannot see
+MIRROR_FULL_INTERVAL = float(os.environ.get("DSPACE_MIRROR_FULL_INTERVAL", "86400"))
+# a run renews its lease with every page, a crashed worker blocks the others at most this long
+MIRROR_LEASE = float(os.environ.get("DSPACE_MIRROR_LEASE", "600"))
+MIRROR_SYNC_NAME = "dspace_items"
+
+
+def _metadataValue(item, field):
+    values = item.get("metadata", {}).get(field) or []
+    return values[0].get("value") if values else None
+
+
+def mirrorValues(item, bitstreams):
+    """Column values of dspace_items for an item and its bitstreams (see getItemBitstreams)."""
+    original = next((bitstream for bitstream in bitstreams if bitstream.get("bundleName") == "ORIGINAL"), None)
+    return {
+        "handle": item.get("handle"),
+        "name": item.get("name"),
+        "title": _metadataValue(item, "dc.title"),
+        "withdrawn": item.get("withdrawn"),
+        "in_archive": item.get("inArchive"),
+        "bundle_ids": sorted({bitstream["bundle"] for bitstream in bitstreams if bitstream.get("bundle")}),
+        "bitstream_ids": [bitstream["uuid"] for bitstream in bitstreams],
+        "original_bitstream_id": None if original is None else uuid.UUID(original["uuid"]),
+        "original_checksum": None if original is None else bitstreamChecksum(original),
+        "last_modified": parseTimestamp(item.get("lastModified")),
+    }
+
+
+class DSpaceMirror:
+    """Keeps dspace_items in step with DSpace.
+
+    Each run walks items modified since the stored watermark, oldest first and by key (see
+    ChangedItems), and fetches bundles of the changed items only, at most `concurrency` at once.
+    The watermark is committed with every page, an interrupted run continues from there. The
+    range includes the watermark itself, items changed in the same millisecond are not missed,
+    only written twice. With several backends (RoutingClient) each one is walked on its own and
+    the watermark moves at the end of the run, to the oldest of their newest changes.
+    A full run (the first one, or `full=True`) also removes items no longer present in DSpace,
+    but only when every item DSpace lists at the end was read by the walk.
+
+    The background loop runs a full sync every `fullInterval` seconds. Each run holds a lease on
+    the dspace_sync_state row (taken with FOR UPDATE SKIP LOCKED like the outbox), so of several
+    workers only one synchronizes at a time.
+    """
+
+    def __init__(self, asyncSessionMaker, interval=MIRROR_INTERVAL, size=DSPACE_PAGE_SIZE, concurrency=DSPACE_BULK_CONCURRENCY, fullInterval=MIRROR_FULL_INTERVAL, lease=MIRROR_LEASE):
+        self.asyncSessionMaker = asyncSessionMaker
+        self.interval = interval
+        self.size = size
+        self.concurrency = concurrency
+        self.fullInterval = fullInterval
+        self.lease = datetime.timedelta(seconds=lease)
+        self.owner = uuid.uuid4().hex
+        self._task = None
+
+    async def watermark(self):
+        async with self.asyncSessionMaker() as session:
+            state = await session.get(DSpaceSyncStateModel, MIRROR_SYNC_NAME)
+            return None if state is None else state.watermark
+
+    async def _storePage(self, items, bitstreams, started, advance=True):
+        async with self.asyncSessionMaker() as session:
+            ids = [uuid.UUID(item["uuid"]) for item in items]
+            rows = await session.execute(select(DSpaceItemModel).where(DSpaceItemModel.id.in_(ids)))
+            existing = {row.id: row for row in rows.scalars()}
+            watermark = None
+            for id, item, listing in zip(ids, items, bitstreams):
+                values = mirrorValues(item, listing)
+                row = existing.get(id)
+                if row is None:
+                    row = DSpaceItemModel(id=id)
+                    session.add(row)
+                for key, value in values.items():
+                    setattr(row, key, value)
+                row.synced = started
+                if values["last_modified"] is not None:
+                    watermark = max(watermark or values["last_modified"], values["last_modified"])
+
+            state = await session.get(DSpaceSyncStateModel, MIRROR_SYNC_NAME)
+            if state is None:
+                state = DSpaceSyncStateModel(name=MIRROR_SYNC_NAME)
+                session.add(state)
+            if advance and watermark is not None and (state.watermark is None or watermark > state.watermark):
+                state.watermark = watermark
+            if state.lease_owner == self.owner:
+                state.leased_until = datetime.datetime.now() + self.lease
+            await session.commit()
+
+    def _sources(self):
+        # (backend, client) pairs, backend is None without routing
+        client = getClient()
+        if isinstance(client, RoutingClient):
+            return client, [(backend, backend.client) for backend in client.backends.values()]
+        return None, [(None, client)]
+
+    async def sync(self, full=False):
+        """Mirrors items changed since the watermark, returns the number of written items."""
+        started = datetime.datetime.now()
+        since = None if full else await self.watermark()
+        routing, sources = self._sources()
+        # merged backends are not ordered by lastModified together, the watermark waits for all
+        advance = len(sources) == 1
+        count = 0
+        maxima = []
+        complete = True
+        for backend, client in sources:
+            changed = ChangedItems(since, size=self.size, client=client)
+            async for items in changed.pages():
+                if routing is not None:
+                    routing.learn(backend, items)
+                results = await gatherLimited([
+                    (lambda item=item: getItemBitstreams(item["uuid"])) for item in items
+                ], concurrency=self.concurrency)
+                for result in results:
+                    if result["msg"] != 200:
+                        # the page is written again by the next run, the watermark stays
+                        message = result.get("error", {}).get("message") or f"status {result['msg']}"
+                        raise RuntimeError(f"Bitstreams of a DSpace item could not be read, {message}")
+                await self._storePage(items, [result["response"] for result in results], started, advance=advance)
+                count += len(items)
+            if changed.maximum is not None:
+                maxima.append(changed.maximum)
+            if since is None and await changed.total() > len(changed.seen):
+                # items were added or skipped meanwhile, nothing is deleted on this walk
+                complete = False
+
+        async with self.asyncSessionMaker() as session:
+            if since is None and complete:
+                # items not seen by a full run are gone from DSpace
+                await session.execute(delete(DSpaceItemModel).where(or_(DSpaceItemModel.synced.is_(None), DSpaceItemModel.synced < started)))
+            state = await session.get(DSpaceSyncStateModel, MIRROR_SYNC_NAME)
+            if state is None:
+                state = DSpaceSyncStateModel(name=MIRROR_SYNC_NAME)
+                session.add(state)
+            if not advance and maxima:
+                watermark = min(maxima)
+                if state.watermark is None or watermark > state.watermark:
+                    state.watermark = watermark
+            state.lastrun = datetime.datetime.now()
+            if since is None and complete:
+                state.lastfull = state.lastrun
+            await session.commit()
+        return count
+
+    async def acquire(self):
+        """Takes the lease of the synchronization, returns the state row values or None when
+        another worker holds it.
+        """
+        now = datetime.datetime.now()
+        try:
+            async with self.asyncSessionMaker() as session:
+                rows = await session.execute(
+                    select(DSpaceSyncStateModel)
+                    .where(DSpaceSyncStateModel.name == MIRROR_SYNC_NAME)
+                    .with_for_update(skip_locked=True)
+                )
+                state = rows.scalars().first()
+                if state is None:
+                    if await session.get(DSpaceSyncStateModel, MIRROR_SYNC_NAME) is not None:
+                        # locked by another worker taking the lease right now
+                        return None
+                    state = DSpaceSyncStateModel(name=MIRROR_SYNC_NAME)
+                    session.add(state)
+                elif state.lease_owner not in (None, self.owner) and state.leased_until is not None and state.leased_until > now:
+                    return None
+                state.lease_owner = self.owner
+                state.leased_until = now + self.lease
+                lastfull = state.lastfull
+                await session.commit()
+        except IntegrityError:
+            # the row was created by another worker at the same moment
+            return None
+        return {"lastfull": lastfull}
+
+    async def release(self):
+        async with self.asyncSessionMaker() as session:
+            state = await session.get(DSpaceSyncStateModel, MIRROR_SYNC_NAME)
+            if state is not None and state.lease_owner == self.owner:
+                state.lease_owner = None
+                state.leased_until = None
+                await session.commit()
+
+    async def runOnce(self):
+        """Synchronizes under the lease, full when the last full run is older than `fullInterval`.
+        Returns the number of written items, None when another worker is synchronizing.
+        """
+        state = await self.acquire()
+        if state is None:
+            return None
+        try:
+            lastfull = state["lastfull"]
+            full = lastfull is None or datetime.datetime.now() - lastfull >= datetime.timedelta(seconds=self.fullInterval)
+            return await self.sync(full=full)
+        finally:
+            await self.release()
+
+    async def _run(self):
+        while True:
+            try:
+                await self.runOnce()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"DSpace mirror error {e}", flush=True)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+async def reconcile(asyncSessionMaker):
+    """Differences between documents and the mirror, lists of document ids:
+    missing - the DSpace item is not in the mirror, withdrawn - the item is withdrawn,
+    without_file - neither the item nor a shared bitstream holds the content.
+    """
+    async with asyncSessionMaker() as session:
+        joined = select(DocumentModel.id).outerjoin(DSpaceItemModel, DSpaceItemModel.id == DocumentModel.dspace_id)
+        missing = await session.execute(joined.where(DSpaceItemModel.id.is_(None)))
+        withdrawn = await session.execute(joined.where(DSpaceItemModel.withdrawn.is_(True)))
+        withoutFile = await session.execute(
+            joined
+            .where(DSpaceItemModel.id.is_not(None))
+            .where(DSpaceItemModel.original_bitstream_id.is_(None))
+            .where(DocumentModel.bitstream_id.is_(None))
+        )
+        return {
+            "missing": list(missing.scalars()),
+            "withdrawn": list(withdrawn.scalars()),
+            "without_file": list(withoutFile.scalars()),
+        }
@@ -0,0 +1,193 @@
+import asyncio
+import contextvars
+import datetime
+import os
+import random
+import uuid
+from contextlib import contextmanager
+
+from sqlalchemy import event, select, exists, and_
+from sqlalchemy.orm import Session, aliased
+
+from src.DBDefinitions import DocumentModel, DSpaceOutboxModel
+from DspaceAPI.UpdateItemMetadata import updateItemMetadata, desiredState
+
+###########################################################################################################################
+#
+# transakcni outbox pro synchronizaci dokumentu do DSpace
+# zmena v tabulce documents a zaznam v dspace_outbox se ukladaji v jedne transakci,
+# do DSpace je prenasi OutboxWorker na pozadi
+#
+###########################################################################################################################
+
+OUTBOX_WORKERS = int(os.environ.get("DSPACE_OUTBOX_WORKERS", "2"))
+OUTBOX_POLL_INTERVAL = float(os.environ.get("DSPACE_OUTBOX_POLL_INTERVAL", "1"))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get("DSPACE_OUTBOX_MAX_ATTEMPTS", "8"))
+
+_capturing = contextvars.ContextVar("dspace_outbox_capturing", default=False)
+
+
+@contextmanager
+def outboxCapture():
+    """Changes of documents flushed inside this block are recorded in the outbox."""
+    token = _capturing.set(True)
+    try:
+        yield
+    finally:
+        _capturing.reset(token)
+
+
+def _entry(operation, document_id, dspace_id, payload=None):
+    return DSpaceOutboxModel(
+        document_id=document_id,
+        dspace_id=dspace_id,
+        operation=operation,
+        payload=payload,
+        available_at=datetime.datetime.now(),
+    )
+
+
+def _payload(document):
+    return {"name": document.name, "description": document.description}
+
+
+@event.listens_for(Session, "before_flush")
+def _captureFlush(session, flush_context, instances):
+    if not _capturing.get():
+        return
+    for document in list(session.new):
+        if isinstance(document, DocumentModel):
+            document.id = document.id or uuid.uuid4()
+            session.add(_entry("insert", document.id, document.dspace_id, _payload(document)))
+    for document in list(session.dirty):
+        if isinstance(document, DocumentModel) and session.is_modified(document):
+            session.add(_entry("update", document.id, document.dspace_id, _payload(document)))
+    for document in list(session.deleted):
+        if isinstance(document, DocumentModel):
+            session.add(_entry("delete", document.id, document.dspace_id))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _captureBulkDelete(orm_execute_state):
+    # loaders delete with a DELETE statement, which bypasses the flush
+    if not _capturing.get() or not orm_execute_state.is_delete:
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None or mapper.class_ is not DocumentModel:
+        return
+    statement = select(DocumentModel.id, DocumentModel.dspace_id)
+    whereclause = orm_execute_state.statement.whereclause
+    if whereclause is not None:
+        statement = statement.where(whereclause)
+    session = orm_execute_state.session
+    for id, dspace_id in session.execute(statement).all():
+        session.add(_entry("delete", id, dspace_id))
+
+
+async def applyEntry(entry):
+    """Pushes one outbox entry into DSpace, returns an error message or None."""
+    if entry.dspace_id is None:
+        return None
+    if entry.operation == "delete":
+        # the archived item is kept, only withdrawn
+        desired = desiredState(withdrawn=True)
+    else:
+        desired = desiredState(title=entry.payload["name"], description=entry.payload["description"])
+    result = await updateItemMetadata(entry.dspace_id, desired)
+    if result["msg"] is None or result["msg"] >= 300:
+        error = result.get("error", {}).get("message")
+        return error or f"DSpace answered {result['msg']}"
+    return None
+
+
+def _backoff(attempts):
+    return datetime.timedelta(seconds=min(300, 2 ** attempts) * random.uniform(0.5, 1.0))
+
+
+class OutboxWorker:
+    """Drains dspace_outbox into DSpace with a pool of asyncio tasks.
+
+    Each task claims the oldest ready entry with FOR UPDATE SKIP LOCKED, so several tasks and
+    several processes can share the table. An entry is taken only when no older entry of the
+    same document is pending, this keeps the order of changes per document. Failed entries are
+    retried with backoff and given up after `maxAttempts`.
+    """
+
+    def __init__(self, asyncSessionMaker, workers=OUTBOX_WORKERS, pollInterval=OUTBOX_POLL_INTERVAL, maxAttempts=OUTBOX_MAX_ATTEMPTS, apply=applyEntry):
+        self.asyncSessionMaker = asyncSessionMaker
+        self.workers = workers
+        self.pollInterval = pollInterval
+        self.maxAttempts = maxAttempts
+        self.apply = apply
+        self._tasks = []
+
+    def _claimStatement(self):
+        older = aliased(DSpaceOutboxModel)
+        blocked = exists().where(and_(
+            older.document_id == DSpaceOutboxModel.document_id,
+            older.processed.is_(None),
+            older.id < DSpaceOutboxModel.id,
+        ))
+        return (
+            select(DSpaceOutboxModel)
+            .where(DSpaceOutboxModel.processed.is_(None))
+            .where(DSpaceOutboxModel.available_at <= datetime.datetime.now())
+            .where(~blocked)
+            .order_by(DSpaceOutboxModel.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )
+
+    async def processOne(self):
+        """Processes one ready entry, returns False when there is none."""
+        async with self.asyncSessionMaker() as session:
+            rows = await session.execute(self._claimStatement())
+            entry = rows.scalars().first()
+            if entry is None:
+                return False
+            try:
+                error = await self.apply(entry)
+            except Exception as e:
+                error = f"{e}"
+            if error is None:
+                entry.processed = datetime.datetime.now()
+                entry.error = None
+            else:
+                entry.attempts += 1
+                entry.error = error
+                if entry.attempts >= self.maxAttempts:
+                    # given up, later changes of the document must not wait forever
+                    entry.processed = datetime.datetime.now()
+                else:
+                    entry.available_at = datetime.datetime.now() + _backoff(entry.attempts)
+            await session.commit()
+            return True
+
+    async def drain(self):
+        """Processes entries until none is ready, returns their count."""
+        count = 0
+        while await self.processOne():
+            count += 1
+        return count
+
+    async def _run(self):
+        while True:
+            try:
+                processed = await self.processOne()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"DSpace outbox worker error {e}", flush=True)
+                processed = False
+            if not processed:
+                await asyncio.sleep(self.pollInterval)
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+        return self
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
@@ -1,9 +1,29 @@
 from uoishelpers.dataloaders import createIdLoader
 from functools import cache
+from aiodataloader import DataLoader
 
 from src.DBDefinitions.documentDBModel import (
     DocumentModel, DocumentFolderModel
 )
+from DspaceAPI.Concurrency import gatherLimited
+from DspaceAPI.GetBitstreamItem import getItemBitstreams, getItemWithBitstreams
+from DspaceAPI.config import DSPACE_BULK_CONCURRENCY
+
+
+def createDSpaceLoader(fetch, concurrency=DSPACE_BULK_CONCURRENCY):
+    """DataLoader of DSpace resources by uuid, `fetch(key)` returns the usual result.
+
+    Keys collected during one tick are deduplicated and fetched in parallel, at most
+    `concurrency` at once, over the shared client. Results are cached for the life of the
+    loader (one request), an unavailable resource loads as None.
+    """
+    async def batch_load_fn(keys):
+        results = await gatherLimited([
+            (lambda key=key: fetch(key)) for key in keys
+        ], concurrency=concurrency)
+        return [result["response"] if result["msg"] == 200 else None for result in results]
+
+    return DataLoader(batch_load_fn=batch_load_fn, get_cache_key=str)
 
 
 def createLoaders(asyncSessionMaker):
@@ -16,6 +36,20 @@ def createLoaders(asyncSessionMaker):
         @cache
         def document_folders(self):
             return createIdLoader(asyncSessionMaker, DocumentFolderModel)
+        @property
+        @cache
+        def dspace_items(self):
+            # the item arrives with its bitstreams, they are primed for dspace_bitstreams
+            async def fetch(key):
+                result = await getItemWithBitstreams(str(key))
+                if result["msg"] == 200:
+                    self.dspace_bitstreams.prime(key, result["response"]["bitstreams"])
+                return result
+            return createDSpaceLoader(fetch)
+        @property
+        @cache
+        def dspace_bitstreams(self):
+            return createDSpaceLoader(lambda key: getItemBitstreams(str(key)))
     return Loaders()
 
 
@@ -0,0 +1,278 @@
+import asyncio
+import functools
+import json
+import os
+import uuid
+
+from sqlalchemy.future import select
+
+from src.DBDefinitions import DocumentModel
+from DspaceAPI.Client import DSpaceError, errorResult
+from DspaceAPI.Concurrency import gatherLimited, gatherOrCancel
+from DspaceAPI.CreateItem import createItem
+from DspaceAPI.AddBundleItem import addBundleItem
+from DspaceAPI.ContentIndex import findStoredContent, uploadBitstreamOnce
+from DspaceAPI.config import DSPACE_BULK_CONCURRENCY, DSPACE_BULK_RATE
+
+###########################################################################################################################
+#
+# vytvoreni dokumentu vcetne souboru jednim volanim
+# DSpace item -> (bundle -> bitstream) || radek v tabulce documents
+#
+###########################################################################################################################
+
+
+class Checkpoint:
+    """Progress of pipeline runs, appended as JSON lines so a crashed run can be resumed.
+    Without a file the progress is kept only in memory.
+    """
+
+    def __init__(self, filename=None):
+        self.filename = filename
+        self.states = {}
+        self._lock = asyncio.Lock()
+        if filename is not None and os.path.exists(filename):
+            with open(filename, "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    self.states.setdefault(record["key"], {}).update(record["state"])
+
+    def get(self, key):
+        return self.states.setdefault(key, {})
+
+    def _append(self, line):
+        with open(self.filename, "a", encoding="utf-8") as f:
+            f.write(line)
+
+    async def save(self, key, **changes):
+        self.get(key).update(changes)
+        if self.filename is None:
+            return
+        line = json.dumps({"key": key, "state": changes}) + "\n"
+        async with self._lock:
+            await asyncio.to_thread(self._append, line)
+
+
+def _check(result, stage):
+    if result["msg"] is None or result["msg"] >= 300:
+        message = result.get("error", {}).get("message") or f"{stage} failed with status {result['msg']}"
+        raise DSpaceError(message, result["msg"], result["response"])
+    return result["response"]
+
+
+async def storeDocument(asyncSessionMaker, **values):
+    """Inserts the document row, an existing row with the same id is left untouched."""
+    async with asyncSessionMaker() as session:
+        existing = await session.execute(select(DocumentModel.id).filter_by(id=values["id"]))
+        if existing.scalar() is None:
+            session.add(DocumentModel(**values))
+            await session.commit()
+
+
+class BatchedInsert:
+    """Collects document rows of concurrently running pipelines and inserts them together.
+
+    `store(**values)` returns once the row is committed, so the caller may record it in the
+    checkpoint. A batch is written when `size` rows are waiting or `delay` seconds after its
+    first row. Rows whose id already exists are skipped, like in storeDocument.
+    """
+
+    def __init__(self, asyncSessionMaker, size=100, delay=0.2):
+        self.asyncSessionMaker = asyncSessionMaker
+        self.size = size
+        self.delay = delay
+        self._pending = []
+        self._timer = None
+        self._flushes = set()
+
+    async def store(self, **values):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((values, future))
+        if len(self._pending) >= self.size:
+            self._startFlush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.delay, self._startFlush)
+        await future
+
+    def _startFlush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._flush(batch))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, batch):
+        try:
+            async with self.asyncSessionMaker() as session:
+                ids = [values["id"] for values, _ in batch]
+                existing = await session.execute(select(DocumentModel.id).where(DocumentModel.id.in_(ids)))
+                existing = set(existing.scalars())
+                session.add_all([DocumentModel(**values) for values, _ in batch if values["id"] not in existing])
+                await session.commit()
+        except Exception as error:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        for _, future in batch:
+            if not future.done():
+                future.set_result(None)
+
+    async def close(self):
+        """Writes the rows still waiting."""
+        self._startFlush()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+
+async def createDocumentWithFile(
+    asyncSessionMaker,
+    collectionId,
+    source,
+    filename,
+    name,
+    description=None,
+    folder_id=None,
+    group_id=None,
+    author_id=None,
+    document_type=None,
+    contentType="application/pdf",
+    author="",
+    language="cz",
+    id=None,
+    checkpoint=None,
+    shareContent=True,
+    contentIndex=None,
+    store=None,
+):
+    """Creates a DSpace item with the file and the matching row in documents.
+
+    Round trips: item (with title and description) -> bundle -> bitstream. Every finished step is
+    recorded in `checkpoint` under the document id, calling again with the same id and checkpoint
+    continues where the previous run stopped instead of creating another item. With a checkpoint
+    file the database row is written while the bundle and the file are being sent, a resumed run
+    completes a document whose file failed; otherwise the row is written after the file, so a
+    failed upload leaves no row behind. `source` is anything
+    uploadBitstream accepts; when resuming it must be able to provide the content again.
+
+    With `shareContent` a file already stored in DSpace (see ContentIndex) is not uploaded again,
+    the document refers to the existing bitstream through bitstream_id and its item stays without
+    a bundle. DSpace REST cannot attach one bitstream to several bundles, so this is the only way
+    to share it. Bytes not uploaded are reported as saved_bytes.
+
+    The row is written by `store(**values)`, storeDocument by default (see BatchedInsert).
+    """
+    id = uuid.uuid4() if id is None else uuid.UUID(str(id))
+    key = str(id)
+    checkpoint = Checkpoint() if checkpoint is None else checkpoint
+    if store is None:
+        store = functools.partial(storeDocument, asyncSessionMaker)
+    state = checkpoint.get(key)
+    stage = "item"
+    try:
+        if "item_id" not in state:
+            item = _check(await createItem(
+                collectionId, name, author=author, type=document_type or "",
+                language=language, description=description
+            ), stage)
+            await checkpoint.save(key, item_id=item["uuid"])
+        itemId = state["item_id"]
+
+        if shareContent and "bitstream_id" not in state:
+            stage = "bitstream"
+            stored = await findStoredContent(source, index=contentIndex)
+            if stored is not None:
+                await checkpoint.save(
+                    key, bitstream_id=stored["response"]["uuid"], shared_content=True, saved_bytes=stored["saved"]
+                )
+        sharedBitstream = state["bitstream_id"] if state.get("shared_content") else None
+
+        async def sendFile():
+            nonlocal stage
+            if sharedBitstream is not None:
+                return
+            if "bundle_id" not in state:
+                stage = "bundle"
+                bundle = _check(await addBundleItem(itemId), stage)
+                await checkpoint.save(key, bundle_id=bundle["uuid"])
+            if "bitstream_id" not in state:
+                stage = "bitstream"
+                uploaded = await uploadBitstreamOnce(
+                    state["bundle_id"], source, filename, contentType=contentType, index=contentIndex
+                )
+                bitstream = _check(uploaded, stage)
+                await checkpoint.save(key, bitstream_id=bitstream["uuid"], saved_bytes=uploaded["saved"])
+
+        async def writeRow():
+            nonlocal stage
+            if "document_stored" not in state:
+                try:
+                    await store(
+                        id=id,
+                        dspace_id=uuid.UUID(itemId),
+                        bitstream_id=None if sharedBitstream is None else uuid.UUID(sharedBitstream),
+                        name=name,
+                        description=description,
+                        folder_id=folder_id,
+                        group_id=group_id,
+                        author_id=author_id,
+                        document_type=document_type,
+                    )
+                except Exception:
+                    stage = "document"
+                    raise
+                await checkpoint.save(key, document_stored=True)
+
+        if checkpoint.filename is not None:
+            # a failed step stops the other one, a half sent file is not left uploading
+            await gatherOrCancel(sendFile(), writeRow())
+        else:
+            # nothing would finish the document later, its row waits for the file
+            await sendFile()
+            await writeRow()
+    except Exception as error:
+        result = errorResult(error)
+        result["id"] = key
+        result["stage"] = stage
+        result["state"] = dict(state)
+        return result
+
+    result = {}
+    result["msg"] = 201
+    result["id"] = key
+    result["response"] = dict(state)
+    return result
+
+
+async def createDocumentsWithFiles(
+    asyncSessionMaker,
+    collectionId,
+    documents,
+    checkpoint=None,
+    concurrency=DSPACE_BULK_CONCURRENCY,
+    rate=DSPACE_BULK_RATE,
+    store=None,
+    onResult=None,
+):
+    """Runs createDocumentWithFile for many documents in parallel.
+    `documents` are dicts with its keyword arguments (source, filename, name, ...),
+    results keep their order and a failed document does not stop the others.
+    `onResult(document, result)` is called as soon as a document is finished.
+    """
+    checkpoint = Checkpoint() if checkpoint is None else checkpoint
+
+    async def create(document):
+        result = await createDocumentWithFile(
+            asyncSessionMaker, collectionId, checkpoint=checkpoint, store=store, **document
+        )
+        if onResult is not None:
+            onResult(document, result)
+        return result
+
+    calls = [(lambda document=document: create(document)) for document in documents]
+    return await gatherLimited(calls, concurrency=concurrency, rate=rate)
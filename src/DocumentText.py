@@ -0,0 +1,304 @@
+import asyncio
+import datetime
+import multiprocessing
+import os
+import tempfile
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import select, update, and_, or_, case, cast, func, literal
+from sqlalchemy.orm import aliased
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.dialects.postgresql import REGCONFIG
+
+from src.DBDefinitions import DocumentModel, DocumentTextModel, DSpaceItemModel
+from src.TextExtraction import extractText, MAX_CHARS
+from DspaceAPI.GetBitstreamItem import getContentBitstream
+from DspaceAPI.GetContentItem import downloadItemContent
+from DspaceAPI.ContentCache import bitstreamChecksum
+
+###########################################################################################################################
+#
+# fulltextove vyhledavani v obsahu dokumentu
+# TextExtractor stahuje nove soubory z DSpace a extrahuje z nich text v samostatnych procesech,
+# text se uklada do document_texts jako tsvector s GIN indexem
+#
+###########################################################################################################################
+
+# parsing is CPU bound, every API worker runs its own pool, so one process each unless configured
+TEXT_PROCESSES = int(os.environ.get("DOCUMENT_TEXT_PROCESSES", "1"))
+TEXT_POLL_INTERVAL = float(os.environ.get("DOCUMENT_TEXT_POLL_INTERVAL", "5"))
+TEXT_BATCH = int(os.environ.get("DOCUMENT_TEXT_BATCH", "50"))
+TEXT_MAX_ATTEMPTS = int(os.environ.get("DOCUMENT_TEXT_MAX_ATTEMPTS", "8"))
+# claimed documents of a crashed worker are taken by others after this many seconds
+TEXT_LEASE = float(os.environ.get("DOCUMENT_TEXT_LEASE", "1800"))
+# a document whose item has no file yet is looked at again after this many seconds, no attempt is used up
+TEXT_NO_FILE_RETRY = float(os.environ.get("DOCUMENT_TEXT_NO_FILE_RETRY", "600"))
+TEXT_SEARCH_CONFIG = os.environ.get("DOCUMENT_TEXT_SEARCH_CONFIG", "simple")
+
+
+def _isPostgres(session):
+    return session.get_bind().dialect.name == "postgresql"
+
+
+def _searchConfig():
+    return cast(TEXT_SEARCH_CONFIG, REGCONFIG)
+
+
+def _backoff(attempts):
+    return datetime.timedelta(seconds=min(3600, 30 * 2 ** attempts))
+
+
+async def fetchContent(dspaceId, directory, bitstreamId=None):
+    """Downloads the content of a document (see getContentBitstream), returns (bitstream, path) or None without a file."""
+    bitstream = await getContentBitstream(str(dspaceId), bitstreamId)
+    if bitstream is None:
+        return None
+    result = await downloadItemContent(bitstream["uuid"], "content", filePath=directory)
+    if result["msg"] != 200:
+        raise RuntimeError(result.get("error", {}).get("message") or f"Download failed with status {result['msg']}")
+    return bitstream, result["response"]["file"]
+
+
+class TextExtractor:
+    """Fills document_texts for documents whose text has not been extracted yet.
+
+    Downloads run in the event loop, parsing in a pool of `processes` processes, so the loop
+    never blocks on a large PDF. At most twice as many documents as processes are in flight,
+    the next file is downloaded while the previous one is being parsed. Documents without a file
+    (the upload may still be running) are looked at again later, failed documents are tried
+    again with backoff.
+
+    A document is extracted again when the bitstream it resolves to or its DSpace checksum (as
+    the mirror, see DSpaceMirror, knows it) differs from the stored one, with fresh attempts.
+
+    A batch is claimed first, like the outbox claims entries: its document_texts rows are
+    selected FOR UPDATE SKIP LOCKED and leased by claimed_until, so several workers never
+    extract the same document.
+    """
+
+    def __init__(self, asyncSessionMaker, processes=TEXT_PROCESSES, pollInterval=TEXT_POLL_INTERVAL, batch=TEXT_BATCH, maxAttempts=TEXT_MAX_ATTEMPTS, fetch=fetchContent, lease=TEXT_LEASE, noFileRetry=TEXT_NO_FILE_RETRY):
+        self.asyncSessionMaker = asyncSessionMaker
+        self.processes = processes
+        self.pollInterval = pollInterval
+        self.batch = batch
+        self.maxAttempts = maxAttempts
+        self.fetch = fetch
+        self.lease = datetime.timedelta(seconds=lease)
+        self.noFileRetry = datetime.timedelta(seconds=noFileRetry)
+        self._executor = None
+        self._task = None
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            # spawn, forking a process with a running event loop and open connections is unsafe
+            self._executor = ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    async def _addMissingRows(self, session):
+        # documents without a row get one, so that they can be claimed like the others
+        missing = (
+            select(DocumentModel.id, literal(0))
+            .outerjoin(DocumentTextModel, DocumentTextModel.id == DocumentModel.id)
+            .where(DocumentTextModel.id.is_(None))
+            .limit(self.batch)
+        )
+        dialect = postgresql if _isPostgres(session) else sqlite
+        # another worker may insert the same rows at the same moment
+        await session.execute(
+            dialect.insert(DocumentTextModel)
+            .from_select(["id", "attempts"], missing)
+            .on_conflict_do_nothing(index_elements=["id"])
+        )
+
+    def _changedStatement(self, now):
+        # the bitstream a document resolves to now: its shared one, otherwise the item's own file
+        own = aliased(DSpaceItemModel)
+        shared = aliased(DSpaceItemModel)
+        bitstreamId = func.coalesce(DocumentModel.bitstream_id, own.original_bitstream_id)
+        checksum = case(
+            (DocumentModel.bitstream_id.is_(None), own.original_checksum),
+            else_=shared.original_checksum,
+        )
+        return (
+            select(DocumentTextModel.id)
+            .join(DocumentModel, DocumentModel.id == DocumentTextModel.id)
+            .outerjoin(own, own.id == DocumentModel.dspace_id)
+            .outerjoin(shared, shared.original_bitstream_id == DocumentModel.bitstream_id)
+            .where(DocumentTextModel.bitstream_id.is_not(None))
+            .where(or_(DocumentTextModel.claimed_until.is_(None), DocumentTextModel.claimed_until <= now))
+            .where(bitstreamId.is_not(None))
+            .where(or_(
+                bitstreamId != DocumentTextModel.bitstream_id,
+                and_(checksum.is_not(None), checksum != func.coalesce(DocumentTextModel.checksum, "")),
+            ))
+        )
+
+    async def _requeueChanged(self, session, now):
+        # stale texts stay searchable until the new one is stored, attempts start again
+        await session.execute(
+            update(DocumentTextModel)
+            .where(DocumentTextModel.id.in_(self._changedStatement(now)))
+            .values(extracted=None, attempts=0, error=None, available_at=None, bitstream_id=None, checksum=None)
+            .execution_options(synchronize_session=False)
+        )
+
+    def _claimStatement(self, now):
+        return (
+            select(DocumentTextModel)
+            .where(DocumentTextModel.extracted.is_(None))
+            .where(DocumentTextModel.attempts < self.maxAttempts)
+            .where(or_(DocumentTextModel.available_at.is_(None), DocumentTextModel.available_at <= now))
+            .where(or_(DocumentTextModel.claimed_until.is_(None), DocumentTextModel.claimed_until <= now))
+            .order_by(DocumentTextModel.available_at.nulls_first())
+            .limit(self.batch)
+            .with_for_update(skip_locked=True)
+        )
+
+    async def claim(self):
+        """Leases a batch of pending documents, returns their (id, dspace_id, bitstream_id)."""
+        now = datetime.datetime.now()
+        async with self.asyncSessionMaker() as session:
+            await self._addMissingRows(session)
+            await self._requeueChanged(session, now)
+            rows = await session.execute(self._claimStatement(now))
+            ids = [row.id for row in rows.scalars()]
+            if not ids:
+                await session.commit()
+                return []
+            await session.execute(
+                update(DocumentTextModel)
+                .where(DocumentTextModel.id.in_(ids))
+                .values(claimed_until=now + self.lease)
+            )
+            documents = await session.execute(
+                select(DocumentModel.id, DocumentModel.dspace_id, DocumentModel.bitstream_id)
+                .where(DocumentModel.id.in_(ids))
+            )
+            claimed = documents.all()
+            await session.commit()
+        return claimed
+
+    async def _store(self, id, **values):
+        async with self.asyncSessionMaker() as session:
+            row = await session.get(DocumentTextModel, id)
+            if row is None:
+                row = DocumentTextModel(id=id)
+                session.add(row)
+            if "content" in values and _isPostgres(session):
+                values["search_vector"] = func.to_tsvector(_searchConfig(), values["content"])
+            for key, value in values.items():
+                setattr(row, key, value)
+            await session.commit()
+
+    async def _failed(self, id, error, **values):
+        async with self.asyncSessionMaker() as session:
+            row = await session.get(DocumentTextModel, id)
+            attempts = 1 if row is None else row.attempts + 1
+        await self._store(id, attempts=attempts, error=error, available_at=datetime.datetime.now() + _backoff(attempts), claimed_until=None, **values)
+
+    async def _postpone(self, id, error):
+        # nothing failed, the file is not there yet
+        await self._store(id, error=error, available_at=datetime.datetime.now() + self.noFileRetry, claimed_until=None)
+
+    async def processDocument(self, id, dspaceId, directory, bitstreamId=None):
+        try:
+            fetched = await self.fetch(dspaceId, directory, bitstreamId)
+            if fetched is None:
+                await self._postpone(id, "DSpace item has no file")
+                return False
+            bitstream, path = fetched
+            # kept with a failure too, a changed file then gets fresh attempts (see _changedStatement)
+            source = {"bitstream_id": uuid.UUID(bitstream["uuid"]), "checksum": bitstreamChecksum(bitstream)}
+            try:
+                text = await asyncio.get_running_loop().run_in_executor(
+                    self.executor, extractText, path, bitstream.get("mimeType"), MAX_CHARS
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                await self._failed(id, f"{e}", **source)
+                return False
+            finally:
+                await asyncio.to_thread(os.remove, path)
+            await self._store(
+                id,
+                **source,
+                content=text,
+                error=None,
+                extracted=datetime.datetime.now(),
+                claimed_until=None,
+            )
+            return True
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await self._failed(id, f"{e}")
+            return False
+
+    async def processBatch(self):
+        """Processes one claimed batch of pending documents, returns how many were claimed."""
+        rows = await self.claim()
+        if not rows:
+            return 0
+        semaphore = asyncio.Semaphore(2 * self.processes)
+
+        async def limited(id, dspaceId, bitstreamId, directory):
+            async with semaphore:
+                await self.processDocument(id, dspaceId, directory, bitstreamId)
+
+        with tempfile.TemporaryDirectory(prefix="document-text-") as directory:
+            await asyncio.gather(*(limited(id, dspaceId, bitstreamId, directory) for id, dspaceId, bitstreamId in rows))
+        return len(rows)
+
+    async def drain(self):
+        """Processes batches until nothing is pending, returns the number of processed documents."""
+        count = 0
+        while processed := await self.processBatch():
+            count += processed
+        return count
+
+    async def _run(self):
+        while True:
+            try:
+                processed = await self.processBatch()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Document text extractor error {e}", flush=True)
+                processed = 0
+            if processed < self.batch:
+                await asyncio.sleep(self.pollInterval)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+async def searchDocuments(asyncSessionMaker, query, limit=20):
+    """Documents whose content matches `query` (web search syntax), best ranked first."""
+    async with asyncSessionMaker() as session:
+        statement = select(DocumentModel).join(DocumentTextModel, DocumentTextModel.id == DocumentModel.id)
+        if _isPostgres(session):
+            tsquery = func.websearch_to_tsquery(_searchConfig(), query)
+            statement = (
+                statement
+                .where(DocumentTextModel.search_vector.op("@@")(tsquery))
+                .order_by(func.ts_rank_cd(DocumentTextModel.search_vector, tsquery).desc())
+            )
+        else:
+            statement = statement.where(and_(*(
+                DocumentTextModel.content.ilike(f"%{term}%") for term in query.split()
+            )))
+        rows = await session.execute(statement.limit(limit))
+        return list(rows.scalars())
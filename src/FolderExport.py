@@ -0,0 +1,208 @@
+import asyncio
+import datetime
+import os
+import zipfile
+
+from sqlalchemy import select
+
+from src.DBDefinitions import DocumentModel, DocumentFolderModel
+from DspaceAPI.Client import DSpaceError
+from DspaceAPI.GetBitstreamItem import getContentBitstream
+from DspaceAPI.GetContentItem import streamItemContent, CHUNK_SIZE
+from DspaceAPI.config import DSPACE_BULK_CONCURRENCY
+
+###########################################################################################################################
+#
+# export slozky dokumentu jako ZIP streamovany primo do odpovedi
+# obsah se stahuje z DSpace soubezne (nejvyse `concurrency` dokumentu), do ZIPu se zapisuje postupne,
+# pamet je omezena velikosti front, nic se neuklada na disk
+#
+###########################################################################################################################
+
+EXPORT_CONCURRENCY = int(os.environ.get("FOLDER_EXPORT_CONCURRENCY", str(DSPACE_BULK_CONCURRENCY)))
+# chunks buffered per downloaded document, memory is bounded by concurrency * buffer * chunk size
+EXPORT_BUFFER = int(os.environ.get("FOLDER_EXPORT_BUFFER", "8"))
+ERRORS_NAME = "export-errors.txt"
+
+
+def safeName(name, fallback):
+    name = (name or "").replace("/", "_").replace("\\", "_").strip()
+    return name or f"{fallback}"
+
+
+def userGroups(user):
+    # the userinfo lists groups either as ids or as {"id": ...} objects
+    groups = (user or {}).get("groups") or []
+    return {str(group.get("id") if isinstance(group, dict) else group) for group in groups}
+
+
+def canAccessFolder(user, folder):
+    """A folder without a group is open to every authenticated user, a folder of a group only to
+    its members. `user` is None in DEMO mode, where everything is open.
+    """
+    if user is None or folder.group_id is None:
+        return True
+    return str(folder.group_id) in userGroups(user)
+
+
+async def folderDocuments(asyncSessionMaker, folderId, recursive=False, allowed=None):
+    """Returns (folder, [(directory, document), ...]) ordered by directory and name, None when the
+    folder does not exist. Directories are paths of subfolders relative to the folder, "" for itself.
+    Subfolders for which `allowed(subfolder)` is false are left out with their content.
+    """
+    async with asyncSessionMaker() as session:
+        folder = await session.get(DocumentFolderModel, folderId)
+        if folder is None:
+            return None
+        directories = {folder.id: ""}
+        level = [folder.id]
+        while recursive and level:
+            rows = await session.execute(select(DocumentFolderModel).where(DocumentFolderModel.parent_id.in_(level)))
+            level = []
+            for child in rows.scalars():
+                if child.id not in directories and (allowed is None or allowed(child)):
+                    directories[child.id] = f"{directories[child.parent_id]}{safeName(child.name, child.id)}/"
+                    level.append(child.id)
+        rows = await session.execute(select(DocumentModel).where(DocumentModel.folder_id.in_(list(directories))))
+        documents = sorted(
+            ((directories[document.folder_id], document) for document in rows.scalars()),
+            key=lambda pair: (pair[0], pair[1].name or "")
+        )
+        return folder, documents
+
+
+class _StreamSink:
+    """Unseekable file for ZipFile, collects written bytes until they are taken."""
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+async def _download(document, queue, chunkSize, bitstream=None, offset=0):
+    """Puts the bitstream metadata, the chunks and None into the queue, an exception on failure.
+    With `bitstream` and `offset` only the rest of the content is requested (Range), without metadata.
+    """
+    try:
+        if bitstream is None:
+            bitstream = await getContentBitstream(document.dspace_id, document.bitstream_id)
+            if bitstream is None:
+                raise DSpaceError("the document has no file in DSpace")
+            await queue.put(bitstream)
+        byteRange = (offset, None) if offset else None
+        result = await streamItemContent(bitstream["uuid"], queue.put, byteRange=byteRange, chunkSize=chunkSize)
+        if result["msg"] not in ((206,) if offset else (200,)):
+            message = (result.get("error") or {}).get("message") or f"status {result['msg']}"
+            raise DSpaceError(f"download failed, {message}", result["msg"])
+        await queue.put(None)
+    except asyncio.CancelledError:
+        raise
+    except Exception as error:
+        await queue.put(error)
+
+
+def memberName(directory, document, bitstream, used):
+    """Unique path of the document inside the archive, the extension comes from the DSpace file."""
+    extension = os.path.splitext(bitstream.get("name") or "")[1]
+    base = safeName(document.name, document.id)
+    if extension and base.lower().endswith(extension.lower()):
+        extension = ""
+    name = f"{directory}{base}{extension}"
+    counter = 1
+    while name.lower() in used:
+        name = f"{directory}{base} ({counter}){extension}"
+        counter += 1
+    used.add(name.lower())
+    return name
+
+
+async def exportFolder(documents, concurrency=EXPORT_CONCURRENCY, buffer=EXPORT_BUFFER, chunkSize=CHUNK_SIZE):
+    """Yields a ZIP archive of the documents ((directory, document) pairs, see folderDocuments).
+
+    Up to `concurrency` documents are downloaded ahead into bounded queues while the archive is
+    written in order, the bytes are yielded as soon as they are written. Entries are stored
+    without compression (documents are mostly PDFs) and sizes go to data descriptors, so nothing
+    is seeked and nothing touches the disk. A download interrupted in the middle, e.g. a prefetched
+    one which waited too long, continues once with a Range request. Documents which still cannot
+    be fetched are listed in export-errors.txt at the end, the response cannot fail anymore.
+    """
+    sink = _StreamSink()
+    archive = zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED, allowZip64=True)
+    pending = []
+    remaining = iter(documents)
+    errors = []
+    used = set()
+    current = None
+
+    def startNext():
+        for directory, document in remaining:
+            queue = asyncio.Queue(maxsize=buffer)
+            pending.append((directory, document, queue, asyncio.ensure_future(_download(document, queue, chunkSize))))
+            return
+
+    try:
+        for _ in range(concurrency):
+            startNext()
+        while pending:
+            directory, document, queue, current = pending.pop(0)
+            startNext()
+            bitstream = await queue.get()
+            if isinstance(bitstream, Exception):
+                errors.append(f"{document.name or document.id}: {bitstream}")
+                continue
+
+            name = memberName(directory, document, bitstream, used)
+            moment = document.lastchange or document.created or datetime.datetime.now()
+            info = zipfile.ZipInfo(name, date_time=moment.timetuple()[:6])
+            info.compress_type = zipfile.ZIP_STORED
+            with archive.open(info, mode="w", force_zip64=True) as entry:
+                if data := sink.take():
+                    yield data
+                written = 0
+                resumed = False
+                while (chunk := await queue.get()) is not None:
+                    if isinstance(chunk, Exception):
+                        if resumed:
+                            # the entry keeps what arrived, the failure is reported
+                            errors.append(f"{name}: incomplete, {chunk}")
+                            break
+                        resumed = True
+                        queue = asyncio.Queue(maxsize=buffer)
+                        current = asyncio.ensure_future(_download(document, queue, chunkSize, bitstream=bitstream, offset=written))
+                        continue
+                    entry.write(chunk)
+                    written += len(chunk)
+                    if data := sink.take():
+                        yield data
+            if data := sink.take():
+                yield data
+            await current
+            current = None
+
+        if errors:
+            archive.writestr(ERRORS_NAME, "\n".join(errors) + "\n")
+        archive.close()
+        if data := sink.take():
+            yield data
+    finally:
+        tasks = [task for _, _, _, task in pending] + ([current] if current is not None else [])
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
@@ -33,6 +33,7 @@ class Query:
     from .documentGQLmodel import (
         document_page,
         document_by_id,
+        document_search,
         # dspace_get_bitstream,
         # communities_page,
         # collections_page,
@@ -41,6 +42,7 @@ class Query:
 
     document_page = document_page
     document_by_id = document_by_id
+    document_search = document_search
     document_folder_page = folder_page
     document_folder_by_id = document_folder_by_id
     # dspace_get_bitstream = dspace_get_bitstream
@@ -29,6 +29,10 @@ from uoishelpers.resolvers import (
 
 #°_°
 from .BaseGQLModel import BaseGQLModel, IDType
+from src.DSpaceOutbox import outboxCapture
+from src.DocumentText import searchDocuments
+
+DSpaceItemGQLModel = typing.Annotated["DSpaceItemGQLModel", strawberry.lazy(".dspaceItemGQLModel")]
 
 
 # GroupGQLModel = typing.Annotated["GroupGQLModel", strawberry.lazy(".GroupGQLModel")]
@@ -52,6 +56,12 @@ class DocumentGQLModel(BaseGQLModel):
         permission_classes=[OnlyForAuthentized]
     )
 
+    bitstream_id: typing.Optional[IDType] = strawberry.field(
+        description="DSpace bitstream shared with another document holding the same content",
+        default=None,
+        permission_classes=[OnlyForAuthentized]
+    )
+
     name: typing.Optional[str] = strawberry.field(
         default=None,
         description="""Document name assigned by an administrator""",
@@ -159,6 +169,18 @@ class DocumentGQLModel(BaseGQLModel):
             ]
     )
 
+    @strawberry.field(
+        description="""Item of the DSpace repository holding the document""",
+        permission_classes=[OnlyForAuthentized]
+        )
+    async def dspace_item(self, info: strawberry.types.Info) -> typing.Optional[DSpaceItemGQLModel]:
+        from .dspaceItemGQLModel import DSpaceItemGQLModel
+        if self.dspace_id is None:
+            return None
+        # loads of all documents in the response are batched into parallel DSpace requests
+        item = await getLoadersFromInfo(info).dspace_items.load(self.dspace_id)
+        return None if item is None else DSpaceItemGQLModel.from_dict(item)
+
     # manager_id
 
     # address
@@ -269,6 +291,15 @@ document_page = strawberry.field(
         resolver=PageResolver[DocumentGQLModel](whereType=DocumentInputFilter)
         )    
 
+@strawberry.field(
+        description="""Finds documents by the text of their files, best matches first""",
+        permission_classes=[OnlyForAuthentized]
+        )
+async def document_search(self, info: strawberry.types.Info, query: str, limit: typing.Optional[int] = 20) -> typing.List[DocumentGQLModel]:
+    loader = DocumentGQLModel.getLoader(info)
+    rows = await searchDocuments(loader.getAsyncSessionMaker(), query, limit=limit)
+    return [DocumentGQLModel.from_dataclass(loader.registerResult(row)) for row in rows]
+
 # region Document
 @strawberry.input(description="initial attributes for Document insert")
 class DocumentInsertGQLModel:
@@ -323,7 +354,9 @@ class DocumentDeleteGQLModel:
         ]
     )
 async def document_update(self, info: strawberry.types.Info, Document: typing.Annotated[DocumentUpdateGQLModel, strawberry.argument(description="desc")]) -> typing.Union[DocumentGQLModel, UpdateError[DocumentGQLModel]]:
-    return await Update[DocumentGQLModel].DoItSafeWay(info=info, entity=Document)
+    # DSpace is synchronized from the outbox written in the same transaction
+    with outboxCapture():
+        return await Update[DocumentGQLModel].DoItSafeWay(info=info, entity=Document)
 
 @strawberry.mutation(
         description="Creates a Document, available only for admins",
@@ -334,7 +367,8 @@ async def document_update(self, info: strawberry.types.Info, Document: typing.An
     )
 async def document_insert(self, info: strawberry.types.Info, Document: DocumentInsertGQLModel) -> typing.Union[DocumentGQLModel, InsertError[DocumentGQLModel]]:
     Document.rbacobject_id = Document.rbacobject_id if Document.rbacobject_id else Document.group_id
-    return await Insert[DocumentGQLModel].DoItSafeWay(info=info, entity=Document)
+    with outboxCapture():
+        return await Insert[DocumentGQLModel].DoItSafeWay(info=info, entity=Document)
 
 @strawberry.mutation(
         description="Delete the Document, available only for admins",
@@ -344,7 +378,8 @@ async def document_insert(self, info: strawberry.types.Info, Document: DocumentI
         ]
     )
 async def document_delete(self, info: strawberry.types.Info, Document: DocumentDeleteGQLModel) -> typing.Optional[DeleteError[DocumentGQLModel]]:
-    return await Delete[DocumentGQLModel].DoItSafeWay(info=info, entity=Document)
+    with outboxCapture():
+        return await Delete[DocumentGQLModel].DoItSafeWay(info=info, entity=Document)
 
 
 
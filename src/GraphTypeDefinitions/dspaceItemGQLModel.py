@@ -0,0 +1,68 @@
+import typing
+import strawberry
+
+from uoishelpers.resolvers import getLoadersFromInfo
+from uoishelpers.gqlpermissions import OnlyForAuthentized
+
+from .BaseGQLModel import IDType
+
+
+def metadataValue(metadata, field):
+    values = (metadata or {}).get(field) or []
+    return values[0].get("value") if values else None
+
+
+@strawberry.type(description="""File stored in the DSpace repository""")
+class DSpaceBitstreamGQLModel:
+    id: IDType = strawberry.field(description="uuid of the bitstream in DSpace")
+    name: typing.Optional[str] = strawberry.field(description="file name", default=None)
+    bundle_name: typing.Optional[str] = strawberry.field(description="bundle of the bitstream (ORIGINAL, THUMBNAIL, ...)", default=None)
+    size_bytes: typing.Optional[float] = strawberry.field(description="size of the file", default=None)
+    checksum: typing.Optional[str] = strawberry.field(description="checksum of the content", default=None)
+
+    @classmethod
+    def from_dict(cls, bitstream):
+        return cls(
+            id=IDType(bitstream["uuid"]),
+            name=bitstream.get("name"),
+            bundle_name=bitstream.get("bundleName"),
+            size_bytes=bitstream.get("sizeBytes"),
+            checksum=(bitstream.get("checkSum") or {}).get("value"),
+        )
+
+
+@strawberry.type(description="""Item of the DSpace repository holding the document""")
+class DSpaceItemGQLModel:
+    id: IDType = strawberry.field(description="uuid of the item in DSpace")
+    name: typing.Optional[str] = strawberry.field(description="item name", default=None)
+    handle: typing.Optional[str] = strawberry.field(description="persistent handle of the item", default=None)
+    title: typing.Optional[str] = strawberry.field(description="dc.title", default=None)
+    description: typing.Optional[str] = strawberry.field(description="dc.description", default=None)
+    in_archive: typing.Optional[bool] = strawberry.field(description="is the item archived", default=None)
+    withdrawn: typing.Optional[bool] = strawberry.field(description="is the item withdrawn", default=None)
+    last_modified: typing.Optional[str] = strawberry.field(description="last modification reported by DSpace", default=None)
+
+    @classmethod
+    def from_dict(cls, item):
+        return cls(
+            id=IDType(item["uuid"]),
+            name=item.get("name"),
+            handle=item.get("handle"),
+            title=metadataValue(item.get("metadata"), "dc.title"),
+            description=metadataValue(item.get("metadata"), "dc.description"),
+            in_archive=item.get("inArchive"),
+            withdrawn=item.get("withdrawn"),
+            last_modified=item.get("lastModified"),
+        )
+
+    @strawberry.field(
+        description="""Files of the item""",
+        permission_classes=[OnlyForAuthentized]
+        )
+    async def bitstreams(self, info: strawberry.types.Info, bundle_name: typing.Optional[str] = None) -> typing.List[DSpaceBitstreamGQLModel]:
+        bitstreams = await getLoadersFromInfo(info).dspace_bitstreams.load(self.id) or []
+        return [
+            DSpaceBitstreamGQLModel.from_dict(bitstream)
+            for bitstream in bitstreams
+            if bundle_name is None or bitstream.get("bundleName") == bundle_name
+        ]
@@ -0,0 +1,76 @@
+import re
+import zlib
+
+try:
+    import pypdf
+except ImportError:
+    pypdf = None
+
+###########################################################################################################################
+#
+# extrakce textu ze souboru dokumentu
+# funkce jsou spousteny v ProcessPoolExecutor, proto tento modul importuje jen standardni knihovnu (a pypdf)
+#
+###########################################################################################################################
+
+# tsvector is limited to 1 MB, longer texts are cut
+MAX_CHARS = 500_000
+
+_STREAM = re.compile(rb"stream\r?\n(.*?)\r?\nendstream", re.DOTALL)
+_TEXT_OPERATOR = re.compile(rb"\((?:\\.|[^\\)])*\)\s*(?:Tj|'|\")|\[(?:\\.|[^\]])*\]\s*TJ", re.DOTALL)
+_LITERAL = re.compile(rb"\(((?:\\.|[^\\)])*)\)", re.DOTALL)
+_ESCAPES = {b"n": b"\n", b"r": b"\r", b"t": b"\t", b"b": b"\b", b"f": b"\f"}
+
+
+def _unescape(literal):
+    def replace(match):
+        escaped = match.group(1)
+        if escaped[:1].isdigit():
+            return bytes([int(escaped, 8) & 0xFF])
+        return _ESCAPES.get(escaped, escaped)
+    return re.sub(rb"\\([0-7]{1,3}|.)", replace, literal, flags=re.DOTALL)
+
+
+def _pdfTextFallback(data):
+    """Text shown by Tj / TJ operators of (possibly deflated) content streams.
+    Good enough for simple PDFs when pypdf is not installed.
+    """
+    parts = []
+    for match in _STREAM.finditer(data):
+        stream = match.group(1)
+        try:
+            stream = zlib.decompress(stream)
+        except zlib.error:
+            pass
+        for operator in _TEXT_OPERATOR.finditer(stream):
+            text = b"".join(_unescape(literal) for literal in _LITERAL.findall(operator.group(0)))
+            parts.append(text.decode("latin-1"))
+    return " ".join(parts)
+
+
+def _pdfText(path):
+    if pypdf is not None:
+        try:
+            reader = pypdf.PdfReader(path)
+            return "\n".join(page.extract_text() or "" for page in reader.pages)
+        except Exception:
+            # damaged or unusual file, the fallback may still find something
+            pass
+    with open(path, "rb") as f:
+        return _pdfTextFallback(f.read())
+
+
+def extractText(path, contentType=None, maxChars=MAX_CHARS):
+    """Returns the text of a downloaded file, empty string for unsupported types."""
+    with open(path, "rb") as f:
+        head = f.read(5)
+    if head == b"%PDF-" or contentType == "application/pdf":
+        text = _pdfText(path)
+    elif (contentType or "").startswith("text/"):
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            text = f.read(maxChars * 2)
+    else:
+        return ""
+    # NUL cannot be stored in a postgres text column
+    text = re.sub(r"\s+", " ", text.replace("\x00", " ")).strip()
+    return text[:maxChars]
@@ -0,0 +1,143 @@
+"""Benchmark of the DspaceAPI layer against the local DSpace mock (tests/dspace_mock.py).
+
+For create, upload, download and metadata update it reports HTTP calls per operation
+(login and XSRF round trips included), p50 / p99 latency and throughput.
+
+    python -m tests.benchmark_dspace --count 200 --concurrency 16 --latency 0.005
+
+Without --url the mock is started in a child process; with --url an already running
+mock (or a real DSpace, calls are then not counted) is used.
+"""
+import asyncio
+import statistics
+import time
+
+import aiohttp
+import click
+
+from DspaceAPI.Client import DSpaceClient, setClient
+from DspaceAPI.CreateItem import createItem
+from DspaceAPI.AddBundleItem import addBundleItem
+from DspaceAPI.AddBitstreamsItem import uploadBitstream
+from DspaceAPI.GetContentItem import streamItemContent
+from DspaceAPI.UpdateItemMetadata import updateItemMetadata, desiredState
+
+from .conftest import runDSpace
+
+
+async def mockStats(session, url):
+    try:
+        async with session.get(f"{url}/_mock/stats") as response:
+            if response.status != 200:
+                return None
+            return (await response.json())["total"]
+    except aiohttp.ClientError:
+        return None
+
+
+def percentile(values, fraction):
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method="inclusive")[round(fraction * 100) - 1]
+
+
+async def measure(name, calls, concurrency, session, url):
+    """Runs the calls with at most `concurrency` at once, returns one report row."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def timed(call):
+        async with semaphore:
+            start = time.perf_counter()
+            result = await call()
+            latencies.append(time.perf_counter() - start)
+            return result
+
+    before = await mockStats(session, url)
+    start = time.perf_counter()
+    results = await asyncio.gather(*(timed(call) for call in calls))
+    elapsed = time.perf_counter() - start
+    after = await mockStats(session, url)
+
+    failed = sum(1 for result in results if result["msg"] is None or result["msg"] >= 300)
+    return {
+        "operation": name,
+        "count": len(calls),
+        "failed": failed,
+        "calls": None if before is None else (after - before) / len(calls),
+        "p50": percentile(latencies, 0.50) * 1000,
+        "p99": percentile(latencies, 0.99) * 1000,
+        "throughput": len(calls) / elapsed,
+    }, results
+
+
+def printReport(rows):
+    click.echo(f"{'operation':<12}{'count':>7}{'failed':>8}{'calls/op':>10}{'p50 ms':>10}{'p99 ms':>10}{'ops/s':>10}")
+    for row in rows:
+        calls = "-" if row["calls"] is None else f"{row['calls']:.2f}"
+        click.echo(
+            f"{row['operation']:<12}{row['count']:>7}{row['failed']:>8}{calls:>10}"
+            f"{row['p50']:>10.1f}{row['p99']:>10.1f}{row['throughput']:>10.1f}"
+        )
+
+
+async def benchmark(url, count, concurrency, size, collection):
+    client = setClient(DSpaceClient(baseUrl=url))
+    content = bytes(range(256)) * (size // 256 + 1)
+    content = content[:size]
+    rows = []
+    try:
+        async with aiohttp.ClientSession() as session:
+            row, items = await measure("create", [
+                (lambda index=index: createItem(collection, f"benchmark {index}"))
+                for index in range(count)
+            ], concurrency, session, url)
+            rows.append(row)
+            itemIds = [item["response"]["uuid"] for item in items if item["msg"] == 201]
+
+            async def upload(itemId):
+                bundle = await addBundleItem(itemId)
+                if bundle["msg"] != 201:
+                    return bundle
+                return await uploadBitstream(bundle["response"]["uuid"], content, "benchmark.pdf")
+
+            row, bitstreams = await measure("upload", [
+                (lambda itemId=itemId: upload(itemId)) for itemId in itemIds
+            ], concurrency, session, url)
+            rows.append(row)
+            bitstreamIds = [bitstream["response"]["uuid"] for bitstream in bitstreams if bitstream["msg"] == 201]
+
+            row, _ = await measure("download", [
+                (lambda bitstreamId=bitstreamId: streamItemContent(bitstreamId, lambda chunk: None))
+                for bitstreamId in bitstreamIds
+            ], concurrency, session, url)
+            rows.append(row)
+
+            row, _ = await measure("metadata", [
+                (lambda itemId=itemId: updateItemMetadata(itemId, desiredState(title="renamed", description="benchmark")))
+                for itemId in itemIds
+            ], concurrency, session, url)
+            rows.append(row)
+    finally:
+        await client.close()
+    return rows
+
+
+@click.command()
+@click.option("--url", default=None, help="DSpace (mock) base url, the mock is started when not given")
+@click.option("--port", default=8127, help="port of the started mock")
+@click.option("--latency", default=0.0, help="latency added by the started mock to every request, seconds")
+@click.option("--count", default=100, help="operations of each kind")
+@click.option("--concurrency", default=8, help="operations running at once")
+@click.option("--size", default=256 * 1024, help="uploaded file size, bytes")
+@click.option("--collection", default="benchmark-collection", help="owning collection of created items")
+def main(url, port, latency, count, concurrency, size, collection):
+    if url is not None:
+        printReport(asyncio.run(benchmark(url, count, concurrency, size, collection)))
+        return
+    with runDSpace(port, latency=latency):
+        printReport(asyncio.run(benchmark(f"http://localhost:{port}", count, concurrency, size, collection)))
+
+
+if __name__ == "__main__":
+    main()
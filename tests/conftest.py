@@ -197,4 +197,62 @@ def SchemaExecutor(Context):
         return value
     return Execute
 
-SchemaExecutorDemo = SchemaExecutor
\ No newline at end of file
+SchemaExecutorDemo = SchemaExecutor
+
+@contextmanager
+def runDSpace(port, latency=0.0):
+    from multiprocessing import Process
+    from .dspace_mock import runDSpaceMock
+
+    _dspace_process = Process(target=runDSpaceMock, daemon=True, kwargs={"port": port, "latency": latency})
+    _dspace_process.start()
+    time.sleep(2)
+    logging.info(f"DSpace mock started at {port}")
+
+    yield _dspace_process
+    _dspace_process.terminate()
+    _dspace_process.join()
+    assert _dspace_process.is_alive() == False, "DSpace mock still alive :("
+    logging.info(f"DSpace mock stopped at {port}")
+
+@pytest.fixture(scope=serversTestscope)
+def DSpaceServer():
+    serverport = 8126
+    with runDSpace(serverport):
+        yield f"http://localhost:{serverport}"
+
+@pytest_asyncio.fixture
+async def DSpaceClient(DSpaceServer):
+    # every test runs in its own event loop, the client (and its session) must not outlive it
+    from DspaceAPI.Client import DSpaceClient, getClient, setClient
+    previous = getClient()
+    client = setClient(DSpaceClient(baseUrl=DSpaceServer))
+    yield client
+    await client.close()
+    setClient(previous)
+
+@pytest.fixture
+def ItemWithFile():
+    """Factory of DSpace items with an ORIGINAL bundle holding `content`, created through the current client.
+    Returns (item, bundle, bitstream), without content the bundle stays empty and bitstream is None.
+    """
+    from DspaceAPI.CreateItem import createItem
+    from DspaceAPI.AddBundleItem import addBundleItem
+    from DspaceAPI.AddBitstreamsItem import uploadBitstream
+
+    async def create(name, content=None, filename="file.pdf", collection="collection", **options):
+        item = (await createItem(collection, name))["response"]
+        bundle = (await addBundleItem(item["uuid"]))["response"]
+        bitstream = None
+        if content is not None:
+            uploaded = await uploadBitstream(bundle["uuid"], content, filename, **options)
+            assert uploaded["msg"] == 201, uploaded
+            bitstream = uploaded["response"]
+        return item, bundle, bitstream
+    return create
+
+@pytest.fixture(scope=serversTestscope)
+def SecondDSpaceServer():
+    serverport = 8128
+    with runDSpace(serverport):
+        yield f"http://localhost:{serverport}"
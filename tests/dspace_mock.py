@@ -0,0 +1,401 @@
+"""Local stand-in for the DSpace 7 REST API used by the DspaceAPI layer.
+
+Implements authn status / login with XSRF cookie and JWT bearer tokens, items, bundles,
+bitstreams (multipart upload, content with Range / ETag), communities, collections and
+workspace items. Every request can be delayed by `latency` seconds. Calls are counted per
+method and path and reported by GET /_mock/stats, POST /_mock/reset clears the counters.
+POST /_mock/fail?status=503&count=2&path=/server/api/core/items answers the next `count`
+requests under `path` with `status` (reset drops pending failures).
+
+    uvicorn tests.dspace_mock:app --port 8126
+"""
+import asyncio
+import collections
+import copy
+import datetime
+import hashlib
+import json
+import os
+import time
+import uuid
+
+import fastapi
+import jwt
+import uvicorn
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+
+XSRF_COOKIE = "DSPACE-XSRF-COOKIE"
+XSRF_HEADER = "DSPACE-XSRF-TOKEN"
+SECRET = "dspace-mock-secret-key-with-enough-bytes"
+USERS = {"test@test.edu": "admin"}
+HAL = "application/hal+json"
+EMBED_PAGE_SIZE = 20
+
+
+def hal(content, status_code=200, headers=None):
+    return JSONResponse(content, status_code=status_code, headers=headers, media_type=HAL)
+
+
+def metadataValues(metadata, language="cz"):
+    return {
+        field: [{"value": value["value"], "language": value.get("language", language), "authority": None, "confidence": -1, "place": place}
+                for place, value in enumerate(values)]
+        for field, values in metadata.items()
+    }
+
+
+def timestamp():
+    return datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="milliseconds")
+
+
+def page(request, key, elements):
+    """HAL page of `elements` honouring ?page= and ?size=."""
+    number = int(request.query_params.get("page", 0))
+    size = int(request.query_params.get("size", 20))
+    total = len(elements)
+    totalPages = (total + size - 1) // size
+    links = {"self": {"href": str(request.url)}}
+    if number + 1 < totalPages:
+        links["next"] = {"href": str(request.url.include_query_params(page=number + 1, size=size))}
+    return {
+        "_embedded": {key: elements[number * size:(number + 1) * size]},
+        "_links": links,
+        "page": {"size": size, "totalElements": total, "totalPages": totalPages, "number": number},
+    }
+
+
+def embeddedPage(key, elements, size=EMBED_PAGE_SIZE):
+    """First page of an embedded listing, DSpace embeds at most `size` elements."""
+    return {
+        "_embedded": {key: elements[:size]},
+        "page": {"size": size, "totalElements": len(elements), "totalPages": (len(elements) + size - 1) // size, "number": 0},
+    }
+
+
+def createDSpaceMock(latency=0.0, tokenLifetime=3600):
+    app = fastapi.FastAPI()
+    state = {
+        "latency": latency,
+        "calls": collections.Counter(),
+        "failures": [],
+        "items": {},
+        "bundles": {},
+        "bitstreams": {},
+        "communities": {},
+        "collections": {},
+    }
+    app.state.dspace = state
+
+    def itemView(item):
+        view = {key: value for key, value in item.items() if key != "bundles"}
+        view["_links"] = {"bundles": {"href": f"/server/api/core/items/{item['uuid']}/bundles"}}
+        return view
+
+    def bitstreamView(bitstream):
+        return {key: value for key, value in bitstream.items() if key != "content"}
+
+    @app.middleware("http")
+    async def dspaceMiddleware(request: Request, call_next):
+        if request.url.path.startswith("/_mock"):
+            return await call_next(request)
+        state["calls"][f"{request.method} {request.url.path}"] += 1
+        if state["latency"]:
+            await asyncio.sleep(state["latency"])
+        for failure in state["failures"]:
+            if failure["count"] > 0 and request.url.path.startswith(failure["path"]):
+                failure["count"] -= 1
+                return JSONResponse({"message": "Injected failure"}, status_code=failure["status"])
+
+        xsrf = request.cookies.get(XSRF_COOKIE)
+        if request.method in ("POST", "PUT", "PATCH", "DELETE"):
+            if xsrf is None or request.headers.get("X-XSRF-TOKEN") != xsrf:
+                return JSONResponse({"message": "Invalid CSRF token"}, status_code=403)
+
+        public = request.url.path.startswith("/server/api/authn")
+        if not public:
+            token = request.headers.get("Authorization", "").split(" ", 1)[-1]
+            try:
+                jwt.decode(token, SECRET, algorithms=["HS256"])
+            except jwt.PyJWTError:
+                return JSONResponse({"message": "Authentication is required"}, status_code=401)
+
+        response = await call_next(request)
+        if xsrf is None:
+            xsrf = uuid.uuid4().hex
+            response.set_cookie(XSRF_COOKIE, xsrf)
+            response.headers[XSRF_HEADER] = xsrf
+        return response
+
+    @app.get("/_mock/stats")
+    async def stats():
+        return {"calls": dict(state["calls"]), "total": sum(state["calls"].values())}
+
+    @app.post("/_mock/reset")
+    async def reset(latency: float = None):
+        state["calls"].clear()
+        state["failures"].clear()
+        if latency is not None:
+            state["latency"] = latency
+        return {}
+
+    @app.post("/_mock/fail")
+    async def fail(status: int = 503, count: int = 1, path: str = "/server/api/core"):
+        state["failures"].append({"status": status, "count": count, "path": path})
+        return {}
+
+    # authn
+
+    @app.get("/server/api/authn/status")
+    async def authnStatus(request: Request):
+        token = request.headers.get("Authorization", "").split(" ", 1)[-1]
+        try:
+            jwt.decode(token, SECRET, algorithms=["HS256"])
+            authenticated = True
+        except jwt.PyJWTError:
+            authenticated = False
+        return hal({"authenticated": authenticated, "type": "status"})
+
+    @app.patch("/server/api/authn/status")
+    async def authnStatusPatch(request: Request):
+        return await authnStatus(request)
+
+    @app.post("/server/api/authn/login")
+    async def login(request: Request):
+        form = await request.form()
+        if USERS.get(form.get("user")) != form.get("password"):
+            return JSONResponse({"message": "Authentication failed"}, status_code=401)
+        token = jwt.encode({"eid": form.get("user"), "exp": int(time.time()) + tokenLifetime}, SECRET, algorithm="HS256")
+        # login starts a new CSRF token, as DSpace does
+        xsrf = uuid.uuid4().hex
+        response = Response(status_code=200, headers={"Authorization": f"Bearer {token}", XSRF_HEADER: xsrf})
+        response.set_cookie(XSRF_COOKIE, xsrf)
+        return response
+
+    # communities and collections
+
+    def listing(key):
+        elements = sorted(state[key].values(), key=lambda element: element["name"])
+        return elements, '"' + hashlib.md5(json.dumps(elements, sort_keys=True).encode()).hexdigest() + '"'
+
+    async def listingResponse(request, key):
+        elements, etag = listing(key)
+        if request.headers.get("If-None-Match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        return hal(page(request, key, elements), headers={"ETag": etag})
+
+    @app.get("/server/api/core/communities")
+    async def communities(request: Request):
+        return await listingResponse(request, "communities")
+
+    @app.post("/server/api/core/communities")
+    async def createCommunity(request: Request):
+        body = await request.json()
+        community = {"uuid": str(uuid.uuid4()), "name": body["name"], "metadata": body.get("metadata", {}), "type": "community"}
+        state["communities"][community["uuid"]] = community
+        return hal(community, status_code=201)
+
+    @app.get("/server/api/core/collections")
+    async def collectionsListing(request: Request):
+        return await listingResponse(request, "collections")
+
+    @app.post("/server/api/core/collections")
+    async def createCollection(request: Request, parent: str):
+        body = await request.json()
+        collection = {"uuid": str(uuid.uuid4()), "name": body["name"], "metadata": body.get("metadata", {}), "parent": parent, "type": "collection"}
+        state["collections"][collection["uuid"]] = collection
+        return hal(collection, status_code=201)
+
+    # items
+
+    def newItem(name, metadata, owningCollection=None, inArchive=True):
+        item = {
+            "uuid": str(uuid.uuid4()),
+            "name": name,
+            "handle": f"123456789/{len(state['items']) + 1}",
+            "metadata": metadataValues(metadata),
+            "inArchive": inArchive,
+            "discoverable": True,
+            "withdrawn": False,
+            "lastModified": timestamp(),
+            "owningCollection": owningCollection,
+            "type": "item",
+            "bundles": [],
+        }
+        state["items"][item["uuid"]] = item
+        return item
+
+    @app.post("/server/api/core/items")
+    async def createItem(request: Request, owningCollection: str):
+        body = await request.json()
+        return hal(itemView(newItem(body.get("name", ""), body.get("metadata", {}), owningCollection)), status_code=201)
+
+    @app.post("/server/api/submission/workspaceitems")
+    async def createWorkspaceItem(request: Request):
+        item = newItem("", {}, inArchive=False)
+        return hal({"id": len(state["items"]), "type": "workspaceitem", "_embedded": {"item": itemView(item)}}, status_code=201)
+
+    def getItemOr404(id):
+        item = state["items"].get(id)
+        if item is None:
+            raise fastapi.HTTPException(status_code=404, detail="Item not found")
+        return item
+
+    @app.get("/server/api/core/items/{id}")
+    async def getItem(id: str, request: Request):
+        item = getItemOr404(id)
+        view = itemView(item)
+        embeds = request.query_params.getlist("embed")
+        if any(embed.split("/")[0] == "bundles" for embed in embeds):
+            bundles = []
+            for bundleId in item["bundles"]:
+                bundle = {key: value for key, value in state["bundles"][bundleId].items() if key != "bitstreams"}
+                if "bundles/bitstreams" in embeds:
+                    bitstreams = [bitstreamView(state["bitstreams"][bitstreamId]) for bitstreamId in state["bundles"][bundleId]["bitstreams"]]
+                    bundle["_embedded"] = {"bitstreams": embeddedPage("bitstreams", bitstreams)}
+                bundles.append(bundle)
+            view["_embedded"] = {"bundles": embeddedPage("bundles", bundles)}
+        return hal(view)
+
+    @app.patch("/server/api/core/items/{id}")
+    async def patchItem(id: str, request: Request):
+        item = getItemOr404(id)
+        updated = copy.deepcopy(item)
+        for operation in await request.json():
+            parts = operation["path"].strip("/").split("/")
+            if parts[0] in ("withdrawn", "discoverable"):
+                value = operation["value"]
+                updated[parts[0]] = value if isinstance(value, bool) else f"{value}".lower() == "true"
+                continue
+            if parts[0] != "metadata" or len(parts) < 2:
+                return JSONResponse({"message": f"Unsupported path {operation['path']}"}, status_code=422)
+            field = parts[1]
+            values = updated["metadata"].setdefault(field, [])
+            index = parts[2] if len(parts) > 2 else None
+            if operation["op"] == "add":
+                value = operation["value"]
+                if index is None:
+                    values[:] = value if isinstance(value, list) else [value]
+                elif index == "-":
+                    values.append(value)
+                else:
+                    values.insert(int(index), value)
+            elif operation["op"] == "replace":
+                value = operation["value"]
+                values[int(index or 0)] = value if isinstance(value, dict) else {"value": value}
+            elif operation["op"] == "remove":
+                if index is None:
+                    del updated["metadata"][field]
+                else:
+                    del values[int(index)]
+            if field in updated["metadata"]:
+                updated["metadata"][field] = metadataValues({field: updated["metadata"][field]})[field]
+                if not updated["metadata"][field]:
+                    del updated["metadata"][field]
+        updated["lastModified"] = timestamp()
+        state["items"][id] = updated
+        return hal(itemView(updated))
+
+    @app.get("/server/api/discover/search/objects")
+    async def searchObjects(request: Request, query: str = "*:*", dsoType: str = None, sort: str = None):
+        # supports what the mirror sync asks for: *:* or lastModified:[<date> TO *]
+        items = list(state["items"].values())
+        if query.startswith("lastModified:["):
+            since = query[len("lastModified:["):].split(" TO ")[0].replace("Z", "+00:00")
+            since = datetime.datetime.fromisoformat(since)
+            items = [item for item in items if datetime.datetime.fromisoformat(item["lastModified"]) >= since]
+        if sort and sort.startswith("lastModified"):
+            items.sort(key=lambda item: item["lastModified"], reverse=sort.endswith("DESC"))
+        objects = [{"_embedded": {"indexableObject": itemView(item)}, "type": "discover"} for item in items]
+        return hal({"_embedded": {"searchResult": page(request, "objects", objects)}, "type": "discover"})
+
+    # bundles and bitstreams
+
+    @app.post("/server/api/core/items/{id}/bundles")
+    async def createBundle(id: str, request: Request):
+        item = getItemOr404(id)
+        body = await request.json()
+        bundle = {"uuid": str(uuid.uuid4()), "name": body.get("name", "ORIGINAL"), "type": "bundle", "item": id, "bitstreams": []}
+        state["bundles"][bundle["uuid"]] = bundle
+        item["bundles"].append(bundle["uuid"])
+        item["lastModified"] = timestamp()
+        return hal({key: value for key, value in bundle.items() if key != "bitstreams"}, status_code=201)
+
+    @app.get("/server/api/core/items/{id}/bundles")
+    async def itemBundles(id: str, request: Request):
+        item = getItemOr404(id)
+        bundles = [
+            {key: value for key, value in state["bundles"][bundleId].items() if key != "bitstreams"}
+            for bundleId in item["bundles"]
+        ]
+        return hal(page(request, "bundles", bundles))
+
+    @app.post("/server/api/core/bundles/{id}/bitstreams")
+    async def uploadBitstream(id: str, request: Request):
+        bundle = state["bundles"].get(id)
+        if bundle is None:
+            return JSONResponse({"message": "Bundle not found"}, status_code=404)
+        form = await request.form()
+        file = form["file"]
+        content = await file.read()
+        properties = json.loads(form.get("properties") or "{}")
+        bitstream = {
+            "uuid": str(uuid.uuid4()),
+            "name": properties.get("name") or file.filename,
+            "sizeBytes": len(content),
+            "checkSum": {"checkSumAlgorithm": "MD5", "value": hashlib.md5(content).hexdigest()},
+            "metadata": metadataValues(properties.get("metadata", {})),
+            "bundleName": bundle["name"],
+            "mimeType": file.content_type,
+            "type": "bitstream",
+            "content": content,
+        }
+        state["bitstreams"][bitstream["uuid"]] = bitstream
+        bundle["bitstreams"].append(bitstream["uuid"])
+        state["items"][bundle["item"]]["lastModified"] = timestamp()
+        return hal(bitstreamView(bitstream), status_code=201)
+
+    @app.get("/server/api/core/bundles/{id}/bitstreams")
+    async def bundleBitstreams(id: str, request: Request):
+        bundle = state["bundles"].get(id)
+        if bundle is None:
+            return JSONResponse({"message": "Bundle not found"}, status_code=404)
+        bitstreams = [bitstreamView(state["bitstreams"][bitstreamId]) for bitstreamId in bundle["bitstreams"]]
+        return hal(page(request, "bitstreams", bitstreams))
+
+    @app.get("/server/api/core/bitstreams/{id}")
+    async def getBitstream(id: str):
+        bitstream = state["bitstreams"].get(id)
+        if bitstream is None:
+            return JSONResponse({"message": "Bitstream not found"}, status_code=404)
+        return hal(bitstreamView(bitstream))
+
+    @app.get("/server/api/core/bitstreams/{id}/content")
+    async def bitstreamContent(id: str, request: Request):
+        bitstream = state["bitstreams"].get(id)
+        if bitstream is None:
+            return JSONResponse({"message": "Bitstream not found"}, status_code=404)
+        content = bitstream["content"]
+        etag = f'"{bitstream["checkSum"]["value"]}"'
+        headers = {"ETag": etag, "Accept-Ranges": "bytes", "Content-Disposition": f'inline;filename="{bitstream["name"]}"'}
+        if request.headers.get("If-None-Match") == etag:
+            return Response(status_code=304, headers=headers)
+        byteRange = request.headers.get("Range")
+        if byteRange and byteRange.startswith("bytes="):
+            start, _, end = byteRange[len("bytes="):].partition("-")
+            start = int(start)
+            end = min(int(end), len(content) - 1) if end else len(content) - 1
+            if start >= len(content):
+                return Response(status_code=416, headers={"Content-Range": f"bytes */{len(content)}"})
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(content)}"
+            return Response(content[start:end + 1], status_code=206, headers=headers, media_type=bitstream["mimeType"])
+        return Response(content, headers=headers, media_type=bitstream["mimeType"])
+
+    return app
+
+
+app = createDSpaceMock(latency=float(os.environ.get("DSPACE_MOCK_LATENCY", "0")))
+
+
+def runDSpaceMock(port, latency=0.0):
+    uvicorn.run(createDSpaceMock(latency=latency), port=port, log_level="warning")
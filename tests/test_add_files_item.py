@@ -0,0 +1,51 @@
+import io
+import threading
+import pytest
+
+from DspaceAPI.AddFilesItem import addFilesItem, UploadProgress
+from DspaceAPI.AddBitstreamsItem import iterContent
+from DspaceAPI.ContentIndex import ContentIndex
+from DspaceAPI.CreateItem import createItem
+from DspaceAPI.GetBitstreamItem import getItemBitstreams
+
+
+@pytest.mark.asyncio
+async def test_add_files_item_in_parallel(DSpaceClient, tmp_path):
+    item = (await createItem("collection", "with attachments"))["response"]
+    path = tmp_path / "attachment.bin"
+    path.write_bytes(b"a" * 50_000)
+    files = [
+        {"source": b"%PDF main" * 1000, "filename": "main.pdf"},
+        {"source": path, "filename": "attachment.bin", "contentType": "application/octet-stream"},
+        {"source": b"thumbnail", "filename": "main.jpg", "contentType": "image/jpeg", "bundleName": "THUMBNAIL"},
+    ]
+    progress = UploadProgress(files)
+    events = []
+    results = await addFilesItem(
+        item["uuid"], files, maxBytes=60_000, progress=progress, onProgress=events.append,
+        chunkSize=4096, contentIndex=ContentIndex(tmp_path / "index.jsonl")
+    )
+    assert [result["msg"] for result in results] == [201, 201, 201], results
+    snapshot = progress.snapshot()
+    assert snapshot["finished"] and snapshot["sent"] == 9000 + 50_000 + 9
+    assert {event["state"] for event in events} == {"uploading", "done"}
+
+    listed = (await getItemBitstreams(item["uuid"]))["response"]
+    assert sorted((bitstream["bundleName"], bitstream["name"]) for bitstream in listed) == [
+        ("ORIGINAL", "attachment.bin"), ("ORIGINAL", "main.pdf"), ("THUMBNAIL", "main.jpg")
+    ]
+
+
+@pytest.mark.asyncio
+async def test_iter_content_reads_files_off_the_loop():
+    loop = threading.get_ident()
+    threads = []
+
+    class File(io.BytesIO):
+        def read(self, size=-1):
+            threads.append(threading.get_ident())
+            return super().read(size)
+
+    chunks = [chunk async for chunk in iterContent(File(b"x" * 10), chunkSize=4)]
+    assert chunks == [b"xxxx", b"xxxx", b"xx"]
+    assert threads and loop not in threads
@@ -0,0 +1,95 @@
+import asyncio
+import uuid
+import pytest
+
+from sqlalchemy import select, func
+
+from DspaceAPI.__main__ import listFiles, importedDocument
+from src.DBDefinitions import DocumentModel
+from src.DocumentPipeline import BatchedInsert, Checkpoint, createDocumentWithFile
+from .shared import prepare_in_memory_sqllite
+
+
+@pytest.mark.asyncio
+async def test_batched_insert_groups_rows():
+    asyncSessionMaker = await prepare_in_memory_sqllite()
+    # the in-memory database has one connection, the second batch must not start before the first one is committed
+    batched = BatchedInsert(asyncSessionMaker, size=4, delay=0.5)
+    ids = [uuid.uuid4() for _ in range(6)]
+    # the repeated id is already stored by the first batch and skipped by the second one
+    await asyncio.gather(*(batched.store(id=id, name=f"document {index}", dspace_id=uuid.uuid4(), author_id=None, group_id=None) for index, id in enumerate(ids)))
+    await batched.store(id=ids[0], name="again", dspace_id=uuid.uuid4(), author_id=None, group_id=None)
+    await batched.close()
+    async with asyncSessionMaker() as session:
+        count = await session.execute(select(func.count()).select_from(DocumentModel))
+        assert count.scalar() == 6
+        stored = await session.get(DocumentModel, ids[0])
+        assert stored.name == "document 0"
+
+
+def test_import_listing(tmp_path):
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "a.pdf").write_bytes(b"a")
+    (tmp_path / "sub" / "b.txt").write_bytes(b"b")
+    (tmp_path / ".dspace-import.jsonl").write_text("")
+    assert listFiles(tmp_path) == ["a.pdf", "sub/b.txt"]
+    assert listFiles(tmp_path, recursive=False) == ["a.pdf"]
+
+    first = importedDocument(tmp_path, "a.pdf", "collection", None, None, None, None)
+    again = importedDocument(tmp_path, "a.pdf", "collection", None, None, None, None)
+    assert first["id"] == again["id"] and first["contentType"] == "application/pdf"
+    assert importedDocument(tmp_path, "a.pdf", "other", None, None, None, None)["id"] != first["id"]
+
+
+@pytest.mark.asyncio
+async def test_failed_step_cancels_the_other():
+    from DspaceAPI.Concurrency import gatherOrCancel
+    cancelled = asyncio.Event()
+
+    async def upload():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    async def writeRow():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("row not written")
+
+    with pytest.raises(RuntimeError):
+        await gatherOrCancel(upload(), writeRow())
+    assert cancelled.is_set()
+    assert await gatherOrCancel(asyncio.sleep(0, "a"), asyncio.sleep(0, "b")) == ["a", "b"]
+
+
+@pytest.mark.asyncio
+async def test_failed_upload_leaves_no_row(DSpaceClient, tmp_path):
+    import aiohttp
+    asyncSessionMaker = await prepare_in_memory_sqllite()
+
+    async def failUploads():
+        async with aiohttp.ClientSession() as session:
+            await session.post(f"{DSpaceClient.baseUrl}/_mock/fail", params={"status": 500, "path": "/server/api/core/bundles"})
+
+    async def rows():
+        async with asyncSessionMaker() as session:
+            return (await session.execute(select(func.count()).select_from(DocumentModel))).scalar()
+
+    await failUploads()
+    result = await createDocumentWithFile(asyncSessionMaker, "collection", b"%PDF", "a.pdf", "failed", shareContent=False)
+    assert result["stage"] == "bitstream" and await rows() == 0
+
+    # with a checkpoint file the row is written meanwhile and the resumed run completes the document
+    stored = []
+
+    async def store(**values):
+        # cancelling a write of the in-memory database would drop the database, rows are kept here
+        stored.append(values["id"])
+
+    checkpoint = Checkpoint(tmp_path / "checkpoint.jsonl")
+    await failUploads()
+    result = await createDocumentWithFile(asyncSessionMaker, "collection", b"%PDF", "a.pdf", "resumed", shareContent=False, checkpoint=checkpoint, store=store)
+    assert result["stage"] == "bitstream" and len(stored) == 1
+    result = await createDocumentWithFile(asyncSessionMaker, "collection", b"%PDF", "a.pdf", "resumed", shareContent=False, checkpoint=checkpoint, store=store, id=result["id"])
+    assert result["msg"] == 201 and len(stored) == 1 and "bitstream_id" in result["response"]
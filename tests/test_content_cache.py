@@ -0,0 +1,84 @@
+import os
+import time
+import pytest
+
+from DspaceAPI.ContentCache import ContentCache, bitstreamChecksum
+
+
+async def store(cache, bitstreamId, checksum, content):
+    writer = await cache.writer(bitstreamId, checksum)
+    await writer.write(content)
+    return await writer.commit()
+
+
+@pytest.mark.asyncio
+async def test_cache_hit_is_most_recently_used(tmp_path):
+    cache = ContentCache(tmp_path, maxBytes=100)
+    await store(cache, "a", "1", b"a" * 40)
+    await store(cache, "b", "1", b"b" * 40)
+    assert await cache.writer("a", "1") is None
+
+    path = await cache.acquire("a", "1")
+    assert open(path, "rb").read() == b"a" * 40
+    await cache.release("a", "1")
+
+    # "b" is now the least recently used one and goes first
+    await store(cache, "c", "1", b"c" * 40)
+    assert await cache.acquire("b", "1") is None
+    assert await cache.acquire("a", "1") is not None
+
+
+@pytest.mark.asyncio
+async def test_cache_evicts_at_max_bytes_except_pinned(tmp_path):
+    cache = ContentCache(tmp_path, maxBytes=100)
+    await store(cache, "a", "1", b"a" * 60)
+    pinned = await cache.acquire("a", "1")
+    # "a" is being served, it cannot go, so the new entry does not fit
+    assert await store(cache, "b", "1", b"b" * 60) is None
+    assert os.path.exists(pinned) and cache.totalBytes == 60
+    await cache.release("a", "1")
+    assert await store(cache, "b", "1", b"b" * 60) is not None
+    assert not os.path.exists(pinned) and cache.totalBytes == 60
+    assert sorted(os.listdir(tmp_path)) == [".lock", "b-1"]
+
+    # another process does not use the directory while this one has it
+    other = ContentCache(tmp_path, maxBytes=100)
+    assert await other.acquire("b", "1") is None and await other.writer("c", "1") is None
+    assert not other.enabled
+
+    # a new process finds the files and their sizes again
+    cache.close()
+    restored = ContentCache(tmp_path, maxBytes=100)
+    assert await restored.acquire("b", "1") is not None and restored.totalBytes == 60
+
+
+@pytest.mark.asyncio
+async def test_cache_miss_fills_and_checksum_change_invalidates(DSpaceClient, ItemWithFile, tmp_path):
+    _, _, bitstream = await ItemWithFile("cached", b"cached content" * 100, "cached.pdf")
+    checksum = bitstreamChecksum(bitstream)
+    cache = ContentCache(tmp_path, maxBytes=10_000)
+
+    assert await cache.acquire(bitstream["uuid"], checksum) is None
+    path = await cache.fill(bitstream["uuid"], checksum)
+    assert open(path, "rb").read() == b"cached content" * 100
+    assert await cache.acquire(bitstream["uuid"], checksum) == path
+
+    # changed content has another checksum, the old file is no hit for it
+    assert await cache.acquire(bitstream["uuid"], "changed") is None
+    assert not any(name.endswith(".part") for name in os.listdir(tmp_path))
+
+
+@pytest.mark.asyncio
+async def test_cache_keeps_unfinished_files_of_others(tmp_path):
+    stale = tmp_path / "a-1.4242-0000.part"
+    fresh = tmp_path / "b-1.4343-0000.part"
+    stale.write_bytes(b"left by a crashed process")
+    fresh.write_bytes(b"being written")
+    os.utime(stale, (time.time() - 7200, time.time() - 7200))
+
+    cache = ContentCache(tmp_path, maxBytes=100)
+    writer = await cache.writer("b", "1")
+    await writer.write(b"b" * 10)
+    assert writer.partial != str(fresh) and os.path.exists(writer.partial)
+    assert await writer.commit() is not None
+    assert not stale.exists() and fresh.exists()
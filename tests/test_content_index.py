@@ -0,0 +1,108 @@
+import uuid
+import pytest
+
+from DspaceAPI.ContentIndex import ContentIndex, uploadBitstreamOnce
+from DspaceAPI.GetBitstreamItem import getContentBitstream
+from src.DocumentPipeline import createDocumentWithFile
+from src.DBDefinitions import DocumentModel
+from .shared import prepare_in_memory_sqllite
+
+
+async def newBundle(ItemWithFile):
+    _, bundle, _ = await ItemWithFile("with template")
+    return bundle["uuid"]
+
+
+@pytest.mark.asyncio
+async def test_upload_once_reuses_bundle_content(DSpaceClient, ItemWithFile, tmp_path):
+    index = ContentIndex(tmp_path / "index.jsonl")
+    content = b"signed template " * 1000
+    bundleId = await newBundle(ItemWithFile)
+
+    first = await uploadBitstreamOnce(bundleId, content, "template.pdf", index=index)
+    assert first["msg"] == 201 and first["reused"] is False
+    second = await uploadBitstreamOnce(bundleId, content, "template.pdf", index=index)
+    assert second["reused"] is True and second["saved"] == len(content)
+    assert second["response"]["uuid"] == first["response"]["uuid"]
+
+    # another bundle gets its own copy unless sharing is asked for
+    otherBundleId = await newBundle(ItemWithFile)
+    third = await uploadBitstreamOnce(otherBundleId, content, "template.pdf", index=index)
+    assert third["msg"] == 201 and third["reused"] is False
+
+    # the index is kept in the file
+    restored = ContentIndex(tmp_path / "index.jsonl")
+    assert set(restored.get(first["checksum"])) == {bundleId, otherBundleId}
+
+
+@pytest.mark.asyncio
+async def test_pipeline_shares_stored_content(DSpaceClient, tmp_path):
+    asyncSessionMaker = await prepare_in_memory_sqllite()
+    index = ContentIndex(tmp_path / "index.jsonl")
+    content = b"attachment " * 1000
+    first = await createDocumentWithFile(asyncSessionMaker, "collection", content, "a.pdf", "first", contentIndex=index)
+    second = await createDocumentWithFile(asyncSessionMaker, "collection", content, "a.pdf", "second", contentIndex=index)
+    assert first["msg"] == 201 and first["response"]["saved_bytes"] == 0
+    assert second["msg"] == 201 and second["response"]["saved_bytes"] == len(content)
+    assert "bundle_id" not in second["response"]
+
+    async with asyncSessionMaker() as session:
+        document = await session.get(DocumentModel, uuid.UUID(second["id"]))
+    assert str(document.bitstream_id) == first["response"]["bitstream_id"]
+    bitstream = await getContentBitstream(document.dspace_id, document.bitstream_id)
+    assert bitstream["uuid"] == first["response"]["bitstream_id"]
+
+
+@pytest.mark.asyncio
+async def test_index_keeps_entry_on_transient_failure(DSpaceClient, ItemWithFile, tmp_path):
+    import aiohttp
+    index = ContentIndex(tmp_path / "index.jsonl")
+    bundleId = await newBundle(ItemWithFile)
+    stored = await uploadBitstreamOnce(bundleId, b"kept", "kept.pdf", index=index)
+    bitstreamId = stored["response"]["uuid"]
+
+    async with aiohttp.ClientSession() as session:
+        await session.post(f"{DSpaceClient.baseUrl}/_mock/fail", params={"status": 401, "count": 2, "path": f"/server/api/core/bitstreams/{bitstreamId}"})
+    assert await index.find(stored["checksum"], bundleId=bundleId) is None
+    assert bundleId in index.get(stored["checksum"])
+    assert (await index.find(stored["checksum"], bundleId=bundleId))["uuid"] == bitstreamId
+
+
+@pytest.mark.asyncio
+async def test_index_drops_deleted_bitstreams_and_compacts(DSpaceClient, ItemWithFile, tmp_path):
+    filename = tmp_path / "index.jsonl"
+    index = ContentIndex(filename)
+    bundleId = await newBundle(ItemWithFile)
+    stored = await uploadBitstreamOnce(bundleId, b"live", "live.pdf", index=index)
+    # a bitstream deleted in DSpace meanwhile, and an entry replaced by a newer one
+    await index.remember("gone", bundleId, uuid.uuid4(), 4)
+    await index.remember(stored["checksum"], "other", uuid.uuid4(), 4)
+    await index.remember(stored["checksum"], "other", stored["response"]["uuid"], 4)
+    assert await index.find("gone", bundleId=bundleId) is None
+    assert index.get("gone") == {}
+    assert len(filename.read_text().splitlines()) == 5
+
+    restored = ContentIndex(filename)
+    assert set(restored.get(stored["checksum"])) == {bundleId, "other"} and restored.get("gone") == {}
+    # only the live entries are left in the file
+    assert len(filename.read_text().splitlines()) == 2
+    assert ContentIndex(filename).entries == restored.entries
+
+
+@pytest.mark.asyncio
+async def test_start_engine_adds_bitstream_column(tmp_path):
+    import sqlalchemy
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from src.DBDefinitions import BaseModel, startEngine
+    connectionString = f"sqlite+aiosqlite:///{tmp_path / 'old.sqlite'}"
+    engine = create_async_engine(connectionString)
+    async with engine.begin() as conn:
+        await conn.run_sync(BaseModel.metadata.create_all)
+        await conn.execute(sqlalchemy.text("ALTER TABLE documents DROP COLUMN bitstream_id"))
+    await engine.dispose()
+
+    # a database of the previous version gets the column, the next start changes nothing
+    for _ in range(2):
+        asyncSessionMaker = await startEngine(connectionString)
+        async with asyncSessionMaker() as session:
+            await session.execute(sqlalchemy.select(DocumentModel.bitstream_id))
@@ -0,0 +1,85 @@
+import types
+import uuid
+
+import httpx
+import pytest
+import pytest_asyncio
+
+import main
+from DspaceAPI.ContentCache import ContentCache
+from .shared import authenticatedApp
+
+CONTENT = b"%PDF-1.4 document content " * 100
+
+
+@pytest_asyncio.fixture
+async def ContentApp(DSpaceClient, ItemWithFile, monkeypatch, tmp_path):
+    item, _, bitstream = await ItemWithFile("served", CONTENT, "served.pdf")
+    documentId = uuid.uuid4()
+
+    async def loadDocument(id):
+        if id != documentId:
+            return None
+        return types.SimpleNamespace(dspace_id=uuid.UUID(item["uuid"]), bitstream_id=None)
+
+    monkeypatch.setattr(main, "loadDocument", loadDocument)
+    monkeypatch.setattr(main, "contentCache", ContentCache(tmp_path, maxBytes=0))
+    transport = httpx.ASGITransport(app=authenticatedApp(main.app))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client, documentId, bitstream
+
+
+@pytest.mark.asyncio
+async def test_content_proxied_whole_and_range(ContentApp):
+    client, documentId, bitstream = ContentApp
+    response = await client.get(f"/documents/{documentId}/content")
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers["ETag"] == f'"{bitstream["checkSum"]["value"]}"'
+
+    response = await client.get(f"/documents/{documentId}/content", headers={"Range": "bytes=10-19"})
+    assert response.status_code == 206
+    assert response.content == CONTENT[10:20]
+    assert response.headers["Content-Range"] == f"bytes 10-19/{len(CONTENT)}"
+
+
+@pytest.mark.asyncio
+async def test_content_not_modified_and_unknown(ContentApp, monkeypatch, tmp_path):
+    client, documentId, bitstream = ContentApp
+    etag = f'"{bitstream["checkSum"]["value"]}"'
+    monkeypatch.setattr(main, "contentCache", ContentCache(tmp_path, maxBytes=1_000_000))
+
+    response = await client.get(f"/documents/{documentId}/content", headers={"If-None-Match": f'"other", W/{etag}'})
+    assert response.status_code == 304
+    assert main.etagMatches("*", etag) and not main.etagMatches('"other"', etag)
+
+    response = await client.get(f"/documents/{uuid.uuid4()}/content")
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_content_miss_fills_cache(ContentApp, monkeypatch, tmp_path):
+    client, documentId, bitstream = ContentApp
+    cache = ContentCache(tmp_path, maxBytes=1_000_000)
+    monkeypatch.setattr(main, "contentCache", cache)
+
+    response = await client.get(f"/documents/{documentId}/content")
+    assert response.status_code == 200 and response.content == CONTENT
+    path = await cache.acquire(bitstream["uuid"], bitstream["checkSum"]["value"])
+    assert path is not None
+    await cache.release(bitstream["uuid"], bitstream["checkSum"]["value"])
+
+    response = await client.get(f"/documents/{documentId}/content", headers={"Range": "bytes=0-8"})
+    assert response.status_code == 206 and response.content == CONTENT[:9]
+    # the pin of the served entry is released again
+    assert not cache._pins
+
+
+@pytest.mark.asyncio
+async def test_content_requires_authentication(ContentApp):
+    _, documentId, _ = ContentApp
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as anonymous:
+        response = await anonymous.get(f"/documents/{documentId}/content")
+    assert response.status_code == 401
+    assert response.content != CONTENT
@@ -0,0 +1,116 @@
+import datetime
+import uuid
+import zlib
+import pytest
+
+from sqlalchemy import update
+
+from src.DBDefinitions import DocumentModel, DocumentTextModel, DSpaceItemModel
+from src.DocumentText import TextExtractor, searchDocuments
+from src.TextExtraction import _pdfTextFallback
+from .shared import prepare_in_memory_sqllite
+
+
+def test_pdf_fallback_reads_deflated_text():
+    stream = zlib.compress(b"BT /F1 12 Tf (Hello \\(PDF\\)) Tj [(Wor) -20 (ld)] TJ ET")
+    data = b"%PDF-1.4\n1 0 obj << /Filter /FlateDecode >> stream\n" + stream + b"\nendstream endobj"
+    assert _pdfTextFallback(data) == "Hello (PDF) World"
+
+
+async def storeWithFile(ItemWithFile, asyncSessionMaker, name, content):
+    item, _, _ = await ItemWithFile(name, content, f"{name}.txt", contentType="text/plain")
+    id = uuid.uuid4()
+    async with asyncSessionMaker() as session:
+        session.add(DocumentModel(id=id, dspace_id=uuid.UUID(item["uuid"]), name=name, author_id=None, group_id=None))
+        await session.commit()
+    return id
+
+
+@pytest.mark.asyncio
+async def test_text_extractor_indexes_documents(DSpaceClient, ItemWithFile):
+    asyncSessionMaker = await prepare_in_memory_sqllite()
+    report = await storeWithFile(ItemWithFile, asyncSessionMaker, "report", "Annual report about the network budget".encode())
+    minutes = await storeWithFile(ItemWithFile, asyncSessionMaker, "minutes", "Minutes of the meeting about the budget".encode())
+    empty = await storeWithFile(ItemWithFile, asyncSessionMaker, "empty", None)
+
+    extractor = TextExtractor(asyncSessionMaker, processes=1)
+    try:
+        assert await extractor.drain() == 3
+    finally:
+        await extractor.stop()
+
+    found = await searchDocuments(asyncSessionMaker, "budget")
+    assert {document.id for document in found} == {report, minutes}
+    found = await searchDocuments(asyncSessionMaker, "network budget")
+    assert [document.id for document in found] == [report]
+
+    async with asyncSessionMaker() as session:
+        row = await session.get(DocumentTextModel, empty)
+    # the file may still be uploading, tried again later without using up an attempt
+    assert row.extracted is None and row.attempts == 0 and row.available_at is not None
+
+
+@pytest.mark.asyncio
+async def test_text_extractor_claims_are_exclusive():
+    asyncSessionMaker = await prepare_in_memory_sqllite()
+    async with asyncSessionMaker() as session:
+        session.add_all([
+            DocumentModel(id=uuid.uuid4(), dspace_id=uuid.uuid4(), name=f"document {index}", author_id=None, group_id=None)
+            for index in range(5)
+        ])
+        await session.commit()
+
+    first = TextExtractor(asyncSessionMaker, batch=3)
+    second = TextExtractor(asyncSessionMaker, batch=3)
+    firstClaim = {id for id, _, _ in await first.claim()}
+    secondClaim = {id for id, _, _ in await second.claim()}
+    assert len(firstClaim) == 3 and len(secondClaim) == 2
+    assert not firstClaim & secondClaim
+    # everything is leased now
+    assert await first.claim() == []
+
+    # leases of a crashed worker expire and are taken over
+    async with asyncSessionMaker() as session:
+        await session.execute(update(DocumentTextModel).values(claimed_until=datetime.datetime.now()))
+        await session.commit()
+    assert len(await TextExtractor(asyncSessionMaker, batch=10).claim()) == 5
+
+
+@pytest.mark.asyncio
+async def test_text_extractor_requeues_changed_documents(DSpaceClient, ItemWithFile):
+    asyncSessionMaker = await prepare_in_memory_sqllite()
+    id = await storeWithFile(ItemWithFile, asyncSessionMaker, "report", "First version about the budget".encode())
+    extractor = TextExtractor(asyncSessionMaker, processes=1)
+    try:
+        assert await extractor.drain() == 1
+        async with asyncSessionMaker() as session:
+            first = await session.get(DocumentTextModel, id)
+            document = await session.get(DocumentModel, id)
+            # the mirror knows the same file, nothing to do
+            session.add(DSpaceItemModel(id=document.dspace_id, original_bitstream_id=first.bitstream_id, original_checksum=first.checksum))
+            await session.execute(update(DocumentTextModel).values(attempts=3))
+            await session.commit()
+        assert await extractor.drain() == 0
+
+        # the content of the item changed in DSpace
+        async with asyncSessionMaker() as session:
+            await session.execute(update(DSpaceItemModel).values(original_checksum="changed"))
+            await session.commit()
+        assert len(await extractor.claim()) == 1
+        async with asyncSessionMaker() as session:
+            row = await session.get(DocumentTextModel, id)
+        assert row.extracted is None and row.attempts == 0 and "budget" in row.content
+
+        # the document is pointed to another bitstream
+        _, _, bitstream = await ItemWithFile("shared", "Second version about the network".encode(), "second.txt", contentType="text/plain")
+        async with asyncSessionMaker() as session:
+            await session.execute(update(DocumentTextModel).values(claimed_until=None, bitstream_id=first.bitstream_id, checksum=first.checksum))
+            await session.execute(update(DocumentModel).values(bitstream_id=uuid.UUID(bitstream["uuid"])))
+            await session.commit()
+        assert await extractor.drain() == 1
+    finally:
+        await extractor.stop()
+
+    async with asyncSessionMaker() as session:
+        row = await session.get(DocumentTextModel, id)
+    assert row.bitstream_id == uuid.UUID(bitstream["uuid"]) and "network" in row.content
@@ -0,0 +1,369 @@
+import aiohttp
+import pytest
+
+from DspaceAPI.CreateItem import createItem, createItems
+from DspaceAPI.AddBundleItem import addBundleItem
+from DspaceAPI.AddBitstreamsItem import uploadBitstream
+from DspaceAPI.GetBitstreamItem import getItemBitstream
+from DspaceAPI.GetContentItem import streamItemContent
+from DspaceAPI.GetCommunities import getCommunities, iterateCommunities
+from DspaceAPI.CreateCommunity import createCommunity
+from DspaceAPI.UpdateItemMetadata import updateItemMetadata, desiredState
+from DspaceAPI.Cache import invalidateListings
+
+
+async def mockCalls(client):
+    async with aiohttp.ClientSession() as session:
+        async with session.post(f"{client.baseUrl}/_mock/reset") as response:
+            assert response.status == 200
+    async def stats():
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f"{client.baseUrl}/_mock/stats") as response:
+                return (await response.json())["calls"]
+    return stats
+
+
+@pytest.mark.asyncio
+async def test_dspace_login_once(DSpaceClient):
+    stats = await mockCalls(DSpaceClient)
+    collectionId = "8f2a5d3e-0000-0000-0000-000000000000"
+    for index in range(3):
+        result = await createItem(collectionId, f"item {index}")
+        assert result["msg"] == 201, result
+    calls = await stats()
+    assert calls["POST /server/api/authn/login"] == 1
+    assert calls["POST /server/api/core/items"] == 3
+
+
+@pytest.mark.asyncio
+async def test_dspace_upload_download(DSpaceClient):
+    content = b"%PDF-1.4 " + bytes(range(256)) * 1000
+    item = (await createItem("collection", "with file"))["response"]
+    bundle = (await addBundleItem(item["uuid"]))["response"]
+    uploaded = await uploadBitstream(bundle["uuid"], content, "file.pdf", chunkSize=4096)
+    assert uploaded["msg"] == 201, uploaded
+    assert uploaded["response"]["sizeBytes"] == len(content)
+
+    bitstream = await getItemBitstream(item["uuid"])
+    assert bitstream["uuid"] == uploaded["response"]["uuid"]
+
+    chunks = []
+    result = await streamItemContent(bitstream["uuid"], chunks.append, chunkSize=4096)
+    assert result["msg"] == 200
+    assert b"".join(chunks) == content
+
+    chunks = []
+    result = await streamItemContent(bitstream["uuid"], chunks.append, byteRange=(10, 19))
+    assert result["msg"] == 206
+    assert b"".join(chunks) == content[10:20]
+
+
+@pytest.mark.asyncio
+async def test_dspace_download_leaves_no_partial_file(DSpaceClient, tmp_path):
+    import uuid
+    from DspaceAPI.GetContentItem import downloadItemContent
+    item = (await createItem("collection", "downloaded"))["response"]
+    bundle = (await addBundleItem(item["uuid"]))["response"]
+    bitstream = (await uploadBitstream(bundle["uuid"], b"downloaded content", "file.pdf"))["response"]
+
+    (tmp_path / "file.pdf").write_bytes(b"kept")
+    result = await downloadItemContent(bitstream["uuid"], "file.pdf", filePath=str(tmp_path))
+    assert result["msg"] == 200 and result["response"]["file"].endswith("file(1).pdf")
+    assert (tmp_path / "file(1).pdf").read_bytes() == b"downloaded content"
+
+    result = await downloadItemContent(str(uuid.uuid4()), "missing.pdf", filePath=str(tmp_path))
+    assert result["msg"] == 404
+
+    def failing(received, total):
+        raise RuntimeError("disk full")
+
+    with pytest.raises(RuntimeError):
+        await downloadItemContent(bitstream["uuid"], "failed.pdf", filePath=str(tmp_path), onProgress=failing)
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["file(1).pdf", "file.pdf"]
+
+
+@pytest.mark.asyncio
+async def test_dspace_metadata_single_patch(DSpaceClient):
+    item = (await createItem("collection", "old title", description="old"))["response"]
+    stats = await mockCalls(DSpaceClient)
+    result = await updateItemMetadata(item["uuid"], desiredState(title="new title", description="", withdrawn=True))
+    assert result["msg"] == 200, result
+    assert result["response"]["metadata"]["dc.title"][0]["value"] == "new title"
+    assert "dc.description" not in result["response"]["metadata"]
+    assert result["response"]["withdrawn"] is True
+    calls = await stats()
+    assert calls[f"PATCH /server/api/core/items/{item['uuid']}"] == 1
+
+
+@pytest.mark.asyncio
+async def test_dspace_listing_revalidation(DSpaceClient, monkeypatch):
+    from DspaceAPI.Cache import listingCache
+    invalidateListings()
+    await createCommunity("first", "cz")
+    monkeypatch.setattr(listingCache, "ttl", 0)
+    stats = await mockCalls(DSpaceClient)
+    first = await getCommunities()
+    second = await getCommunities()
+    assert first == second
+    assert first["msg"] == 200
+    calls = await stats()
+    assert calls["GET /server/api/core/communities"] == 2
+    invalidateListings()
+
+
+@pytest.mark.asyncio
+async def test_dspace_listing_invalidated_while_fetched(DSpaceClient, monkeypatch):
+    import asyncio
+    from DspaceAPI.Cache import listingCache, COMMUNITIES_PATH
+    invalidateListings()
+    monkeypatch.setattr(listingCache, "ttl", 60)
+    stats = await mockCalls(DSpaceClient)
+    # logged in beforehand, both requests take the same time
+    await DSpaceClient.login()
+    async with aiohttp.ClientSession() as session:
+        await session.post(f"{DSpaceClient.baseUrl}/_mock/reset", params={"latency": 0.2})
+    try:
+        before = asyncio.ensure_future(getCommunities())
+        await asyncio.sleep(0.05)
+        # e.g. a community was created meanwhile, the running answer may miss it
+        invalidateListings(COMMUNITIES_PATH)
+        after = asyncio.ensure_future(getCommunities())
+        results = [await before]
+        # the answer started before the invalidation is not cached
+        assert COMMUNITIES_PATH not in listingCache._entries
+        results.append(await after)
+        calls = await stats()
+    finally:
+        async with aiohttp.ClientSession() as session:
+            await session.post(f"{DSpaceClient.baseUrl}/_mock/reset", params={"latency": 0})
+    assert [result["msg"] for result in results] == [200, 200]
+    # the later caller did not join the older request
+    assert calls["GET /server/api/core/communities"] == 2
+    assert listingCache._entries[COMMUNITIES_PATH]["result"] == results[1]
+    invalidateListings()
+
+
+@pytest.mark.asyncio
+async def test_dspace_pages_and_bulk(DSpaceClient):
+    for index in range(5):
+        await createCommunity(f"community {index:02}", "cz")
+    pages = iterateCommunities(size=2)
+    names = [community["name"] async for community in pages]
+    assert len(names) == pages.totalElements
+    assert len(names) >= 5
+
+    results = await createItems("collection", [{"title": f"bulk {index}"} for index in range(10)], concurrency=4)
+    assert [result["msg"] for result in results] == [201] * 10
+    assert [result["response"]["name"] for result in results] == [f"bulk {index}" for index in range(10)]
+
+
+@pytest.mark.asyncio
+async def test_dspace_item_loader_deduplicates(DSpaceClient):
+    import asyncio
+    from src.Dataloaders import createLoaders
+    items = [(await createItem("collection", f"loaded {index}"))["response"] for index in range(3)]
+    loaders = createLoaders(None)
+    stats = await mockCalls(DSpaceClient)
+    keys = [item["uuid"] for item in items] * 2 + ["00000000-0000-0000-0000-000000000000"]
+    loaded = await asyncio.gather(*(loaders.dspace_items.load(key) for key in keys))
+    assert [item["name"] for item in loaded[:3]] == ["loaded 0", "loaded 1", "loaded 2"]
+    assert loaded[3:6] == loaded[:3] and loaded[6] is None
+    await loaders.dspace_items.load(items[0]["uuid"])
+    calls = await stats()
+    assert sum(count for call, count in calls.items() if call.startswith("GET /server/api/core/items/")) == 4
+
+
+@pytest.mark.asyncio
+async def test_dspace_identical_gets_coalesced(DSpaceClient):
+    import asyncio
+    from DspaceAPI.GetItem import getItem
+    item = (await createItem("collection", "popular"))["response"]
+    stats = await mockCalls(DSpaceClient)
+    async with aiohttp.ClientSession() as session:
+        await session.post(f"{DSpaceClient.baseUrl}/_mock/reset", params={"latency": 0.1})
+    try:
+        results = await asyncio.gather(*(getItem(item["uuid"]) for _ in range(10)))
+        calls = await stats()
+    finally:
+        async with aiohttp.ClientSession() as session:
+            await session.post(f"{DSpaceClient.baseUrl}/_mock/reset", params={"latency": 0})
+    assert all(result == results[0] for result in results)
+    results[1]["response"]["name"] = "changed"
+    assert results[0]["response"]["name"] == "popular"
+    assert calls[f"GET /server/api/core/items/{item['uuid']}"] == 1
+
+
+@pytest.mark.asyncio
+async def test_single_flight_propagates_errors():
+    import asyncio
+    from DspaceAPI.Client import DSpaceClient
+    client = DSpaceClient("http://localhost:1")
+    calls = []
+
+    async def failing():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream broke")
+
+    results = await asyncio.gather(*(client.singleFlight("key", failing) for _ in range(5)), return_exceptions=True)
+    assert len(calls) == 1
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert client._inflight == {}
+
+
+@pytest.mark.asyncio
+async def test_dspace_item_with_bitstreams_one_request(DSpaceClient):
+    from DspaceAPI.GetBitstreamItem import getItemWithBitstreams, ITEM_FIELDS
+    item = (await createItem("collection", "detail"))["response"]
+    original = (await addBundleItem(item["uuid"]))["response"]
+    thumbnails = (await addBundleItem(item["uuid"], name="THUMBNAIL"))["response"]
+    await uploadBitstream(original["uuid"], b"content", "file.pdf")
+    for index in range(25):
+        await uploadBitstream(thumbnails["uuid"], b"small", f"thumbnail{index}.jpg", bundleName="THUMBNAIL")
+
+    stats = await mockCalls(DSpaceClient)
+    result = await getItemWithBitstreams(item["uuid"])
+    assert result["msg"] == 200
+    assert set(result["response"]) <= set(ITEM_FIELDS) | {"bitstreams"}
+    bitstreams = result["response"]["bitstreams"]
+    assert [bitstream["name"] for bitstream in bitstreams if bitstream["bundleName"] == "ORIGINAL"] == ["file.pdf"]
+    assert len([bitstream for bitstream in bitstreams if bitstream["bundle"] == thumbnails["uuid"]]) == 25
+    calls = await stats()
+    assert calls[f"GET /server/api/core/items/{item['uuid']}"] == 1
+    # only the bundle with more bitstreams than DSpace embeds is read separately
+    assert f"GET /server/api/core/bundles/{original['uuid']}/bitstreams" not in calls
+    assert calls[f"GET /server/api/core/bundles/{thumbnails['uuid']}/bitstreams"] == 1
+    assert f"GET /server/api/core/items/{item['uuid']}/bundles" not in calls
+
+
+@pytest.mark.asyncio
+async def test_dspace_metrics(DSpaceClient):
+    from prometheus_client import REGISTRY
+    from DspaceAPI.GetItem import getItem
+    from DspaceAPI.Metrics import metricsPage
+
+    def value(name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    item = (await createItem("collection", "measured"))["response"]
+    requests = value("dspace_requests_total", method="GET", endpoint="/server/api/core/items/{id}", status="200")
+    operations = value("dspace_operations_total", operation="getItem", outcome="200")
+    await getItem(item["uuid"])
+    await getItem("00000000-0000-0000-0000-000000000000")
+    assert value("dspace_requests_total", method="GET", endpoint="/server/api/core/items/{id}", status="200") == requests + 1
+    assert value("dspace_operations_total", operation="getItem", outcome="200") == operations + 1
+    assert value("dspace_operations_total", operation="getItem", outcome="404") >= 1
+    assert value("dspace_response_bytes_total", method="GET", endpoint="/server/api/core/items/{id}") > 0
+    assert value("dspace_request_bytes_total", method="POST", endpoint="/server/api/core/items") > 0
+    assert value("dspace_requests_in_flight", method="GET", endpoint="/server/api/core/items/{id}") == 0
+
+    body, contentType = metricsPage()
+    assert contentType.startswith("text/plain")
+    assert b"dspace_request_duration_seconds_bucket" in body
+
+
+async def injectFailures(client, status=503, count=1, path="/server/api/core"):
+    async with aiohttp.ClientSession() as session:
+        async with session.post(f"{client.baseUrl}/_mock/fail", params={"status": status, "count": count, "path": path}) as response:
+            assert response.status == 200
+
+
+def resilientClient(baseUrl, threshold=5, resetTimeout=60):
+    from DspaceAPI.Client import DSpaceClient
+    from DspaceAPI.Resilience import RetryPolicy, CircuitBreaker
+    return DSpaceClient(
+        baseUrl=baseUrl, coalesce=False,
+        retry=RetryPolicy(attempts=3, baseDelay=0, maxDelay=0),
+        breaker=CircuitBreaker(threshold=threshold, resetTimeout=resetTimeout),
+    )
+
+
+@pytest.mark.asyncio
+async def test_dspace_retry_after_503(DSpaceServer):
+    client = resilientClient(DSpaceServer)
+    try:
+        item = (await client.fetch("POST", "/server/api/core/items?owningCollection=collection", json={"name": "retried"}))["response"]
+        stats = await mockCalls(client)
+        await injectFailures(client, count=2, path=f"/server/api/core/items/{item['uuid']}")
+        result = await client.fetch("GET", f"/server/api/core/items/{item['uuid']}")
+        assert result["msg"] == 200 and result["response"]["uuid"] == item["uuid"]
+        assert (await stats())[f"GET /server/api/core/items/{item['uuid']}"] == 3
+    finally:
+        await client.close()
+
+
+@pytest.mark.asyncio
+async def test_dspace_post_not_retried(DSpaceServer):
+    client = resilientClient(DSpaceServer)
+    try:
+        await client.login()
+        stats = await mockCalls(client)
+        await injectFailures(client, count=1, path="/server/api/core/items")
+        result = await client.fetch("POST", "/server/api/core/items?owningCollection=collection", json={"name": "once"})
+        assert result["msg"] == 503
+        assert (await stats())["POST /server/api/core/items"] == 1
+    finally:
+        await client.close()
+
+
+@pytest.mark.asyncio
+async def test_dspace_breaker_opens_and_probe_closes_it(DSpaceServer):
+    import asyncio
+    from DspaceAPI.Client import DSpaceUnavailableError
+    client = resilientClient(DSpaceServer, threshold=2, resetTimeout=0.3)
+    try:
+        await client.login()
+        stats = await mockCalls(client)
+        await injectFailures(client, count=2, path="/server/api/core/communities")
+        # the retries stop as soon as the threshold opens the circuit
+        result = await client.fetch("GET", "/server/api/core/communities")
+        assert result["error"]["type"] == DSpaceUnavailableError.__name__
+        assert client.breaker.state == "open"
+
+        # open: nothing is sent
+        result = await client.fetch("GET", "/server/api/core/communities")
+        assert result["error"]["type"] == DSpaceUnavailableError.__name__
+        assert (await stats())["GET /server/api/core/communities"] == 2
+
+        # half-open: one probe goes out, the others fail fast until it closes the circuit
+        await asyncio.sleep(0.35)
+        async with aiohttp.ClientSession() as session:
+            await session.post(f"{client.baseUrl}/_mock/reset", params={"latency": 0.1})
+        try:
+            probe, other = await asyncio.gather(
+                client.fetch("GET", "/server/api/core/communities"),
+                client.fetch("GET", "/server/api/core/communities"),
+            )
+        finally:
+            async with aiohttp.ClientSession() as session:
+                await session.post(f"{client.baseUrl}/_mock/reset", params={"latency": 0})
+        assert probe["msg"] == 200
+        assert other["error"]["type"] == DSpaceUnavailableError.__name__
+        assert client.breaker.state == "closed"
+        assert (await client.fetch("GET", "/server/api/core/communities"))["msg"] == 200
+    finally:
+        await client.close()
+
+
+@pytest.mark.asyncio
+async def test_single_flight_results_are_independent():
+    import asyncio
+    from DspaceAPI.Client import DSpaceClient
+    client = DSpaceClient("http://localhost:1")
+
+    async def shared():
+        await asyncio.sleep(0.01)
+        return {"name": "original"}
+
+    async def mutating():
+        result = await client.singleFlight("key", shared)
+        # changed before the other callers resume
+        result["name"] = "mutated by first caller"
+        return result
+
+    first, second, third = await asyncio.gather(
+        mutating(), client.singleFlight("key", shared), client.singleFlight("key", shared)
+    )
+    assert first["name"] == "mutated by first caller"
+    assert second == third == {"name": "original"}
+    assert second is not third
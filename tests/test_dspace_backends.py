@@ -0,0 +1,79 @@
+import aiohttp
+import pytest
+
+from DspaceAPI.Backends import Backend, RoutingClient, loadBackends
+from DspaceAPI.Client import getClient, setClient
+from DspaceAPI.GetBitstreamItem import getItemBitstream
+
+ARCHIVE_COLLECTION = "5e1f0000-0000-0000-0000-000000000001"
+
+
+async def itemCount(baseUrl):
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"{baseUrl}/_mock/stats") as response:
+            calls = (await response.json())["calls"]
+    return calls.get("POST /server/api/core/items", 0)
+
+
+def routingClient(main, archive):
+    return RoutingClient([
+        Backend("main", main, default=True),
+        Backend("archive", archive, collections=[ARCHIVE_COLLECTION]),
+    ])
+
+
+@pytest.mark.asyncio
+async def test_routing_by_collection_and_learned_ids(DSpaceServer, SecondDSpaceServer, ItemWithFile):
+    previous = getClient()
+    client = setClient(routingClient(DSpaceServer, SecondDSpaceServer))
+    try:
+        before = await itemCount(SecondDSpaceServer)
+        item, _, _ = await ItemWithFile("archived", b"archived content", collection=ARCHIVE_COLLECTION)
+        assert await itemCount(SecondDSpaceServer) == before + 1
+        bitstream = await getItemBitstream(item["uuid"])
+        assert bitstream["name"] == "file.pdf"
+
+        # a fresh client does not know the item, it is found by asking all backends
+        await client.close()
+        client = setClient(routingClient(DSpaceServer, SecondDSpaceServer))
+        bitstream = await getItemBitstream(item["uuid"])
+        assert bitstream["name"] == "file.pdf"
+        assert client.known(f"/server/api/core/items/{item['uuid']}").name == "archive"
+        assert client.known(f"/server/api/core/bitstreams/{bitstream['uuid']}/content").name == "archive"
+        assert client.known("/server/api/core/communities").name == "main"
+    finally:
+        await client.close()
+        setClient(previous)
+
+
+def test_load_backends(tmp_path):
+    assert loadBackends("") == []
+    path = tmp_path / "backends.json"
+    path.write_text('[{"name": "a", "url": "http://a:8080"}, {"name": "b", "url": "http://b:8080", "default": true}]')
+    backends = loadBackends(str(path))
+    assert [backend.name for backend in backends] == ["a", "b"]
+    assert RoutingClient(backends).default.name == "b"
+
+
+@pytest.mark.asyncio
+async def test_listings_merged_from_all_backends(DSpaceServer, SecondDSpaceServer):
+    from DspaceAPI.Pages import HALPages
+    previous = getClient()
+    client = setClient(routingClient(DSpaceServer, SecondDSpaceServer))
+    try:
+        headers = {"Content-Type": "application/json"}
+        for backend, name in [("main", "main community"), ("archive", "archived community")]:
+            result = await client.backends[backend].client.fetch("POST", "/server/api/core/communities", headers=headers, json={"name": name})
+            assert result["msg"] == 201
+
+        totals = [
+            (await client.backends[backend].client.fetch("GET", "/server/api/core/communities?size=1"))["response"]["page"]["totalElements"]
+            for backend in ("main", "archive")
+        ]
+        pages = HALPages("/server/api/core/communities", size=1)
+        names = [community["name"] async for community in pages]
+        assert {"main community", "archived community"} <= set(names)
+        assert len(names) == pages.totalElements == sum(totals)
+    finally:
+        await client.close()
+        setClient(previous)
@@ -0,0 +1,122 @@
+import uuid
+import pytest
+
+from sqlalchemy import select, func
+
+from src.DBDefinitions import DocumentModel, DSpaceItemModel
+from src.DSpaceMirror import DSpaceMirror, reconcile
+from DspaceAPI.CreateItem import createItem
+from DspaceAPI.UpdateItemMetadata import updateItemMetadata, desiredState
+from .shared import prepare_in_memory_sqllite
+
+
+@pytest.mark.asyncio
+async def test_mirror_syncs_only_changes(DSpaceClient, ItemWithFile):
+    asyncSessionMaker = await prepare_in_memory_sqllite()
+    withFile, bundle, bitstream = await ItemWithFile("with file", b"content")
+    withoutFile = (await createItem("collection", "without file"))["response"]
+
+    mirror = DSpaceMirror(asyncSessionMaker, size=5)
+    total = await mirror.sync()
+    assert total >= 2
+    async with asyncSessionMaker() as session:
+        row = await session.get(DSpaceItemModel, uuid.UUID(withFile["uuid"]))
+    assert row.title == "with file"
+    assert row.original_bitstream_id == uuid.UUID(bitstream["uuid"])
+    assert row.bundle_ids == [bundle["uuid"]]
+
+    await updateItemMetadata(withoutFile["uuid"], desiredState(title="renamed", withdrawn=True))
+    assert await mirror.sync() <= 2
+
+    async with asyncSessionMaker() as session:
+        row = await session.get(DSpaceItemModel, uuid.UUID(withoutFile["uuid"]))
+        assert row.title == "renamed" and row.withdrawn is True
+        documents = [
+            DocumentModel(id=uuid.uuid4(), dspace_id=uuid.UUID(dspaceId), name=name, author_id=None, group_id=None)
+            for name, dspaceId in [("ok", withFile["uuid"]), ("withdrawn", withoutFile["uuid"]), ("missing", str(uuid.uuid4()))]
+        ]
+        session.add_all(documents)
+        await session.commit()
+
+    report = await reconcile(asyncSessionMaker)
+    assert report["missing"] == [documents[2].id]
+    assert report["withdrawn"] == [documents[1].id]
+    assert report["without_file"] == [documents[1].id]
+
+
+@pytest.mark.asyncio
+async def test_mirror_lease_and_periodic_full_run(DSpaceClient):
+    asyncSessionMaker = await prepare_in_memory_sqllite()
+    await createItem("collection", "mirrored")
+    first = DSpaceMirror(asyncSessionMaker, fullInterval=3600)
+    second = DSpaceMirror(asyncSessionMaker, fullInterval=0)
+
+    # only one worker synchronizes at a time
+    assert await first.acquire() is not None
+    assert await second.acquire() is None
+    assert await second.runOnce() is None
+    await first.release()
+    assert await first.runOnce() > 0
+
+    async with asyncSessionMaker() as session:
+        session.add(DSpaceItemModel(id=uuid.uuid4(), name="deleted in DSpace"))
+        await session.commit()
+
+    async def mirrored():
+        async with asyncSessionMaker() as session:
+            rows = await session.execute(select(func.count()).select_from(DSpaceItemModel).where(DSpaceItemModel.name == "deleted in DSpace"))
+            return rows.scalar()
+
+    # the last full run is recent for the first worker, its run is incremental
+    await first.runOnce()
+    assert await mirrored() == 1
+    # the full run is due for the second one and removes what DSpace does not have
+    await second.runOnce()
+    assert await mirrored() == 0
+
+
+@pytest.mark.asyncio
+async def test_mirror_keeps_items_edited_during_the_walk(DSpaceClient, monkeypatch):
+    import src.DSpaceMirror as mirrorModule
+    asyncSessionMaker = await prepare_in_memory_sqllite()
+    edited = (await createItem("collection", "edited during the walk"))["response"]
+    following = (await createItem("collection", "following the edited one"))["response"]
+    original = mirrorModule.getItemBitstreams
+    calls = []
+
+    async def editing(itemId):
+        calls.append(itemId)
+        if itemId == edited["uuid"] and calls.count(itemId) == 1:
+            # the item moves to the end of lastModified order, a walk by page number skips one
+            await updateItemMetadata(itemId, desiredState(title="edited"))
+        return await original(itemId)
+
+    monkeypatch.setattr(mirrorModule, "getItemBitstreams", editing)
+    await DSpaceMirror(asyncSessionMaker, size=1).sync(full=True)
+    async with asyncSessionMaker() as session:
+        assert (await session.get(DSpaceItemModel, uuid.UUID(edited["uuid"]))).title == "edited"
+        assert await session.get(DSpaceItemModel, uuid.UUID(following["uuid"])) is not None
+
+
+@pytest.mark.asyncio
+async def test_mirror_watermark_waits_for_all_backends(DSpaceServer, SecondDSpaceServer):
+    from DspaceAPI.Backends import Backend, RoutingClient
+    from DspaceAPI.Client import getClient, setClient
+    from DspaceAPI.SearchItems import ChangedItems
+    previous = getClient()
+    client = setClient(RoutingClient([Backend("main", DSpaceServer, default=True), Backend("archive", SecondDSpaceServer)]))
+    try:
+        asyncSessionMaker = await prepare_in_memory_sqllite()
+        await client.backends["archive"].client.fetch("POST", "/server/api/core/items?owningCollection=collection", json={"name": "archived"})
+        mirror = DSpaceMirror(asyncSessionMaker, size=5)
+        await mirror.sync()
+        maxima = []
+        for backend in client.backends.values():
+            changed = ChangedItems(client=backend.client)
+            async for _ in changed.pages():
+                pass
+            maxima.append(changed.maximum)
+        assert await mirror.watermark() == min(maxima)
+    finally:
+        await client.close()
+        setClient(previous)
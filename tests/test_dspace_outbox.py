@@ -0,0 +1,70 @@
+import pytest
+import uuid
+
+from sqlalchemy import delete, select
+
+from src.DBDefinitions import DocumentModel, DSpaceOutboxModel
+from src.DSpaceOutbox import outboxCapture, OutboxWorker
+from .shared import prepare_in_memory_sqllite
+
+
+async def changeDocument(asyncSessionMaker, id, dspace_id):
+    async with asyncSessionMaker() as session:
+        session.add(DocumentModel(id=id, dspace_id=dspace_id, name="first", author_id=None, group_id=None))
+        await session.commit()
+    async with asyncSessionMaker() as session:
+        document = await session.get(DocumentModel, id)
+        document.name = "second"
+        await session.commit()
+    async with asyncSessionMaker() as session:
+        await session.execute(delete(DocumentModel).where(DocumentModel.id == id))
+        await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_outbox_keeps_order_per_document():
+    asyncSessionMaker = await prepare_in_memory_sqllite()
+    id = uuid.uuid4()
+    with outboxCapture():
+        await changeDocument(asyncSessionMaker, id, uuid.uuid4())
+
+    applied = []
+    async def apply(entry):
+        applied.append((entry.operation, entry.payload))
+        return None
+
+    worker = OutboxWorker(asyncSessionMaker, apply=apply)
+    assert await worker.drain() == 3
+    assert applied == [
+        ("insert", {"name": "first", "description": None}),
+        ("update", {"name": "second", "description": None}),
+        ("delete", None),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_outbox_failed_entry_blocks_later_changes():
+    asyncSessionMaker = await prepare_in_memory_sqllite()
+    with outboxCapture():
+        await changeDocument(asyncSessionMaker, uuid.uuid4(), uuid.uuid4())
+
+    async def apply(entry):
+        return "DSpace is down"
+
+    worker = OutboxWorker(asyncSessionMaker, apply=apply)
+    # insert fails and waits for its retry, update and delete must not overtake it
+    assert await worker.drain() == 1
+    async with asyncSessionMaker() as session:
+        entries = (await session.execute(select(DSpaceOutboxModel).order_by(DSpaceOutboxModel.id))).scalars().all()
+    assert [entry.attempts for entry in entries] == [1, 0, 0]
+    assert entries[0].error == "DSpace is down"
+    assert all(entry.processed is None for entry in entries)
+
+
+@pytest.mark.asyncio
+async def test_outbox_ignores_changes_outside_capture():
+    asyncSessionMaker = await prepare_in_memory_sqllite()
+    await changeDocument(asyncSessionMaker, uuid.uuid4(), uuid.uuid4())
+    async with asyncSessionMaker() as session:
+        entries = (await session.execute(select(DSpaceOutboxModel))).scalars().all()
+    assert entries == []
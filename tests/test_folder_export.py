@@ -0,0 +1,112 @@
+import io
+import uuid
+import zipfile
+import httpx
+import pytest
+
+from src.DBDefinitions import DocumentModel, DocumentFolderModel
+from src.FolderExport import folderDocuments, exportFolder
+import src.FolderExport as FolderExport
+from .shared import prepare_in_memory_sqllite, authenticatedApp
+
+
+async def documentWithFile(ItemWithFile, session, folder, name, content):
+    item, _, _ = await ItemWithFile(name, content, f"{name}.pdf")
+    session.add(DocumentModel(
+        id=uuid.uuid4(), dspace_id=uuid.UUID(item["uuid"]), name=name, folder_id=folder.id,
+        author_id=None, group_id=None
+    ))
+
+
+async def exportFixture(ItemWithFile):
+    asyncSessionMaker = await prepare_in_memory_sqllite()
+    async with asyncSessionMaker() as session:
+        root = DocumentFolderModel(id=uuid.uuid4(), name="root", group_id=None)
+        child = DocumentFolderModel(id=uuid.uuid4(), name="minutes", parent_id=root.id, group_id=None)
+        session.add_all([root, child])
+        await session.flush()
+        await documentWithFile(ItemWithFile, session, root, "report", b"%PDF report " * 20_000)
+        await documentWithFile(ItemWithFile, session, root, "budget", b"%PDF budget")
+        await documentWithFile(ItemWithFile, session, root, "empty", None)
+        await documentWithFile(ItemWithFile, session, child, "meeting", b"%PDF meeting")
+        await session.commit()
+    return asyncSessionMaker, root
+
+
+async def archiveOf(documents, **options):
+    chunks = [chunk async for chunk in exportFolder(documents, **options)]
+    assert all(chunks)
+    return zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+
+
+@pytest.mark.asyncio
+async def test_folder_export_streams_zip(DSpaceClient, ItemWithFile):
+    asyncSessionMaker, root = await exportFixture(ItemWithFile)
+    folder, documents = await folderDocuments(asyncSessionMaker, root.id)
+    assert [document.name for _, document in documents] == ["budget", "empty", "report"]
+
+    folder, documents = await folderDocuments(asyncSessionMaker, root.id, recursive=True)
+    archive = await archiveOf(documents, concurrency=2, buffer=2, chunkSize=4096)
+    assert archive.namelist() == ["budget.pdf", "report.pdf", "minutes/meeting.pdf", "export-errors.txt"]
+    assert archive.read("report.pdf") == b"%PDF report " * 20_000
+    assert archive.read("minutes/meeting.pdf") == b"%PDF meeting"
+    assert b"empty" in archive.read("export-errors.txt")
+    assert await folderDocuments(asyncSessionMaker, uuid.uuid4()) is None
+
+
+@pytest.mark.asyncio
+async def test_folder_export_resumes_interrupted_download(DSpaceClient, ItemWithFile, monkeypatch):
+    asyncSessionMaker, root = await exportFixture(ItemWithFile)
+    folder, documents = await folderDocuments(asyncSessionMaker, root.id)
+    stream = FolderExport.streamItemContent
+    failed = []
+
+    async def interrupted(bitstreamId, sink, byteRange=None, chunkSize=None):
+        if byteRange is None and not failed:
+            failed.append(bitstreamId)
+            # the first download breaks after one chunk
+            async def once(chunk):
+                await sink(chunk)
+                raise RuntimeError("connection reset")
+            return await stream(bitstreamId, once, chunkSize=chunkSize)
+        return await stream(bitstreamId, sink, byteRange=byteRange, chunkSize=chunkSize)
+
+    monkeypatch.setattr(FolderExport, "streamItemContent", interrupted)
+    archive = await archiveOf([pair for pair in documents if pair[1].name == "report"], chunkSize=4096)
+    assert failed and archive.namelist() == ["report.pdf"]
+    assert archive.read("report.pdf") == b"%PDF report " * 20_000
+
+
+@pytest.mark.asyncio
+async def test_folder_export_requires_access(DSpaceClient, ItemWithFile, monkeypatch):
+    import main
+    asyncSessionMaker, root = await exportFixture(ItemWithFile)
+    group = uuid.uuid4()
+    async with asyncSessionMaker() as session:
+        secret = DocumentFolderModel(id=uuid.uuid4(), name="secret", parent_id=root.id, group_id=group)
+        session.add(secret)
+        await session.flush()
+        await documentWithFile(ItemWithFile, session, secret, "salaries", b"%PDF salaries")
+        await session.commit()
+
+    async def sessionMaker():
+        return asyncSessionMaker
+    monkeypatch.setattr(main, "RunOnceAndReturnSessionMaker", sessionMaker)
+
+    async def get(app, folderId):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get(f"/folders/{folderId}/export.zip", params={"recursive": True})
+
+    assert (await get(main.app, root.id)).status_code == 401
+    outsider = authenticatedApp(main.app, {"id": str(uuid.uuid4()), "groups": []})
+    assert (await get(outsider, secret.id)).status_code == 403
+    # the open folder is exported without the subfolder the user cannot see
+    response = await get(outsider, root.id)
+    assert response.status_code == 200
+    assert "secret/salaries.pdf" not in zipfile.ZipFile(io.BytesIO(response.content)).namelist()
+
+    member = authenticatedApp(main.app, {"id": str(uuid.uuid4()), "groups": [{"id": str(group)}]})
+    response = await get(member, secret.id)
+    assert response.status_code == 200
+    assert zipfile.ZipFile(io.BytesIO(response.content)).read("salaries.pdf") == b"%PDF salaries"